@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the insert throughput with random and time-ordered keys.
+
+This module contains code that inserts a growing number of synthetic posts into
+a separate benchmark database once for each key mode of `query.new_id`, and
+compares the insert throughput, the throughput of the last tenth of the posts,
+the size of the `Post` table and the number of InnoDB page splits. With random
+version 4 uuids every insert lands on a random page of the clustered primary
+key index, while time-ordered version 7 uuids are appended to its last page.
+
+The page splits are read from `information_schema.INNODB_METRICS`, and are only
+reported if the MySQL user may enable the `index_page_splits` counter.
+
+Usage:
+    python bench_keys.py --posts 1000000
+
+"""
+import time
+import getpass
+import argparse
+from mysql import connector
+from prettytable import PrettyTable
+from tables import TABLES
+from tables import DB_NAME
+from utils import setup_database
+from pool import get_pool
+from query import KEY_MODES
+from query import set_key_mode
+from query import new_id
+from query import executemany
+
+
+def page_splits(cursor):
+    """Get the number of InnoDB index page splits since the server started.
+
+    Parameters
+    ----------
+    cursor : :obj:
+        The mysql.connector.cursor object used to execute MySQL queries.
+
+    Returns
+    -------
+    int
+        The number of page splits, or None if the counter can not be enabled.
+
+    """
+    try:
+        cursor.execute("SET GLOBAL innodb_monitor_enable = 'index_page_splits'")
+        cursor.execute(
+            "SELECT COUNT FROM information_schema.INNODB_METRICS "
+            "WHERE NAME = 'index_page_splits'"
+        )
+        result = cursor.fetchall()
+    except connector.Error:
+        return None
+    return result[0][0] if result else None
+
+
+def table_size(cursor, tablename):
+    """Get the size of a table and its indexes in bytes.
+
+    Parameters
+    ----------
+    cursor : :obj:
+        The mysql.connector.cursor object used to execute MySQL queries.
+    tablename : str
+        The name of the table.
+
+    Returns
+    -------
+    int
+        The size of the data and the indexes of the table.
+
+    """
+    cursor.execute("ANALYZE TABLE `{}`".format(tablename))
+    cursor.fetchall()
+    cursor.execute(
+        "SELECT DATA_LENGTH + INDEX_LENGTH FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (tablename,),
+    )
+    return cursor.fetchall()[0][0]
+
+
+def insert_posts(cnx, pcid, count, batch_size):
+    """Insert synthetic posts with keys from `new_id`, a batch per transaction.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+    pcid : bytes
+        The PCID of the creator of the posts.
+    count : int
+        The number of posts to insert.
+    batch_size : int
+        The number of posts inserted per transaction.
+
+    Returns
+    -------
+    list
+        The number of seconds used to insert each batch.
+
+    """
+    times = []
+    with cnx.cursor() as cursor:
+        for start in range(0, count, batch_size):
+            rows = [
+                (new_id(), f"Benchmark post {i}", pcid)
+                for i in range(start, min(start + batch_size, count))
+            ]
+            begin = time.perf_counter()
+            executemany(cursor, "INSERT INTO Post VALUES(%s, %s, %s, 'Thread')", rows)
+            cnx.commit()
+            times.append(time.perf_counter() - begin)
+    return times
+
+
+def run(user, password, args, mode):
+    """Insert the posts into a new benchmark database with one key mode.
+
+    Parameters
+    ----------
+    user : str
+        The entered MySQL user.
+    password : str
+        The entered MySQL password.
+    args : :obj:
+        The parsed command line arguments.
+    mode : str
+        The key mode, one of `query.KEY_MODES`.
+
+    Returns
+    -------
+    list
+        The row of the result table of the key mode.
+
+    """
+    # Use a separate database to not touch the Piazza data
+    bench_db = DB_NAME + "Bench"
+    setup_database(user, password, bench_db, TABLES, rebuild=True)
+    set_key_mode(mode)
+
+    with get_pool(user, password, bench_db).connection() as cnx:
+        # Creator of the synthetic posts
+        pcid = new_id().bytes
+        with cnx.cursor() as cursor:
+            cursor.execute("INSERT INTO PostCreator VALUES (%s, 'Student')", (pcid,))
+            cnx.commit()
+            splits = page_splits(cursor)
+
+        times = insert_posts(cnx, pcid, args.posts, args.batch_size)
+
+        with cnx.cursor() as cursor:
+            if splits is not None:
+                splits = page_splits(cursor) - splits
+            size = table_size(cursor, "Post")
+
+    # Throughput of the last tenth of the posts, when the table is largest
+    last = times[-max(len(times) // 10, 1) :]
+    last_rows = args.posts - (len(times) - len(last)) * args.batch_size
+    return [
+        mode,
+        f"{args.posts / sum(times):.0f}",
+        f"{last_rows / sum(last):.0f}",
+        f"{size / 2**20:.1f}",
+        "n/a" if splits is None else splits,
+    ]
+
+
+def main():
+    """Run the insert benchmark with every key mode and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=1000000)
+    parser.add_argument(
+        "--batch-size", type=int, default=100, help="posts per transaction"
+    )
+    parser.add_argument("--modes", nargs="+", choices=KEY_MODES, default=KEY_MODES)
+    args = parser.parse_args()
+
+    user = input("Enter MySQL user: ")
+    password = getpass.getpass(prompt="Enter MySQL password: ")
+
+    table = PrettyTable()
+    table.field_names = [
+        "Key mode",
+        "Rows/s",
+        "Last 10% rows/s",
+        "Post size (MiB)",
+        "Page splits",
+    ]
+    table.align = "r"
+    for mode in args.modes:
+        table.add_row(run(user, password, args, mode))
+        print(f"{mode} keys done")
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the keyword search latency versus the number of posts.
+
+This module contains code that fills a separate benchmark database with a
+growing number of synthetic posts, and compares the latency of the keyword
+search with `LIKE '%keyword%'` against the FULLTEXT search in `search.py` for
+each number of posts.
+
+Usage:
+    python bench_search.py --posts 1000 10000 100000
+
+"""
+import time
+import uuid
+import random
+import getpass
+import argparse
+import statistics
+from prettytable import PrettyTable
+from tables import TABLES
+from tables import DB_NAME
+from utils import setup_database
+from pool import get_pool
+from search import search_posts
+
+# Words the synthetic posts are made of
+WORDS = (
+    "database transaction index query table join commit rollback lock page "
+    "buffer recovery checkpoint exam exercise schema normal form key tuple "
+    "relation algebra isolation serializable deadlock"
+).split()
+
+
+def like_search(cnx, keyword):
+    """Search for posts with `LIKE '%keyword%'`, as done before FULLTEXT.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+    keyword : str
+        The keyword to search for.
+
+    Returns
+    -------
+    list
+        The PostIDs of the matching posts.
+
+    """
+    keyword = "%" + keyword + "%"
+    cmds = [
+        "SELECT BIN_TO_UUID(PostID) FROM Post WHERE PostContent LIKE %s",
+        "SELECT BIN_TO_UUID(ThreadID) FROM Tags WHERE Tag LIKE %s",
+        (
+            "SELECT BIN_TO_UUID(ThreadID) FROM ThreadInFolder "
+            "INNER JOIN "
+            "(SELECT * FROM Folder "
+            "WHERE FolderName LIKE %s) AS T1 "
+            "USING (CourseID, FolderName)"
+        ),
+        (
+            "SELECT BIN_TO_UUID(PostID) FROM Post "
+            "INNER JOIN "
+            "(SELECT PCID FROM Student INNER JOIN "
+            "(SELECT UserID FROM User WHERE UserName LIKE %s) AS U1 "
+            "ON (UserID=StudentID) "
+            "UNION "
+            "SELECT PCID FROM Instructor INNER JOIN "
+            "(SELECT UserID FROM User WHERE UserName LIKE %s) AS U2 "
+            "ON (UserID=InstructorID)) AS T1 "
+            "USING(PCID)"
+        ),
+    ]
+    result = []
+    for cmd in cmds:
+        with cnx.cursor() as cursor:
+            cursor.execute(cmd, (keyword,) * cmd.count("%s"))
+            result += [t[0] for t in cursor.fetchall()]
+    return list(set(result))
+
+
+def add_posts(cnx, pcid, count, keyword, batch_size=1000):
+    """Insert synthetic posts, every tenth of them containing the keyword.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+    pcid : bytes
+        The PCID of the creator of the posts.
+    count : int
+        The number of posts to insert.
+    keyword : str
+        The keyword to put in some of the posts.
+    batch_size : int, optional
+        The number of posts inserted per statement.
+
+    """
+    cmd = "INSERT INTO Post VALUES (%s, %s, %s, 'Thread')"
+    with cnx.cursor() as cursor:
+        for start in range(0, count, batch_size):
+            rows = []
+            for i in range(start, min(start + batch_size, count)):
+                words = random.choices(WORDS, k=40)
+                if i % 10 == 0:
+                    words[random.randrange(len(words))] = keyword
+                rows.append((uuid.uuid4().bytes, " ".join(words), pcid))
+            cursor.executemany(cmd, rows)
+    cnx.commit()
+
+
+def time_search(search, cnx, keyword, repeat):
+    """Get the median latency of a search in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        search(cnx, keyword)
+        times.append(time.perf_counter() - start)
+    return 1000 * statistics.median(times)
+
+
+def main():
+    """Run the benchmark and print the latencies for each number of posts."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--posts", type=int, nargs="+", default=[1000, 10000, 100000]
+    )
+    parser.add_argument("--keyword", default="WAL")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    user = input("Enter MySQL user: ")
+    password = getpass.getpass(prompt="Enter MySQL password: ")
+
+    # Use a separate database to not touch the Piazza data
+    bench_db = DB_NAME + "Bench"
+    setup_database(user, password, bench_db, TABLES, rebuild=True)
+
+    table = PrettyTable()
+    table.field_names = ["Posts", "LIKE (ms)", "FULLTEXT (ms)"]
+    table.align = "r"
+    with get_pool(user, password, bench_db).connection() as cnx:
+        # Creator of the synthetic posts
+        userid = uuid.uuid4().bytes
+        pcid = uuid.uuid4().bytes
+        with cnx.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO User VALUES (%s, 'Bench Student', 'bench@example.com')",
+                (userid,),
+            )
+            cursor.execute("INSERT INTO PostCreator VALUES (%s, 'Student')", (pcid,))
+            cursor.execute("INSERT INTO Student VALUES (%s, %s)", (userid, pcid))
+        cnx.commit()
+
+        num_posts = 0
+        for count in sorted(args.posts):
+            add_posts(cnx, pcid, count - num_posts, args.keyword)
+            num_posts = count
+            table.add_row([
+                num_posts,
+                f"{time_search(like_search, cnx, args.keyword, args.repeat):.2f}",
+                f"{time_search(search_posts, cnx, args.keyword, args.repeat):.2f}",
+            ])
+            print(f"{num_posts} posts done")
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the startup time of the Piazza interface.
+
+This module contains code that measures the time from starting `main.py` in a
+new Python process until it prompts for the MySQL user, which is before any
+database work, and lists the slowest imports of `main.py` reported by
+`python -X importtime`. pandas and NumPy should not be among them, as they are
+only imported when a `.csv` file is inserted.
+
+With `--max-ms` the program exits with an error if the median time to the
+first prompt is larger, so the startup time can be tracked between commits.
+
+Usage:
+    python bench_startup.py --repeat 10 --max-ms 500
+
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from prettytable import PrettyTable
+
+# First prompt of main.py
+PROMPT = b"Enter MySQL user: "
+
+# Modules that should not be imported at startup
+HEAVY_MODULES = ["pandas", "numpy"]
+
+
+def time_to_prompt(script):
+    """Time a new process running a script until it prompts for the MySQL user.
+
+    Parameters
+    ----------
+    script : str
+        The path of the script.
+
+    Returns
+    -------
+    float
+        The number of milliseconds until the prompt was written.
+
+    Raises
+    ------
+    RuntimeError
+        If the process exits without writing the prompt.
+
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-u", script],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    output = b""
+    try:
+        while not output.endswith(PROMPT):
+            data = os.read(process.stdout.fileno(), 4096)
+            if not data:
+                raise RuntimeError(f"{script} exited without prompting")
+            output += data
+        return 1000 * (time.perf_counter() - start)
+    finally:
+        process.kill()
+        process.wait()
+        process.stdout.close()
+        process.stdin.close()
+
+
+def import_times(script):
+    """Get the import times of a script and the modules it imports.
+
+    Parameters
+    ----------
+    script : str
+        The path of the script, imported as a module from its directory.
+
+    Returns
+    -------
+    dict
+        The cumulative import time in milliseconds of every imported module,
+        by module name.
+
+    """
+    directory, filename = os.path.split(os.path.abspath(script))
+    module = os.path.splitext(filename)[0]
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=directory,
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+    )
+    times = {}
+    # Lines are "import time: self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue
+        name = fields[2].strip()
+        times[name] = max(times.get(name, 0.0), int(fields[1]) / 1000)
+    return times
+
+
+def main():
+    """Run the startup benchmark and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--script", default="main.py")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports shown")
+    parser.add_argument(
+        "--max-ms", type=float, help="fail if the median time to prompt is larger"
+    )
+    args = parser.parse_args()
+
+    times = import_times(args.script)
+    table = PrettyTable()
+    table.field_names = ["Module", "Cumulative import (ms)"]
+    table.align = "r"
+    table.align["Module"] = "l"
+    slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)
+    for name, elapsed in slowest[: args.top]:
+        table.add_row([name, f"{elapsed:.1f}"])
+    print(table)
+    heavy = [name for name in HEAVY_MODULES if name in times]
+    if heavy:
+        print(f"Imported at startup: {', '.join(heavy)}")
+
+    # Start the first process once to warm up the file system cache
+    time_to_prompt(args.script)
+    prompts = [time_to_prompt(args.script) for _ in range(args.repeat)]
+    median = statistics.median(prompts)
+    print(
+        f"Time to first prompt: median {median:.1f} ms, "
+        f"min {min(prompts):.1f} ms, max {max(prompts):.1f} ms"
+    )
+    if args.max_ms is not None and median > args.max_ms:
+        print(f"Startup slower than {args.max_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
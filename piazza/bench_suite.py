@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""End-to-end benchmark suite of the Piazza use cases on synthetic data.
+
+This module contains code that generates synthetic `.csv` files with
+`generate_data.py`, loads them into a separate benchmark database, and times
+`insert_data` (parsing the files, and again from their snapshots), login (from
+the database and from the login cache), thread creation, reply creation,
+keyword search and the user statistics through the PiazzaService. The results
+are written as JSON together with the commit they were measured on, so they can
+be compared between commits with `--compare`.
+
+Usage:
+    python bench_suite.py --rows 1000000 --output bench.json
+    python bench_suite.py --rows 1000000 --compare bench.json
+
+"""
+import os
+import json
+import time
+import getpass
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from prettytable import PrettyTable
+from tables import TABLES
+from tables import DB_NAME
+from utils import setup_database
+from utils import insert_data
+from cache import invalidate_logins
+from service import PiazzaService
+from query import set_key_mode
+from query import KEY_MODES
+from generate_data import generate
+from generate_data import FOLDERS
+from generate_data import TAGS
+
+
+def _commit():
+    """Helper function to get the current git commit, or None outside git."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return result.stdout.strip()
+
+
+def time_calls(function, repeat):
+    """Time repeated calls of a function.
+
+    Parameters
+    ----------
+    function : callable
+        Function called with the number of the call, from 0.
+    repeat : int
+        The number of calls.
+
+    Returns
+    -------
+    dict
+        The number of calls, and the mean, median, 99th percentile and largest
+        latency in milliseconds.
+
+    """
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        function(i)
+        times.append(1000 * (time.perf_counter() - start))
+    times.sort()
+    return {
+        "calls": repeat,
+        "mean_ms": statistics.fmean(times),
+        "p50_ms": statistics.median(times),
+        "p99_ms": times[min(len(times) - 1, int(0.99 * len(times)))],
+        "max_ms": times[-1],
+    }
+
+
+def run(user, password, args):
+    """Run the benchmarks and return the results.
+
+    Parameters
+    ----------
+    user : str
+        The entered MySQL user.
+    password : str
+        The entered MySQL password.
+    args : :obj:
+        The parsed command line arguments.
+
+    Returns
+    -------
+    dict
+        The number of generated rows by table (`rows`), and the results of
+        each benchmark by name (`results`).
+
+    """
+    # Use a separate database to not touch the Piazza data
+    bench_db = DB_NAME + "Bench"
+    results = {}
+
+    start = time.perf_counter()
+    counts = generate(args.data_dir, args.rows, args.seed, args.key_mode)
+    results["generate_data"] = {"seconds": time.perf_counter() - start}
+    num_rows = sum(counts.values())
+
+    setup_database(user, password, bench_db, TABLES, rebuild=True)
+    start = time.perf_counter()
+    insert_data(
+        user,
+        password,
+        bench_db,
+        load_infile=args.load_infile,
+        workers=os.cpu_count(),
+        data_dir=args.data_dir,
+    )
+    elapsed = time.perf_counter() - start
+    results["insert_data"] = {"seconds": elapsed, "rows_per_s": num_rows / elapsed}
+
+    if not args.load_infile:
+        # Insert the same files again, read from the snapshots written above
+        setup_database(user, password, bench_db, TABLES, rebuild=True)
+        start = time.perf_counter()
+        insert_data(
+            user, password, bench_db, workers=os.cpu_count(), data_dir=args.data_dir
+        )
+        elapsed = time.perf_counter() - start
+        results["insert_data_snapshot"] = {
+            "seconds": elapsed,
+            "rows_per_s": num_rows / elapsed,
+        }
+
+    set_key_mode(args.key_mode)
+    service = PiazzaService(user, password, bench_db)
+    # The first users are instructors, see generate_data.py
+    num_users = counts["User"]
+    num_instructors = counts["Instructor"]
+    students = range(num_instructors, num_users)
+
+    def student_login(i):
+        j = students[i % len(students)]
+        return service.login(f"user{j}@example.com", f"password{j}", "Student")
+
+    def cold_login(i):
+        invalidate_logins()
+        student_login(i)
+
+    results["login"] = time_calls(cold_login, args.repeat)
+    results["login_cached"] = time_calls(student_login, args.repeat)
+
+    session = student_login(0)
+    threadids = []
+
+    def create_thread(i):
+        thread = (f"Benchmark thread {i} about WAL", [FOLDERS[0]], [TAGS[0]])
+        threadids.extend(service.create_threads(session, [thread]))
+
+    results["create_thread"] = time_calls(create_thread, args.repeat)
+
+    def create_reply(i):
+        reply = (threadids[i % len(threadids)], f"Benchmark reply {i}")
+        service.create_replies(session, [reply])
+
+    results["create_reply"] = time_calls(create_reply, args.repeat)
+
+    keywords = ["WAL", "exam", "transaction", "Homework", "User"]
+    results["search_keyword"] = time_calls(
+        lambda i: service.search(keywords[i % len(keywords)], 50), args.repeat
+    )
+
+    instructor = service.login("user0@example.com", "password0", "Instructor")
+    results["view_statistics"] = time_calls(
+        lambda i: service.statistics(instructor, 50), args.repeat
+    )
+    return {"rows": counts, "results": results}
+
+
+def compare(results, baseline):
+    """Print the latencies of two runs side by side.
+
+    Parameters
+    ----------
+    results : dict
+        The results of this run.
+    baseline : dict
+        The results of the run to compare with.
+
+    """
+    table = PrettyTable()
+    table.field_names = ["Benchmark", "Metric", "Baseline", "Current", "Change"]
+    table.align = "r"
+    table.align["Benchmark"] = "l"
+    for name, metrics in results["results"].items():
+        old = baseline["results"].get(name, {})
+        for metric, value in metrics.items():
+            if metric == "calls" or metric not in old:
+                continue
+            change = (value - old[metric]) / old[metric] if old[metric] else 0.0
+            table.add_row(
+                [name, metric, f"{old[metric]:.2f}", f"{value:.2f}", f"{change:+.1%}"]
+            )
+    print(f"Baseline {baseline.get('commit')}, current {results.get('commit')}")
+    print(table)
+
+
+def main():
+    """Run the benchmark suite and write the results as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=100)
+    parser.add_argument("--data-dir", default="../data_synthetic/")
+    parser.add_argument("--load-infile", action="store_true")
+    parser.add_argument("--key-mode", choices=KEY_MODES, default="time")
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--compare", help="JSON results of an earlier run")
+    args = parser.parse_args()
+
+    # Read the baseline first, it may be overwritten by the output
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    user = input("Enter MySQL user: ")
+    password = getpass.getpass(prompt="Enter MySQL password: ")
+
+    results = {
+        "commit": _commit(),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "key_mode": args.key_mode,
+        **run(user, password, args),
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if baseline is not None:
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the uuid string to binary(16) conversion.
+
+This module contains code that writes a synthetic `UserViewsThread.csv` file
+and compares the time used to convert its ID columns with `uuid.UUID` per cell
+(`Series.apply`) against the vectorized `utils.uuids_to_bytes` conversion. The
+synthetic file is written to a temporary directory unless `--path` is given.
+
+Before the benchmark, `check_conversion` checks that both conversions give the
+same values, and reject the same malformed uuid strings.
+
+Usage:
+    python bench_uuid.py --rows 10000000
+
+"""
+import os
+import time
+import uuid
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+from utils import uuids_to_bytes
+
+# A valid uuid string
+_VALID = "0f8fad5b-d9cb-469f-a165-70867728950e"
+
+# Columns converted by check_conversion, each valid for uuid.UUID or not
+CHECK_COLUMNS = [
+    [_VALID, None, _VALID.upper(), "a8098c1a-f86e-11da-bd1a-00112444be1e"],
+    [_VALID, np.nan],
+    [None, None],
+    # Accepted by uuid.UUID without the canonical form
+    [_VALID, _VALID.replace("-", "")],
+    [_VALID, "{" + _VALID + "}"],
+    [_VALID, "urn:uuid:" + _VALID],
+    [_VALID, "0f8fad5bd-9cb-469f-a165-70867728950e"],
+    # Too long, would be truncated to a valid uuid when cast to 36 bytes
+    [_VALID, _VALID + "XYZ"],
+    [_VALID + "0"],
+    # Too short, not hex or not ASCII
+    [_VALID, _VALID[:-1]],
+    [_VALID, _VALID[:-1] + "g"],
+    [_VALID, _VALID[:-1] + "\u00e9"],
+    [""],
+]
+
+
+def _apply_uuid(values):
+    """Helper function to convert a column of uuid strings with `uuid.UUID`.
+
+    Parameters
+    ----------
+    values : :obj:
+        The pandas.Series containing uuid strings.
+
+    Returns
+    -------
+    :obj:
+        A pandas.Series of the same index containing 16 byte values.
+
+    """
+    return values.apply(lambda x: uuid.UUID(x).bytes if isinstance(x, str) else x)
+
+
+def _convert(convert, values):
+    """Helper function to convert a column, catching the error raised.
+
+    Parameters
+    ----------
+    convert : callable
+        The conversion, taking and returning a pandas.Series.
+    values : :obj:
+        The pandas.Series containing uuid strings.
+
+    Returns
+    -------
+    tuple
+        The list of converted values, or None, and the type of the error
+        raised, or None.
+
+    """
+    try:
+        return convert(values).tolist(), None
+    except (ValueError, TypeError, AttributeError) as err:
+        return None, type(err)
+
+
+def check_conversion(columns=CHECK_COLUMNS):
+    """Check that `uuids_to_bytes` gives the same result as `uuid.UUID`.
+
+    Parameters
+    ----------
+    columns : list, optional
+        Lists of values to convert as a column, valid uuid strings or not.
+
+    Raises
+    ------
+    AssertionError
+        If a column is converted to other values than with `uuid.UUID`, or
+        only one of the conversions raises an error.
+
+    """
+    for column in columns:
+        values = pd.Series(column, dtype=object)
+        expected = _convert(_apply_uuid, values)
+        result = _convert(uuids_to_bytes, values)
+        # NaN != NaN, so compare the missing values separately
+        assert (
+            result[1] == expected[1]
+            and (result[0] is None) == (expected[0] is None)
+            and (
+                result[0] is None
+                or pd.Series(result[0], dtype=object).equals(
+                    pd.Series(expected[0], dtype=object)
+                )
+            )
+        ), f"Conversion of {column} differs: {result} != {expected}"
+
+
+def write_synthetic_csv(path, rows, chunk_size=1000000):
+    """Write a synthetic `UserViewsThread.csv` file with random uuids.
+
+    Parameters
+    ----------
+    path : str
+        The path of the `.csv` file to write.
+    rows : int
+        The number of rows to write.
+    chunk_size : int, optional
+        The number of rows generated at a time.
+
+    """
+    with open(path, "w") as f:
+        f.write("UserID,ThreadID\n")
+        written = 0
+        while written < rows:
+            n = min(chunk_size, rows - written)
+            ids = np.frombuffer(os.urandom(32 * n), dtype="V16").reshape(n, 2)
+            f.writelines(
+                "{},{}\n".format(
+                    uuid.UUID(bytes=bytes(userid)), uuid.UUID(bytes=bytes(threadid))
+                )
+                for userid, threadid in ids
+            )
+            written += n
+
+
+def main():
+    """Run the benchmark and print the time used by each conversion."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000000)
+    parser.add_argument(
+        "--path", help="synthetic .csv file, written if missing and kept"
+    )
+    args = parser.parse_args()
+
+    check_conversion()
+    print(f"Conversion matches uuid.UUID for {len(CHECK_COLUMNS)} columns")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = args.path or os.path.join(tmp_dir, "UserViewsThread_synthetic.csv")
+        if not os.path.exists(path):
+            print(f"Writing {args.rows} rows to {path}")
+            write_synthetic_csv(path, args.rows)
+        table_df = pd.read_csv(path, nrows=args.rows)
+    print(f"Converting {len(table_df)} rows")
+
+    for col in table_df.columns:
+        start = time.perf_counter()
+        expected = _apply_uuid(table_df[col])
+        apply_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result = uuids_to_bytes(table_df[col])
+        vectorized_time = time.perf_counter() - start
+
+        assert result.equals(expected), f"Conversion of {col} differs"
+        print(
+            f"{col}: apply {apply_time:.2f}s, vectorized {vectorized_time:.2f}s "
+            f"({apply_time / vectorized_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""Read-through caches for the login lookups and the rendered threads.
+
+This module contains code for a bounded cache evicting the least recently used
+entries and entries older than a time to live (TTL). The process-wide login
+cache holds the rows `PiazzaUser.resolve_session` reads from the `Login`,
+`User`, `Student`, `Instructor` and `UserInCourse` tables, keyed on the email,
+so repeated logins by the same user do not query the database. The password is
+kept as a SHA-256 digest, not in plain text.
+
+The thread cache holds the text of the threads rendered by `thread_view.py`,
+keyed on the ThreadID, and a thread is invalidated when a reply or a follow-up
+is created in it through the PiazzaService. Changes to the posts of a thread
+made directly in the database, or by another process, are not seen by the
+cache, so its entries are only kept for `THREAD_TTL` seconds.
+
+The caches are cleared when data is loaded into the database, and login entries
+can be invalidated by email or UserID when a user or an enrollment changes.
+
+"""
+import time
+import threading
+from collections import OrderedDict
+
+# Default number of logins kept in the login cache
+DEFAULT_MAX_SIZE = 1024
+
+# Default number of seconds a login is kept in the login cache
+DEFAULT_TTL = 300.0
+
+# Number of rendered threads kept in the thread cache
+THREAD_MAX_SIZE = 256
+
+# Number of seconds a rendered thread is kept in the thread cache, short as
+# changes to a thread not made through the PiazzaService do not invalidate it
+THREAD_TTL = 30.0
+
+
+class TTLCache:
+    """Class for a bounded LRU cache with a time to live.
+
+    Attributes
+    ----------
+    max_size : int
+        The largest number of entries kept.
+    ttl : float
+        The number of seconds an entry is kept after it was stored.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL):
+        """Create an empty cache.
+
+        Parameters
+        ----------
+        max_size : int, optional
+            The largest number of entries kept.
+        ttl : float, optional
+            The number of seconds an entry is kept after it was stored.
+
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # Values and their expiry times, least recently used first
+        self._entries = OrderedDict()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+
+    def get(self, key):
+        """Get a value from the cache.
+
+        Parameters
+        ----------
+        key : :obj:
+            The key of the value.
+
+        Returns
+        -------
+        :obj:
+            The value, or None if it is not cached or has expired.
+
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Store a value in the cache, evicting the least recently used value
+        if the cache is full.
+
+        Parameters
+        ----------
+        key : :obj:
+            The key of the value.
+        value : :obj:
+            The value, not None.
+
+        """
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def get_or_load(self, key, load):
+        """Get a value from the cache, loading and storing it on a miss.
+
+        Parameters
+        ----------
+        key : :obj:
+            The key of the value.
+        load : callable
+            Function called with the key to load the value. A value of None is
+            returned without being stored.
+
+        Returns
+        -------
+        :obj:
+            The cached or loaded value.
+
+        """
+        value = self.get(key)
+        if value is None:
+            value = load(key)
+            if value is not None:
+                self.put(key, value)
+        return value
+
+    def invalidate(self, key=None, predicate=None):
+        """Remove values from the cache.
+
+        Parameters
+        ----------
+        key : :obj:, optional
+            The key of the value to remove.
+        predicate : callable, optional
+            Function called with every cached value, removing the values it
+            returns True for.
+
+        Returns
+        -------
+        int
+            The number of removed values.
+
+        """
+        with self._lock:
+            keys = set()
+            if key is not None and key in self._entries:
+                keys.add(key)
+            if predicate is not None:
+                keys.update(k for k, (v, _) in self._entries.items() if predicate(v))
+            for k in keys:
+                del self._entries[k]
+            self._stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def clear(self):
+        """Remove all values from the cache."""
+        with self._lock:
+            self._stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        """Get the cache metrics.
+
+        Returns
+        -------
+        dict
+            The number of lookups answered from the cache (`hits`) and not
+            (`misses`), the number of values evicted because the cache was full
+            (`evictions`), expired (`expirations`) or invalidated
+            (`invalidations`), the current `size`, and the `hit_rate`.
+
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+
+# Login cache shared by the process
+_LOGIN_CACHE = TTLCache()
+
+
+def get_login_cache():
+    """Get the login cache used by the process.
+
+    Returns
+    -------
+    :obj:
+        The TTLCache of the login lookups.
+
+    """
+    return _LOGIN_CACHE
+
+
+def invalidate_user(useremail=None, userid=None):
+    """Invalidate the cached login of a user, e.g. after changing the password
+    or the courses of the user.
+
+    Parameters
+    ----------
+    useremail : str, optional
+        The UserEmail of the user.
+    userid : str, optional
+        The UserID of the user.
+
+    """
+
+    def same_user(row):
+        return row.userid == userid
+
+    _LOGIN_CACHE.invalidate(useremail, same_user if userid is not None else None)
+
+
+def invalidate_logins():
+    """Invalidate all cached logins, e.g. after loading data."""
+    _LOGIN_CACHE.clear()
+
+
+# Thread cache shared by the process
+_THREAD_CACHE = TTLCache(THREAD_MAX_SIZE, THREAD_TTL)
+
+
+def get_thread_cache():
+    """Get the thread cache used by the process.
+
+    Returns
+    -------
+    :obj:
+        The TTLCache of the rendered threads.
+
+    """
+    return _THREAD_CACHE
+
+
+def invalidate_threads(threadids=None):
+    """Invalidate cached threads, e.g. after replying to them.
+
+    Parameters
+    ----------
+    threadids : list, optional
+        The ThreadIDs of the threads, as uuid strings or uuid.UUID values.
+        All threads are invalidated if None.
+
+    """
+    if threadids is None:
+        _THREAD_CACHE.clear()
+        return
+    for threadid in threadids:
+        _THREAD_CACHE.invalidate(str(threadid))
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""Check of the query plans of the Piazza use cases.
+
+This module contains code that generates synthetic `.csv` files with
+`generate_data.py`, loads them into a separate check database, and runs every
+use case through the PiazzaService while recording the executed statements:
+logging in, creating threads, replies and follow-ups, keyword search, viewing
+threads, liking posts and the user statistics. Every recorded statement is then
+checked with `query.explain_statements`.
+
+The program exits with an error if a statement converts a key column with
+`BIN_TO_UUID`, or if its plan is a full table scan (`type=ALL`) filtering rows
+on a table where a key could have been used or on one of the indexed tables,
+by default the tables of `tables.WORKLOAD_INDEXES`. The data is synthetic, as
+the optimizer may scan the small tables of the seed data even where a key could
+be used.
+
+Usage:
+    python check_plans.py --rows 100000
+
+"""
+import os
+import sys
+import getpass
+import argparse
+import tempfile
+from tables import TABLES
+from tables import DB_NAME
+from tables import WORKLOAD_INDEXES
+from utils import setup_database
+from utils import insert_data
+from pool import get_pool
+from query import record_statements
+from query import explain_statements
+from cache import invalidate_logins
+from cache import invalidate_threads
+from service import PiazzaService
+from generate_data import generate
+from generate_data import FOLDERS
+from generate_data import TAGS
+
+# Keywords searched for in the use cases
+KEYWORDS = ["WAL", "exam", "transaction", "Homework", "User"]
+
+
+def run_use_cases(service, counts):
+    """Run every use case once while recording the executed statements.
+
+    Parameters
+    ----------
+    service : :obj:
+        The PiazzaService to run the use cases with.
+    counts : dict
+        The number of generated rows by table, see `generate_data.generate`.
+
+    """
+    # The first users are instructors, see generate_data.py
+    student = counts["Instructor"]
+    record_statements(True)
+    try:
+        # Log in and view the threads from the database, not the caches
+        invalidate_logins()
+        invalidate_threads()
+        session = service.login(
+            f"user{student}@example.com", f"password{student}", "Student"
+        )
+        instructor = service.login("user0@example.com", "password0", "Instructor")
+
+        thread = ("Plan check thread about WAL", [FOLDERS[0]], [TAGS[0]])
+        threadid = service.create_threads(session, [thread])[0]
+        replyid = service.create_replies(session, [(threadid, "Plan check reply")])[0]
+        followupid = service.create_followup(session, threadid, "Plan check")
+        service.create_followup(session, threadid, "Plan check", followupid)
+
+        for keyword in KEYWORDS:
+            page = service.search(keyword, 10)
+            if page:
+                postid, relevance = page[-1]
+                service.search(keyword, 10, (relevance, postid))
+
+        service.show_thread(session, threadid)
+        service.like_post(session, replyid)
+        service.events.flush()
+
+        page = service.statistics(instructor, 10)
+        if page:
+            userid, _, threads_read, _ = page[-1]
+            service.statistics(instructor, 10, (threads_read, userid))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "statistics.csv")
+            service.export_statistics(instructor, path, 10)
+    finally:
+        record_statements(False)
+
+
+def main():
+    """Run the use cases and check the plans of the executed statements."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="../data_synthetic/")
+    parser.add_argument(
+        "--tables",
+        nargs="+",
+        default=sorted(WORKLOAD_INDEXES),
+        help="tables where any full scan filtering rows is reported",
+    )
+    args = parser.parse_args()
+
+    user = input("Enter MySQL user: ")
+    password = getpass.getpass(prompt="Enter MySQL password: ")
+
+    # Use a separate database to not touch the Piazza data
+    check_db = DB_NAME + "Check"
+    counts = generate(args.data_dir, args.rows, args.seed)
+    setup_database(user, password, check_db, TABLES, rebuild=True)
+    insert_data(
+        user, password, check_db, workers=os.cpu_count(), data_dir=args.data_dir
+    )
+
+    service = PiazzaService(user, password, check_db)
+    run_use_cases(service, counts)
+    with get_pool(user, password, check_db).connection() as cnx:
+        problems = explain_statements(cnx, args.tables)
+
+    for cmd, reason in problems:
+        print(f"\n{reason}:\n{cmd}")
+    if problems:
+        print(f"\n{len(problems)} plans with full table scans")
+        sys.exit(1)
+    print("No full table scans on keyed lookups")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""Write-behind buffer for thread view and post like events.
+
+This module contains code that records thread views in `UserViewsThread` and
+post likes in `UserLikesPost` without a database round trip per event. The
+events are kept in memory, deduplicated on the primary keys of the two
+tables, and written by a background thread in one transaction, either every
+`flush_interval` seconds or as soon as `max_events` events are waiting. The
+views and likes are each inserted with one multi-row `INSERT IGNORE` statement,
+built by `query.executemany`. The views already in the database are read and
+locked with one `SELECT` first, and the new views of all users are counted in
+`UserStats` with one multi-row `INSERT ... ON DUPLICATE KEY UPDATE`.
+
+Events still in memory are lost if the process is killed. They are written
+when the buffer is closed, which is also done when the interpreter exits. Events
+of failed flushes are kept for the next flush, but no more than `max_buffered`
+events are kept in memory, and the events past it are dropped and counted.
+
+"""
+import time
+import itertools
+import atexit
+import threading
+from collections import deque
+from collections import Counter
+from mysql import connector
+from query import execute
+from query import executemany
+from profiling import use_case
+from user_stats import count_threads_read
+
+# Default number of seconds between flushes
+DEFAULT_FLUSH_INTERVAL = 1.0
+
+# Default number of waiting events triggering a flush
+DEFAULT_MAX_EVENTS = 1000
+
+# Default number of events kept in memory, past which events are dropped
+DEFAULT_MAX_BUFFERED = 100000
+
+# Number of latest flushes the latency metrics are computed over
+FLUSH_HISTORY = 1000
+
+# Buffers shared by the process, keyed on their connection pool
+_BUFFERS = {}
+_BUFFERS_LOCK = threading.Lock()
+
+
+class EventBuffer:
+    """Class for buffering view and like events and writing them in batches.
+
+    Attributes
+    ----------
+    pool : :obj:
+        The ConnectionPool the events are written with.
+    flush_interval : float
+        The number of seconds between flushes.
+    max_events : int
+        The number of waiting events triggering a flush.
+    max_buffered : int
+        The number of waiting events past which events are dropped.
+    """
+
+    def __init__(
+        self,
+        pool,
+        flush_interval=DEFAULT_FLUSH_INTERVAL,
+        max_events=DEFAULT_MAX_EVENTS,
+        max_buffered=DEFAULT_MAX_BUFFERED,
+    ):
+        """Create an empty buffer and start its flushing thread.
+
+        Parameters
+        ----------
+        pool : :obj:
+            The ConnectionPool the events are written with.
+        flush_interval : float, optional
+            The number of seconds between flushes.
+        max_events : int, optional
+            The number of waiting events triggering a flush.
+        max_buffered : int, optional
+            The number of waiting events past which events are dropped, e.g.
+            while the database is unavailable.
+
+        """
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.max_events = max_events
+        self.max_buffered = max_buffered
+        self._condition = threading.Condition()
+        # Waiting (UserID, ThreadID) and (UserID, PostID) pairs as 16 byte values
+        self._views = set()
+        self._likes = set()
+        self._closed = False
+        # Only one flush writes at a time
+        self._flush_lock = threading.Lock()
+        self._flushes = 0
+        self._failures = 0
+        self._events_written = 0
+        self._rows_inserted = 0
+        self._duplicates = 0
+        self._dropped = 0
+        self._max_depth = 0
+        self._flush_times = deque(maxlen=FLUSH_HISTORY)
+        self._thread = threading.Thread(
+            target=self._run, name="EventBuffer", daemon=True
+        )
+        self._thread.start()
+
+    def record_view(self, userid, threadid):
+        """Record that a user viewed a thread.
+
+        Parameters
+        ----------
+        userid : uuid.UUID
+            The UserID of the user.
+        threadid : uuid.UUID
+            The ThreadID of the thread.
+
+        """
+        self._record(self._views, (userid.bytes, threadid.bytes))
+
+    def record_like(self, userid, postid):
+        """Record that a user liked a post.
+
+        Parameters
+        ----------
+        userid : uuid.UUID
+            The UserID of the user.
+        postid : uuid.UUID
+            The PostID of the post.
+
+        """
+        self._record(self._likes, (userid.bytes, postid.bytes))
+
+    def _record(self, events, key):
+        """Helper function to add an event to the buffer."""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("Event buffer is closed")
+            if key in events:
+                self._duplicates += 1
+                return
+            if self._depth() >= self.max_buffered:
+                self._dropped += 1
+                return
+            events.add(key)
+            depth = self._depth()
+            self._max_depth = max(self._max_depth, depth)
+            if depth >= self.max_events:
+                self._condition.notify()
+
+    def _run(self):
+        """Flush the buffer on the timer or size threshold until closed."""
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and self._depth() < self.max_events:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def _depth(self):
+        """Helper function to get the number of waiting events."""
+        return len(self._views) + len(self._likes)
+
+    def flush(self):
+        """Write the waiting events to the database in a single transaction.
+
+        If the transaction fails, the events are put back in the buffer and
+        written by the next flush, except those past `max_buffered` waiting
+        events, which are dropped.
+
+        Returns
+        -------
+        int
+            The number of new rows inserted.
+
+        """
+        with self._flush_lock:
+            with self._condition:
+                views, self._views = self._views, set()
+                likes, self._likes = self._likes, set()
+            if not views and not likes:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                inserted = self._write(views, likes)
+            except connector.Error as err:
+                print(f"Could not write {len(views) + len(likes)} events: {err}")
+                with self._condition:
+                    self._requeue(self._views, views)
+                    self._requeue(self._likes, likes)
+                    self._failures += 1
+                return 0
+
+            with self._condition:
+                self._flushes += 1
+                self._events_written += len(views) + len(likes)
+                self._rows_inserted += inserted
+                self._flush_times.append(time.perf_counter() - start)
+            return inserted
+
+    def _requeue(self, events, failed):
+        """Helper function to put failed events back while there is room."""
+        room = max(self.max_buffered - self._depth(), 0)
+        failed = failed - events
+        if len(failed) > room:
+            self._dropped += len(failed) - room
+            failed = set(itertools.islice(failed, room))
+        events |= failed
+
+    @use_case("events")
+    def _write(self, views, likes):
+        """Helper function to insert the events and count the new views."""
+        inserted = 0
+        with self.pool.connection() as cnx:
+            try:
+                with cnx.cursor() as cursor:
+                    if views:
+                        # Views already in the database, locked until the commit
+                        pairs = ", ".join(["(%s, %s)"] * len(views))
+                        execute(
+                            cursor,
+                            "SELECT UserID, ThreadID FROM UserViewsThread "
+                            f"WHERE (UserID, ThreadID) IN ({pairs}) FOR UPDATE",
+                            tuple(key for view in views for key in view),
+                        )
+                        existing = {
+                            (bytes(userid), bytes(threadid))
+                            for userid, threadid in cursor.fetchall()
+                        }
+                        new_views = [view for view in views if view not in existing]
+
+                        cmd = "INSERT IGNORE INTO UserViewsThread VALUES (%s, %s)"
+                        executemany(cursor, cmd, new_views)
+                        if new_views:
+                            inserted += max(cursor.rowcount, 0)
+                            counts = Counter(userid for userid, _ in new_views)
+                            count_threads_read(cursor, counts)
+
+                    cmd = "INSERT IGNORE INTO UserLikesPost VALUES (%s, %s)"
+                    executemany(cursor, cmd, list(likes))
+                    if likes:
+                        # Row count of INSERT IGNORE excludes the ignored rows
+                        inserted += max(cursor.rowcount, 0)
+                cnx.commit()
+            except connector.Error:
+                cnx.rollback()
+                raise
+        return inserted
+
+    def stats(self):
+        """Get the queue depth and flush latency of the buffer.
+
+        Returns
+        -------
+        dict
+            The number of waiting events (`queue_depth`) and the largest number
+            seen (`max_queue_depth`), the number of flushes and failed
+            flushes, the number of events written, new rows inserted,
+            duplicate events dropped and events dropped past `max_buffered`,
+            and the mean, median and largest flush
+            latency in milliseconds.
+
+        """
+        with self._condition:
+            times = sorted(self._flush_times)
+            stats = {
+                "queue_depth": self._depth(),
+                "max_queue_depth": self._max_depth,
+                "flushes": self._flushes,
+                "failed_flushes": self._failures,
+                "events_written": self._events_written,
+                "rows_inserted": self._rows_inserted,
+                "duplicates": self._duplicates,
+                "dropped": self._dropped,
+            }
+        stats["mean_flush_ms"] = 1000 * sum(times) / len(times) if times else 0.0
+        stats["p50_flush_ms"] = 1000 * times[len(times) // 2] if times else 0.0
+        stats["max_flush_ms"] = 1000 * times[-1] if times else 0.0
+        return stats
+
+    def close(self):
+        """Stop the flushing thread after writing the waiting events."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+
+def get_event_buffer(pool):
+    """Get the event buffer of a connection pool, creating it if needed.
+
+    The buffer is shared by the process, and closed when the interpreter
+    exits.
+
+    Parameters
+    ----------
+    pool : :obj:
+        The ConnectionPool the events are written with.
+
+    Returns
+    -------
+    :obj:
+        The EventBuffer of the pool.
+
+    """
+    with _BUFFERS_LOCK:
+        buffer = _BUFFERS.get(id(pool))
+        if buffer is None:
+            buffer = EventBuffer(pool)
+            _BUFFERS[id(pool)] = buffer
+            atexit.register(buffer.close)
+        return buffer
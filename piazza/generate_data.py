@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""Seeded generator of synthetic `.csv` files for all tables in `utils.FILES`.
+
+This module contains code that writes `.csv` files in the format of the files
+in `../data/`, at a configurable total number of rows, for benchmarking. The
+files satisfy the keys of `tables.TABLES`, so they can be loaded with
+`utils.insert_data`. The same seed always gives the same files.
+
+The rows follow heavy tailed (Pareto) distributions like a real course forum:
+a few students create most of the posts, and a few threads get most of the
+views and likes. Every user is enrolled in one course, every course has the
+folders of `FOLDERS`, and the first `INSTRUCTOR_SHARE` of the users are
+instructors. User `i` has the email `user{i}@example.com` and the password
+`password{i}`.
+
+The ids are time-ordered version 7 uuids by default, like the keys generated by
+the application (see `query.new_id`), so the files are written in the order of
+their primary keys. With `--key-mode random` they are random version 4 uuids.
+
+The ids are kept as 16 byte values in NumPy arrays and formatted in chunks, so
+about 10^8 rows can be written with a few GiB of memory.
+
+Usage:
+    python generate_data.py --rows 1000000 --data-dir ../data_synthetic/
+
+"""
+import os
+import csv
+import time
+import argparse
+import numpy as np
+from utils import FILES
+
+# Folders of every course
+FOLDERS = [
+    "Ov1",
+    "Ov2",
+    "Ov3",
+    "Ov4",
+    "Project",
+    "Exam",
+    "Logistics",
+    "Other",
+    "Midterm",
+    "Forelesninger",
+]
+
+# Tags of the threads
+TAGS = ["Homework", "Homework Solution", "Question", "Note", "Exam", "Lecture"]
+
+# Words the posts are made of
+WORDS = (
+    "database transaction index query table join commit rollback lock page "
+    "buffer recovery checkpoint exam exercise schema normal form key tuple "
+    "relation algebra isolation serializable deadlock WAL"
+).split()
+
+# Share of the users that are instructors
+INSTRUCTOR_SHARE = 0.05
+
+# Number of users per course
+USERS_PER_COURSE = 1000
+
+# Mean number of rows per user of each table, used to size the users from the
+# total number of rows
+ROWS_PER_USER = {
+    "User": 1,
+    "Login": 1,
+    "PostCreator": 1,
+    "Student": 1 - INSTRUCTOR_SHARE,
+    "Instructor": INSTRUCTOR_SHARE,
+    "UserInCourse": 1,
+    "Post": 3,
+    "Thread": 1,
+    "Tags": 1.5,
+    "ThreadInFolder": 1.5,
+    "UserLikesPost": 3,
+    "UserViewsThread": 10,
+}
+
+# Number of rows generated at a time
+CHUNK_SIZE = 1000000
+
+# Unix time in milliseconds of the first time-ordered id, 2021-01-01
+ID_EPOCH_MS = 1609459200000
+
+# Characters of a uuid string, and positions of the hex digits
+_HEX = np.frombuffer(b"0123456789abcdef", dtype="S1")
+_HEX_POSITIONS = [i for i in range(36) if i not in (8, 13, 18, 23)]
+
+
+def _new_ids(rng, n, key_mode="time"):
+    """Helper function to draw uuids as an (n, 16) uint8 array.
+
+    In the "time" key mode the ids are version 7 uuids one millisecond apart
+    from `ID_EPOCH_MS`, so they are increasing, and version 4 uuids otherwise.
+    """
+    ids = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    if key_mode == "time":
+        ms = (ID_EPOCH_MS + np.arange(n, dtype=np.uint64)).astype(">u8")
+        ids[:, :6] = ms.view(np.uint8).reshape(n, 8)[:, 2:]
+        ids[:, 6] = (ids[:, 6] & 0x0F) | 0x70
+    else:
+        ids[:, 6] = (ids[:, 6] & 0x0F) | 0x40
+    ids[:, 8] = (ids[:, 8] & 0x3F) | 0x80
+    return ids
+
+
+def format_ids(ids):
+    """Format 16 byte ids as uuid strings.
+
+    Parameters
+    ----------
+    ids : numpy.ndarray
+        An (n, 16) uint8 array of ids.
+
+    Returns
+    -------
+    numpy.ndarray
+        The canonical uuid strings of the ids.
+
+    """
+    chars = np.full((len(ids), 36), b"-", dtype="S1")
+    digits = np.empty((len(ids), 32), dtype="S1")
+    digits[:, 0::2] = _HEX[ids >> 4]
+    digits[:, 1::2] = _HEX[ids & 0x0F]
+    chars[:, _HEX_POSITIONS] = digits
+    return chars.view("S36").ravel().astype("U36")
+
+
+def _heavy_choice(rng, n, size):
+    """Helper function to draw indices below n, a few of them most often."""
+    # Pareto distributed weight of every index
+    weights = rng.pareto(2.0, n) + 1
+    return rng.choice(n, size, p=weights / weights.sum())
+
+
+def _pareto_counts(rng, size, mean, limit):
+    """Helper function to draw heavy tailed counts with about the given mean."""
+    # numpy draws Lomax values, which have mean 1 for shape 2. Rounding up or
+    # down at random keeps the mean.
+    counts = (rng.pareto(2.0, size) + 1) * mean / 2
+    counts = np.floor(counts + rng.random(size)).astype(np.int64)
+    return np.minimum(counts, limit)
+
+
+def _distinct_pairs(rng, counts, n, offsets=None):
+    """Helper function to draw distinct indices below n for every group.
+
+    Group i gets counts[i] distinct indices, forming an arithmetic sequence
+    modulo n with a random start and a step relatively prime to n.
+
+    """
+    groups = np.repeat(np.arange(len(counts)), counts)
+    starts = rng.integers(0, n, len(counts)) if offsets is None else offsets
+    steps = rng.integers(1, max(n, 2), len(counts))
+    steps[np.gcd(steps, n) != 1] = 1
+    # Position of every row within its group
+    first = np.cumsum(counts) - counts
+    position = np.arange(len(groups)) - np.repeat(first, counts)
+    return groups, (starts[groups] + position * steps[groups]) % n
+
+
+def _write(writer, *columns):
+    """Helper function to write columns of equal length in chunks."""
+    for start in range(0, len(columns[0]), CHUNK_SIZE):
+        chunk = [
+            format_ids(c[start : start + CHUNK_SIZE])
+            if c.ndim == 2
+            else c[start : start + CHUNK_SIZE]
+            for c in columns
+        ]
+        writer.writerows(zip(*chunk))
+
+
+def generate(data_dir, rows, seed=0, key_mode="time"):
+    """Write synthetic `.csv` files with about the given total number of rows.
+
+    Parameters
+    ----------
+    data_dir : str
+        The directory to write the files to, created if missing.
+    rows : int
+        The approximate total number of rows of all files.
+    seed : int, optional
+        The seed of the random numbers.
+    key_mode : str, optional
+        "time" for time-ordered version 7 uuids, or "random" for version 4
+        uuids.
+
+    Returns
+    -------
+    dict
+        The number of rows written to each file, by table name.
+
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(data_dir, exist_ok=True)
+    counts = {}
+
+    def open_csv(tablename, header):
+        f = open(os.path.join(data_dir, tablename + ".csv"), "w", newline="")
+        writer = csv.writer(f)
+        writer.writerow(header)
+        return f, writer
+
+    num_users = max(int(rows / sum(ROWS_PER_USER.values())), 20)
+    num_instructors = max(int(num_users * INSTRUCTOR_SHARE), 1)
+    num_courses = max(num_users // USERS_PER_COURSE, 1)
+    user_ids = _new_ids(rng, num_users, key_mode)
+    pc_ids = _new_ids(rng, num_users, key_mode)
+    course_ids = _new_ids(rng, num_courses, key_mode)
+    user_course = np.arange(num_users) % num_courses
+    numbers = np.arange(num_users).astype("U")
+    emails = np.char.add(np.char.add("user", numbers), "@example.com")
+
+    f, writer = open_csv("User", ["UserID", "UserName", "UserEmail"])
+    with f:
+        _write(writer, user_ids, np.char.add("User ", numbers), emails)
+    counts["User"] = num_users
+
+    f, writer = open_csv("Login", ["UserEmail", "Password"])
+    with f:
+        _write(writer, emails, np.char.add("password", numbers))
+    counts["Login"] = num_users
+
+    creator_types = np.where(
+        np.arange(num_users) < num_instructors, "Instructor", "Student"
+    )
+    f, writer = open_csv("PostCreator", ["PCID", "CreatorType"])
+    with f:
+        _write(writer, pc_ids, creator_types)
+    counts["PostCreator"] = num_users
+
+    f, writer = open_csv("Instructor", ["InstructorID", "PCID"])
+    with f:
+        _write(writer, user_ids[:num_instructors], pc_ids[:num_instructors])
+    counts["Instructor"] = num_instructors
+
+    f, writer = open_csv("Student", ["StudentID", "PCID"])
+    with f:
+        _write(writer, user_ids[num_instructors:], pc_ids[num_instructors:])
+    counts["Student"] = num_users - num_instructors
+
+    f, writer = open_csv(
+        "CourseForum",
+        ["CourseID", "CourseName", "Term", "PostAnonymity", "InvitationURL"],
+    )
+    with f:
+        course_numbers = np.arange(num_courses).astype("U")
+        _write(
+            writer,
+            course_ids,
+            np.char.add("Course ", course_numbers),
+            np.where(np.arange(num_courses) % 2 == 0, "Fall", "Spring"),
+            np.where(rng.random(num_courses) < 0.5, "True", "False"),
+            np.char.add("https://piazza.com/class/", course_numbers),
+        )
+    counts["CourseForum"] = num_courses
+
+    f, writer = open_csv("Folder", ["CourseID", "FolderName"])
+    with f:
+        _write(
+            writer,
+            np.repeat(course_ids, len(FOLDERS), axis=0),
+            np.tile(np.array(FOLDERS), num_courses),
+        )
+    counts["Folder"] = num_courses * len(FOLDERS)
+
+    f, writer = open_csv("UserInCourse", ["UserID", "CourseID"])
+    with f:
+        _write(writer, user_ids, course_ids[user_course])
+    counts["UserInCourse"] = num_users
+
+    # A third of the posts are threads, the rest are replies. A few users
+    # create most of the posts.
+    num_posts = int(num_users * ROWS_PER_USER["Post"])
+    num_threads = max(int(num_users * ROWS_PER_USER["Thread"]), 1)
+    post_ids = _new_ids(rng, num_posts, key_mode)
+    creators = _heavy_choice(rng, num_users, num_posts)
+    post_types = np.where(np.arange(num_posts) < num_threads, "Thread", "Reply")
+    f, writer = open_csv("Post", ["PostID", "PostContent", "PCID", "PostType"])
+    with f:
+        words = np.array(WORDS)
+        for start in range(0, num_posts, CHUNK_SIZE):
+            end = min(start + CHUNK_SIZE, num_posts)
+            content = words[rng.integers(0, len(words), (end - start, 12))]
+            content = [" ".join(w) for w in content]
+            writer.writerows(
+                zip(
+                    format_ids(post_ids[start:end]),
+                    content,
+                    format_ids(pc_ids[creators[start:end]]),
+                    post_types[start:end],
+                )
+            )
+    counts["Post"] = num_posts
+
+    # Threads are answered by random replies, or not at all
+    num_replies = num_posts - num_threads
+    f, writer = open_csv(
+        "Thread", ["ThreadID", "ThreadColor", "StudentReplyID", "InstructorReplyID"]
+    )
+    with f:
+        for start in range(0, num_threads, CHUNK_SIZE):
+            end = min(start + CHUNK_SIZE, num_threads)
+            n = end - start
+            colors = rng.choice(np.array([0, 2, 13]), n)
+            replies = []
+            for share in (0.5, 0.3):
+                if num_replies:
+                    reply = num_threads + rng.integers(0, num_replies, n)
+                    ids = format_ids(post_ids[reply])
+                    replies.append(np.where(rng.random(n) < share, ids, ""))
+                else:
+                    replies.append(np.full(n, ""))
+            writer.writerows(
+                zip(format_ids(post_ids[start:end]), colors, *replies)
+            )
+    counts["Thread"] = num_threads
+
+    # One or two distinct tags and folders per thread
+    tag_counts = rng.integers(1, 3, num_threads)
+    threads, tags = _distinct_pairs(rng, tag_counts, len(TAGS))
+    f, writer = open_csv("Tags", ["ThreadID", "Tag"])
+    with f:
+        _write(writer, post_ids[threads], np.array(TAGS)[tags])
+    counts["Tags"] = len(threads)
+
+    folder_counts = rng.integers(1, 3, num_threads)
+    threads, folders = _distinct_pairs(rng, folder_counts, len(FOLDERS))
+    f, writer = open_csv("ThreadInFolder", ["ThreadID", "CourseID", "FolderName"])
+    with f:
+        _write(
+            writer,
+            post_ids[threads],
+            course_ids[user_course[creators[threads]]],
+            np.array(FOLDERS)[folders],
+        )
+    counts["ThreadInFolder"] = len(threads)
+
+    # A few posts get most of the likes, and a few threads most of the views
+    like_counts = _pareto_counts(
+        rng,
+        num_posts,
+        ROWS_PER_USER["UserLikesPost"] * num_users / num_posts,
+        num_users,
+    )
+    posts, users = _distinct_pairs(rng, like_counts, num_users)
+    f, writer = open_csv("UserLikesPost", ["UserID", "PostID"])
+    with f:
+        _write(writer, user_ids[users], post_ids[posts])
+    counts["UserLikesPost"] = len(posts)
+
+    view_counts = _pareto_counts(
+        rng,
+        num_threads,
+        ROWS_PER_USER["UserViewsThread"] * num_users / num_threads,
+        num_users,
+    )
+    threads, users = _distinct_pairs(rng, view_counts, num_users)
+    f, writer = open_csv("UserViewsThread", ["UserID", "ThreadID"])
+    with f:
+        _write(writer, user_ids[users], post_ids[threads])
+    counts["UserViewsThread"] = len(threads)
+
+    # Same order as the files are inserted in
+    tablenames = [filename.split(".")[0] for filename in FILES]
+    return {tablename: counts[tablename] for tablename in tablenames}
+
+
+def main():
+    """Write the synthetic files and print the number of rows of each."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="../data_synthetic/")
+    parser.add_argument("--key-mode", choices=["time", "random"], default="time")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(args.data_dir, args.rows, args.seed, args.key_mode)
+    for tablename, count in counts.items():
+        print(f"{tablename}: {count} rows")
+    print(
+        f"{sum(counts.values())} rows written to {args.data_dir} "
+        f"in {time.perf_counter() - start:.1f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+"""Index advisor replaying the queries of the Piazza use cases.
+
+This module contains code that runs the read-only use cases (login, keyword
+search and the user statistics) through the PiazzaService while recording the
+executed statements, and replays every recorded `SELECT` against the database
+to report
+
+1. statements doing full table scans where a key could have been used, with
+   their `EXPLAIN ANALYZE` output,
+2. secondary indexes that none of the statements use, and
+3. the latency of the statements using each index of
+   `tables.WORKLOAD_INDEXES`, with the index visible and made invisible to the
+   optimizer.
+
+Making an index invisible does not drop it, and it is made visible again when
+measured. Statements changing data are not replayed.
+
+Usage:
+    python index_advisor.py --repeat 20
+
+"""
+import getpass
+import argparse
+import statistics
+import time
+from mysql import connector
+from prettytable import PrettyTable
+from tables import DB_NAME
+from tables import WORKLOAD_INDEXES
+from pool import get_pool
+from query import record_statements
+from query import recorded_statements
+from cache import invalidate_logins
+from service import PiazzaService
+
+# Keywords searched for in the workload
+KEYWORDS = ["WAL", "exam", "transaction", "Homework"]
+
+
+def run_workload(service, student, instructor, keywords=KEYWORDS):
+    """Run the read-only use cases while recording the executed statements.
+
+    Parameters
+    ----------
+    service : :obj:
+        The PiazzaService to run the use cases with.
+    student : tuple
+        The email and password of a student.
+    instructor : tuple
+        The email and password of an instructor.
+    keywords : list, optional
+        The keywords to search for.
+
+    """
+    record_statements(True)
+    try:
+        # Log in from the database, not the login cache
+        invalidate_logins()
+        service.login(*student, "Student")
+        session = service.login(*instructor, "Instructor")
+        for keyword in keywords:
+            page = service.search(keyword, 10)
+            if page:
+                postid, relevance = page[-1]
+                service.search(keyword, 10, (relevance, postid))
+        page = service.statistics(session, 10)
+        if page:
+            userid, _, threads_read, _ = page[-1]
+            service.statistics(session, 10, (threads_read, userid))
+    finally:
+        record_statements(False)
+
+
+def time_statement(cnx, cmd, args, repeat):
+    """Get the median latency of a statement in milliseconds.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+    cmd : str
+        The MySQL statement.
+    args : tuple
+        The arguments of the statement.
+    repeat : int
+        The number of executions.
+
+    Returns
+    -------
+    float
+        The median latency of executing the statement and fetching its rows.
+
+    """
+    times = []
+    with cnx.cursor() as cursor:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cursor.execute(cmd, args)
+            cursor.fetchall()
+            times.append(1000 * (time.perf_counter() - start))
+    return statistics.median(times)
+
+
+def explain(cnx, cmd, args):
+    """Get the `EXPLAIN` rows of a statement.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+    cmd : str
+        The MySQL statement.
+    args : tuple
+        The arguments of the statement.
+
+    Returns
+    -------
+    list
+        A dict for each row of the `EXPLAIN` output.
+
+    """
+    with cnx.cursor(dictionary=True) as cursor:
+        cursor.execute("EXPLAIN " + cmd, args)
+        return cursor.fetchall()
+
+
+def explain_analyze(cnx, cmd, args):
+    """Get the `EXPLAIN ANALYZE` output of a statement, executing it.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+    cmd : str
+        The MySQL statement.
+    args : tuple
+        The arguments of the statement.
+
+    Returns
+    -------
+    str
+        The plan with the measured time and rows of each step, or the error
+        if the server does not support `EXPLAIN ANALYZE` (before MySQL 8.0.18).
+
+    """
+    try:
+        with cnx.cursor() as cursor:
+            cursor.execute("EXPLAIN ANALYZE " + cmd, args)
+            return "\n".join(row[0] for row in cursor.fetchall())
+    except connector.Error as err:
+        return err.msg
+
+
+def secondary_indexes(cnx):
+    """Get the secondary indexes of the tables of the database.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+
+    Returns
+    -------
+    dict
+        The columns of each index, by (table, index).
+
+    """
+    with cnx.cursor() as cursor:
+        cursor.execute(
+            "SELECT TABLE_NAME, INDEX_NAME, COLUMN_NAME "
+            "FROM information_schema.STATISTICS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND INDEX_NAME != 'PRIMARY' "
+            "ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX"
+        )
+        indexes = {}
+        for table, index, column in cursor.fetchall():
+            indexes.setdefault((table, index), []).append(column)
+    return indexes
+
+
+def set_visible(cnx, table, index, visible):
+    """Make an index visible or invisible to the optimizer.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+    table : str
+        The name of the table.
+    index : str
+        The name of the index.
+    visible : bool
+        Make the index visible.
+
+    """
+    with cnx.cursor() as cursor:
+        cursor.execute(
+            "ALTER TABLE `{}` ALTER INDEX `{}` {}".format(
+                table, index, "VISIBLE" if visible else "INVISIBLE"
+            )
+        )
+
+
+def advise(cnx, repeat):
+    """Replay the recorded `SELECT` statements and report on the indexes.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+    repeat : int
+        The number of executions of each statement when timing it.
+
+    Returns
+    -------
+    tuple
+        A list of tuples with the statements doing full table scans, the
+        scanned table and the `EXPLAIN ANALYZE` output, a list of the
+        (table, index) of the unused secondary indexes, and a list of tuples
+        with the (table, index), the statement and its latency in milliseconds
+        with and without the index, for the indexes of `WORKLOAD_INDEXES`.
+
+    """
+    statements = [
+        (cmd, args)
+        for cmd, args in recorded_statements()
+        if cmd.lstrip().upper().startswith("SELECT")
+    ]
+
+    # Indexes used by each statement, and the full table scans
+    used = {}
+    scans = []
+    for cmd, args in statements:
+        for row in explain(cnx, cmd, args):
+            if row["key"]:
+                used.setdefault(row["table"], set()).update(row["key"].split(","))
+            if (
+                row["type"] == "ALL"
+                and row["possible_keys"] is not None
+                and "Using where" in (row["Extra"] or "")
+            ):
+                scans.append((cmd, row["table"], explain_analyze(cnx, cmd, args)))
+
+    unused = [
+        (table, index)
+        for table, index in secondary_indexes(cnx)
+        if index not in used.get(table, set())
+    ]
+
+    # Latency of the statements using each workload index, with and without it
+    latencies = []
+    for table, indexes in WORKLOAD_INDEXES.items():
+        for index in indexes:
+            users = [
+                (cmd, args)
+                for cmd, args in statements
+                if any(
+                    row["table"] == table and index in (row["key"] or "").split(",")
+                    for row in explain(cnx, cmd, args)
+                )
+            ]
+            for cmd, args in users:
+                with_index = time_statement(cnx, cmd, args, repeat)
+                set_visible(cnx, table, index, False)
+                try:
+                    without_index = time_statement(cnx, cmd, args, repeat)
+                finally:
+                    set_visible(cnx, table, index, True)
+                latencies.append(((table, index), cmd, with_index, without_index))
+    return scans, unused, latencies
+
+
+def main():
+    """Run the workload and print the index report."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database", default=DB_NAME)
+    parser.add_argument(
+        "--student", nargs=2, default=["frumford6@ted.com", "XpdsDP085Un"]
+    )
+    parser.add_argument(
+        "--instructor", nargs=2, default=["stretters@mashable.com", "AQqzBO2mTEkB"]
+    )
+    parser.add_argument("--keywords", nargs="+", default=KEYWORDS)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    user = input("Enter MySQL user: ")
+    password = getpass.getpass(prompt="Enter MySQL password: ")
+
+    service = PiazzaService(user, password, args.database)
+    run_workload(service, args.student, args.instructor, args.keywords)
+    with get_pool(user, password, args.database).connection() as cnx:
+        scans, unused, latencies = advise(cnx, args.repeat)
+
+    print("\nFull table scans where a key could be used:")
+    for cmd, table, plan in scans:
+        print(f"\n{table}: {cmd}\n{plan}")
+    if not scans:
+        print("None")
+
+    print("\nSecondary indexes not used by the workload:")
+    for table, index in unused:
+        print(f"  {table}.{index}")
+    if not unused:
+        print("None")
+
+    table = PrettyTable()
+    table.field_names = ["Index", "Statement", "With (ms)", "Without (ms)"]
+    table.align = "l"
+    table.max_width["Statement"] = 60
+    for (tablename, index), cmd, with_index, without_index in latencies:
+        table.add_row(
+            [
+                f"{tablename}.{index}",
+                " ".join(cmd.split()),
+                f"{with_index:.2f}",
+                f"{without_index:.2f}",
+            ]
+        )
+    print("\nLatency of the statements using the workload indexes:")
+    print(table)
+
+
+if __name__ == "__main__":
+    main()
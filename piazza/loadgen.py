@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""Load generator for the Piazza HTTP/JSON server.
+
+This module contains code that simulates many concurrent students against a
+running `server.py`. Every simulated student logs in, then repeatedly searches
+for a keyword, and with some probability creates a thread or replies to one of
+the threads it created, over a kept alive connection. The throughput and the
+p50 and p99 latency of the successful requests of each endpoint are reported at
+the end.
+
+Usage:
+    python loadgen.py --email frumford6@ted.com --password XpdsDP085Un \
+        --clients 1000 --duration 30
+
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from prettytable import PrettyTable
+
+# Keywords the simulated students search for
+KEYWORDS = ["exam", "database", "WAL", "transaction", "index", "join"]
+
+
+class Client:
+    """Class for a kept alive HTTP/1.1 connection to the server.
+
+    Attributes
+    ----------
+    latencies : dict
+        The latencies in seconds of the successful requests, by endpoint.
+    errors : dict
+        The number of failed requests, by endpoint.
+    """
+
+    def __init__(self, host, port, latencies, errors):
+        self.host = host
+        self.port = port
+        self.latencies = latencies
+        self.errors = errors
+        self.token = None
+        self._reader = None
+        self._writer = None
+
+    async def request(self, method, path, body=None):
+        """Send a request and read the JSON response.
+
+        Parameters
+        ----------
+        method : str
+            The HTTP method.
+        path : str
+            The path and query of the endpoint.
+        body : dict, optional
+            The JSON body of the request.
+
+        Returns
+        -------
+        dict
+            The JSON body of the response, or None if the request failed.
+
+        """
+        endpoint = f"{method} {path.split('?')[0]}"
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+        if self.token is not None:
+            head += f"Authorization: Bearer {self.token}\r\n"
+        head += f"Content-Length: {len(data)}\r\n\r\n"
+
+        start = time.perf_counter()
+        try:
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_connection(
+                    self.host, self.port
+                )
+            self._writer.write(head.encode("latin-1") + data)
+            await self._writer.drain()
+            status, content = await self._read_response()
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            self.close()
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            return None
+        if status != 200:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            return None
+        # Only successful requests, as errors are often answered much faster
+        self.latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+        return content
+
+    async def _read_response(self):
+        """Helper function to read the status and JSON body of a response."""
+        line = await self._reader.readline()
+        if not line:
+            raise asyncio.IncompleteReadError(b"", None)
+        status = int(line.split()[1])
+        length = 0
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self._reader.readexactly(length))
+
+    def close(self):
+        """Close the connection."""
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+async def student(client, args, deadline):
+    """Simulate one student until the deadline."""
+    response = await client.request(
+        "POST",
+        "/login",
+        {"email": args.email, "password": args.password, "role": "Student"},
+    )
+    if response is None:
+        return
+    client.token = response["token"]
+
+    # PostIDs of the threads created by the student, as the search also finds
+    # replies and follow-ups, which cannot be replied to
+    threads = []
+    while time.monotonic() < deadline:
+        keyword = random.choice(KEYWORDS)
+        await client.request("GET", f"/search?keyword={keyword}&limit=20")
+
+        if random.random() < args.write_ratio:
+            if threads and random.random() < 0.5:
+                await client.request(
+                    "POST",
+                    "/replies",
+                    {"post_id": random.choice(threads), "content": keyword},
+                )
+            else:
+                response = await client.request(
+                    "POST",
+                    "/threads",
+                    {"content": f"Question about {keyword}", "tags": [keyword]},
+                )
+                if response is not None:
+                    threads.extend(response["post_ids"])
+    client.close()
+
+
+async def run(args):
+    """Run the simulated students and return the latencies and errors."""
+    latencies = {}
+    errors = {}
+    deadline = time.monotonic() + args.duration
+    clients = [
+        Client(args.host, args.port, latencies, errors) for _ in range(args.clients)
+    ]
+    await asyncio.gather(*(student(c, args, deadline) for c in clients))
+    return latencies, errors
+
+
+def main():
+    """Run the load and print the throughput and latency of each endpoint."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument(
+        "--write-ratio",
+        type=float,
+        default=0.1,
+        help="probability of creating a post after a search",
+    )
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    latencies, errors = asyncio.run(run(args))
+    elapsed = time.perf_counter() - start
+
+    table = PrettyTable()
+    table.field_names = [
+        "Endpoint",
+        "Requests",
+        "Errors",
+        "Req/s",
+        "p50 (ms)",
+        "p99 (ms)",
+    ]
+    table.align = "r"
+    table.align["Endpoint"] = "l"
+    for endpoint in sorted(latencies.keys() | errors.keys()):
+        times = sorted(latencies.get(endpoint, []))
+        p50 = p99 = 0.0
+        if len(times) > 1:
+            quantiles = statistics.quantiles(times, n=100, method="inclusive")
+            p50, p99 = quantiles[49], quantiles[98]
+        elif times:
+            p50 = p99 = times[0]
+        table.add_row([
+            endpoint,
+            len(times) + errors.get(endpoint, 0),
+            errors.get(endpoint, 0),
+            f"{len(times) / elapsed:.1f}",
+            f"{1000 * p50:.2f}",
+            f"{1000 * p99:.2f}",
+        ])
+    print(table)
+    total = sum(len(times) for times in latencies.values())
+    failed = sum(errors.values())
+    print(
+        f"{total + failed} requests ({failed} failed) in {elapsed:.1f} s, "
+        f"{total / elapsed:.1f} successful req/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
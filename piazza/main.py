@@ -5,32 +5,121 @@ Author: Simen Omholt-Jensen, Anna Zhang, Vebjørn Steinsholt
 
 This module contains code that runs the piazza interface.
 """
+import os
 import sys
 import getpass
+import argparse
+import profiling
 from tables import TABLES
 from tables import DB_NAME
 from utils import setup_database
 from utils import insert_data
 from piazza_user import Student
 from piazza_user import Instructor
+from pool import get_pool
+from query import record_statements
+from query import explain_statements
+from query import set_key_mode
+from query import KEY_MODES
+from search_index import SearchIndex
+from search_index import set_index
 
 
 def main():
     """Sets up the database and runs the program.
 
     Program prompts user for their MySQL login information. A database called
-    `TDT4145ProjectGroup131` is created and filled with data from the `.csv`
-    files in the `data` folder. Program is then run.
+    `TDT4145ProjectGroup131` is created if it does not exist, and filled with
+    the data from the `.csv` files in the `data` folder that is not already
+    loaded. With the `--rebuild` option the database is dropped and created
+    from scratch. Program is then run. With the `--explain` option the executed
+    queries are checked for full table scans on keyed lookups when quitting,
+    and the program exits with an error if any are found. With the
+    `--memory-index` option the keyword search is answered from an in-memory
+    index built at startup. With the `--profile` option the executed queries
+    are timed, and a report is written when quitting, with `EXPLAIN` of the
+    queries slower than `--slow-ms`. With `--key-mode random` new posts get
+    random version 4 uuids instead of time-ordered version 7 uuids as keys.
+    `--batch-size` sets the number of rows per `INSERT` statement when loading
+    the data, and with `--load-infile` the files are loaded with `LOAD DATA
+    LOCAL INFILE` if the server allows it.
 
     """
+    parser = argparse.ArgumentParser(description="Piazza interface")
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="drop and recreate the database before loading the data",
+    )
+    parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="check the executed queries for full table scans when quitting",
+    )
+    parser.add_argument(
+        "--memory-index",
+        action="store_true",
+        help="answer the keyword search from an in-memory index",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="time the executed queries and write a report when quitting, "
+        "as Prometheus metrics if PATH ends in .prom",
+    )
+    parser.add_argument(
+        "--slow-ms",
+        type=float,
+        help="log queries slower than this many milliseconds with --profile",
+    )
+    parser.add_argument(
+        "--key-mode",
+        choices=KEY_MODES,
+        default="time",
+        help="generate time-ordered or random keys for new posts",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1000,
+        help="number of rows per INSERT statement when loading the data",
+    )
+    parser.add_argument(
+        "--load-infile",
+        action="store_true",
+        help="load the data with LOAD DATA LOCAL INFILE if the server allows it",
+    )
+    args = parser.parse_args()
+    set_key_mode(args.key_mode)
 
     # Prompt the user for their MySQL login inforamtion
     user = input("Enter MySQL user: ")
     password = getpass.getpass(prompt="Enter MySQL password: ")
 
+    if args.profile:
+        slow = args.slow_ms / 1000 if args.slow_ms is not None else None
+        profiling.enable(slow_threshold=slow)
+
     # create piazza database
-    setup_database(user, password, DB_NAME, TABLES)
-    insert_data(user, password, DB_NAME)
+    setup_database(user, password, DB_NAME, TABLES, rebuild=args.rebuild)
+    insert_data(
+        user,
+        password,
+        DB_NAME,
+        batch_size=args.batch_size,
+        load_infile=args.load_infile,
+        workers=os.cpu_count(),
+    )
+    record_statements(args.explain)
+
+    if args.memory_index:
+        with get_pool(user, password, DB_NAME).connection() as cnx:
+            index = SearchIndex.build(cnx)
+        set_index(index)
+        print(
+            f"Search index built: {index.num_posts} posts, {index.num_texts} texts, "
+            f"{index.memory_usage() / 1024:.0f} KiB"
+        )
 
     login_string = (
         "\nYou have three options:\n"
@@ -49,6 +138,17 @@ def main():
             instructor = Instructor(user, password, DB_NAME)
             instructor.close()
         elif string.lower() == "q":
+            if args.profile:
+                with get_pool(user, password, DB_NAME).connection() as cnx:
+                    profiling.write_report(args.profile, cnx)
+                print(f"Query profile written to {args.profile}")
+            if args.explain:
+                with get_pool(user, password, DB_NAME).connection() as cnx:
+                    problems = explain_statements(cnx)
+                for cmd, reason in problems:
+                    print(f"\n{reason}:\n{cmd}")
+                if problems:
+                    sys.exit(1)
             print("\nBye!")
             sys.exit(0)
         else:
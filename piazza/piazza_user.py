@@ -1,43 +1,53 @@
 # -*- coding: utf-8 -*-
 """Classes containing functionality for the required use cases.
 
-This module contains code for the classes implementing the functionality for the
-required use cases. The PiazzaUser class is a superclass to the Instructor and
-Student classes. The PiazzaUser contains functionality shared between the
-Instructor and Student classes such as logging in, creating posts such as
-threads or replies, and keyword search. The Instructor classes includes
-functionality for viewing statistics.
+This module contains code for the classes implementing the interactive
+interface for the required use cases. The PiazzaUser class is a superclass to
+the Instructor and Student classes. The PiazzaUser contains functionality
+shared between the Instructor and Student classes such as logging in, creating
+posts such as threads or replies, keyword search and viewing threads. The
+Instructor classes includes functionality for viewing statistics. The classes
+prompt the user and print the results, and the use cases themselves are
+implemented by the PiazzaService class in `service.py`.
 
 """
-import uuid
 import getpass
 from mysql import connector
 from prettytable import PrettyTable
+from service import PiazzaService
+from service import LoginError
+
+
+# Number of PostIDs shown per page of search results
+SEARCH_PAGE_SIZE = 50
+
+# Number of users shown per page of statistics
+STATISTICS_PAGE_SIZE = 50
 
 
 class PiazzaUser:
     """Class for login, post creation and keyword search functionality.
 
-    This class includes functionality for setting up a MySQL connection to the
-    `TDT4145ProjectGroup131` database, loggin into the Piazza interface,
+    This class includes functionality for loggin into the Piazza interface,
     creating different types of posts such as threads and replies, and keyword
-    search among posts in the database.
+    search among posts in the `TDT4145ProjectGroup131` database.
 
     Attributes
     ----------
-    cnx : :obj:
-        The mysql.connector object used to establish a connection to the MySQL
-        database.
+    service : :obj:
+        The PiazzaService executing the use cases.
     userid : str
         The retrieved UserID from successful login attempt.
     courseid : str
         The retrieved CourseID from successful login attempt.
     pcid : str
         The retrieved PCID from successful login attempt.
+    session : :obj:
+        The Session of the user from successful login attempt.
     """
 
     def __init__(self, user, password, DB_NAME):
-        """Set up MySQL connection and call login function
+        """Create the PiazzaService and call login function
 
         Parameters
         ----------
@@ -49,7 +59,7 @@ class PiazzaUser:
             The MySQL database name (`TDT4145ProjectGroup131`).
 
         """
-        self.cnx = connector.connect(user=user, password=password, database=DB_NAME)
+        self.service = PiazzaService(user, password, DB_NAME)
         self.login()
 
     def login(self):
@@ -71,106 +81,30 @@ class PiazzaUser:
         """
         while True:
             useremail = input("\nPlease enter email: ")
-            args = (useremail,)
-            with self.cnx.cursor() as cursor:
-                cmd = "SELECT * FROM Login WHERE UserEmail= %s"
-                cursor.execute(cmd, args)
-                result = cursor.fetchall()
-
-            if result:
-                userpassword = getpass.getpass(prompt="Please enter password: ")
-                args = (useremail, userpassword)
-                with self.cnx.cursor() as cursor:
-                    cmd = (
-                        "SELECT * FROM Login "
-                        "WHERE UserEmail = %s AND Password = %s"
-                    )
-                    cursor.execute(cmd, args)
-                    result = cursor.fetchall()
-
-                if result:
-                    # Get User ID
-                    with self.cnx.cursor() as cursor:
-                        cmd = (
-                            "SELECT BIN_TO_UUID(UserID) FROM User "
-                            "WHERE UserEmail = %s"
-                        )
-                        args = (useremail,)
-                        cursor.execute(cmd, args)
-                        result = cursor.fetchall()
-                        self.userid = result[0][0]
-
-                    # Check if user is instructor or student
-                    if isinstance(self, Student):
-                        cmd = (
-                            "SELECT BIN_TO_UUID(StudentID) FROM Student "
-                            "WHERE BIN_TO_UUID(StudentID)=%s"
-                        )
-                    else:
-                        assert isinstance(self, Instructor)
-                        cmd = (
-                            "SELECT BIN_TO_UUID(InstructorID) "
-                            "FROM Instructor "
-                            "WHERE BIN_TO_UUID(InstructorID)=%s"
-                        )
-                    with self.cnx.cursor() as cursor:
-                        args = (self.userid,)
-                        cursor.execute(cmd, args)
-                        result = cursor.fetchall()
-
-                    if result:
-                        # Get courseID
-                        with self.cnx.cursor() as cursor:
-                            cmd = (
-                                "SELECT BIN_TO_UUID(CourseID) "
-                                "FROM UserInCourse "
-                                "WHERE BIN_TO_UUID(UserID)=%s"
-                            )
-                            args = (self.userid,)
-                            cursor.execute(cmd, args)
-                            result = cursor.fetchall()
-                            self.courseid = result[0][0]
-
-                        # Get student or instructor pcid
-                        if isinstance(self, Student):
-                            cmd = (
-                                "SELECT BIN_TO_UUID(PCID) "
-                                "FROM Student "
-                                "WHERE BIN_TO_UUID(StudentID)=%s"
-                            )
-                        else:
-                            assert isinstance(self, Instructor)
-                            cmd = (
-                                "SELECT BIN_TO_UUID(PCID) "
-                                "FROM Instructor "
-                                "WHERE BIN_TO_UUID(InstructorID)=%s"
-                            )
-                        with self.cnx.cursor() as cursor:
-                            args = (self.userid,)
-                            cursor.execute(cmd, args)
-                            result = cursor.fetchall()
-                            self.pcid = result[0][0]
-                        return
-
-                    if isinstance(self, Student):
-                        print("You are not a Student!")
-                    else:
-                        print("You are not an Instructor!")
-                else:
-                    print("Incorrect password")
-            else:
-                print("Email not in database")
+            userpassword = getpass.getpass(prompt="Please enter password: ")
+            try:
+                session = self.service.login(useremail, userpassword, self.ROLE)
+            except LoginError as err:
+                print(err)
+                continue
+
+            self.session = session
+            self.userid = session.userid
+            self.courseid = session.courseid
+            self.pcid = session.pcid
+            return
 
     def create_post(self):
         """Prompt user for post creation details
 
-        User can create a thread, a reply, or go back.
+        User can create a thread, a reply, several replies, or go back.
         """
 
         create_post_string = (
-            "\n\nYou have three options:\n"
+            "\n\nYou have four options:\n"
             "- Create a thread       [1]\n"
             "- Create a reply        [2]\n"
+            "- Create many replies   [3]\n"
             "- Go back               [q]\n"
         )
 
@@ -181,103 +115,117 @@ class PiazzaUser:
                 self.create_thread()
             elif post_string == "2":
                 self.create_reply()
+            elif post_string == "3":
+                self.create_replies_batch()
             elif post_string.lower() == "q":
                 return
             else:
                 print("Wrong option, try again")
 
     def create_thread(self):
-        """Execute MySQL quries necessary for thread creation.
+        """Prompt user for thread details and create the thread.
 
-        Prompt the user for post content, folder, and tag. Then update the
-        `TDT4145ProjectGroup131` database by inserting new data into the `Post`,
-        `Thread`, `Tags`, and `ThreadInFolder` tables.
+        Prompt the user for post content, folders, and tags. Several folders
+        or tags are separated by commas.
 
         """
         postcontent = input("Please enter your post content: ")
-        folder = input("Please enter your post folder: ")
-        tag = input("Please enter your post tag: ")
-
-        # Insert into Post
-        with self.cnx.cursor() as cursor:
-            cmd = "INSERT INTO Post VALUES(%s, %s, %s, 'Thread')"
-            # Genereate postid
-            postid = uuid.uuid4()
-            print(f"\nPostID of created post: {str(postid)}")
-            postid = postid.bytes
-            pcid = uuid.UUID(self.pcid).bytes
-            args = (postid, postcontent, pcid)
-            cursor.execute(cmd, args)
-            self.cnx.commit()
-
-        # Insert into Thread
-        with self.cnx.cursor() as cursor:
-            # New thread gets 0 as colorcode, and NULL values for reply fields.
-            cmd = "INSERT INTO Thread VALUES(%s, 0, NULL, NULL)"
-            args = (postid,)
-            cursor.execute(cmd, args)
-            self.cnx.commit()
-
-        # Insert into Tags
-        with self.cnx.cursor() as cursor:
-            cmd = "INSERT INTO Tags VALUES(%s, %s)"
-            args = (postid, tag)
-            cursor.execute(cmd, args)
-            self.cnx.commit()
-
-        # Insert into ThreadInFolder
-        with self.cnx.cursor() as cursor:
-            cmd = "INSERT INTO ThreadInFolder VALUES(%s, %s, %s)"
-            courseid = uuid.UUID(self.courseid).bytes
-            args = (postid, courseid, folder)
-            cursor.execute(cmd, args)
-            self.cnx.commit()
+        folders = _split(input("Please enter your post folders: "))
+        tags = _split(input("Please enter your post tags: "))
+
+        try:
+            postid = self.create_threads([(postcontent, folders, tags)])[0]
+        except connector.Error as err:
+            print(f"Could not create thread: {err.msg}")
+            return
+        print(f"\nPostID of created post: {postid}")
+
+    def create_threads(self, threads):
+        """Create threads as the logged in user.
+
+        See `PiazzaService.create_threads`.
+
+        Parameters
+        ----------
+        threads : list
+            A list of tuples with the post content, the list of folder names
+            and the list of tags of each thread.
+
+        Returns
+        -------
+        list
+            The PostIDs of the created threads.
+
+        """
+        return self.service.create_threads(self.session, threads)
 
     def create_reply(self):
-        """Execute MySQL quries necessary for reply creation.
+        """Prompt user for reply details and create the reply.
 
-        Prompt the user for the id of the post to reply to and post
-        content. Then update the `TDT4145ProjectGroup131` database by inserting
-        new data into the `Post` table, and update the `Thread` table.
+        Prompt the user for the id of the thread to reply to and post content,
+        until a valid thread id is entered.
 
         """
         while True:
             postreplyid = input("Please enter id of post to reply to: ")
             postcontent = input("Please enter your post content: ")
-
-            # check to see if entered postid is valid
-            with self.cnx.cursor() as cursor:
-                cmd = (
-                    "SELECT BIN_TO_UUID(PostID) FROM Post "
-                    "WHERE BIN_TO_UUID(PostID)=%s"
-                )
-                args = (postreplyid,)
-                cursor.execute(cmd, args)
-                result = cursor.fetchall()
-            if result:
-                # Insert into Post table
-                with self.cnx.cursor() as cursor:
-                    cmd = "INSERT INTO Post VALUES(%s, %s, %s, 'Reply')"
-                    # generate reply postid
-                    replyid = uuid.uuid4().bytes
-                    pcid = uuid.UUID(self.pcid).bytes
-                    args = (replyid, postcontent, pcid)
-                    cursor.execute(cmd, args)
-                    self.cnx.commit()
-
-                # Update Thread table
-                with self.cnx.cursor() as cursor:
-                    cmd = (
-                        "UPDATE Thread "
-                        "SET InstructorReplyID=%s, Threadcolor=13 "
-                        "WHERE ThreadID=%s"
-                    )
-                    postreplyid_b = uuid.UUID(postreplyid).bytes
-                    args = (replyid, postreplyid_b)
-                    cursor.execute(cmd, args)
-                    self.cnx.commit()
+            try:
+                self.create_replies([(postreplyid, postcontent)])
+                return
+            except ValueError:
+                print("Wrong post id")
+            except connector.Error as err:
+                print(f"Could not create reply: {err.msg}")
                 return
-            print("Wrong post id")
+
+    def create_replies_batch(self):
+        """Prompt user for several replies and create them together.
+
+        Prompt the user for the id of the thread to reply to and post content
+        of each reply, until an empty id is entered. Then create all replies in
+        a single transaction.
+
+        """
+        replies = []
+        while True:
+            postreplyid = input(
+                "Please enter id of post to reply to (empty to finish): "
+            )
+            if not postreplyid:
+                break
+            postcontent = input("Please enter your post content: ")
+            replies.append((postreplyid, postcontent))
+
+        if not replies:
+            return
+        try:
+            self.create_replies(replies)
+        except ValueError as err:
+            print(f"No replies created: {err}")
+            return
+        except connector.Error as err:
+            print(f"No replies created: {err.msg}")
+            return
+        print(f"Created {len(replies)} replies")
+
+    def create_replies(self, replies):
+        """Create replies as the logged in user.
+
+        See `PiazzaService.create_replies`.
+
+        Parameters
+        ----------
+        replies : list
+            A list of tuples with the id of the thread to reply to and the post
+            content of each reply.
+
+        Returns
+        -------
+        list
+            The PostIDs of the created replies.
+
+        """
+        return self.service.create_replies(self.session, replies)
 
     def search_keyword(self):
         """Let user search the database for a keyword.
@@ -285,78 +233,131 @@ class PiazzaUser:
         The search functionality contains (1) search for keyword in post
         content, (2) search for keyword in thread tags, (3) search for keyword
         in folder names, and (4) search for keyword in user name. The search
-        returns PostIDs for posts related to the above searches. First prompt
-        the user for a keyword, then print list of returned PostIDs.
+        returns PostIDs for posts related to the above searches, most relevant
+        first. If the in-memory search index is used, the keyword is matched as
+        a substring and the PostIDs are not ranked. First prompt the user for a
+        keyword, then print list of returned PostIDs, `SEARCH_PAGE_SIZE` at a
+        time.
 
         """
         keyword = input("Please enter keyword: ")
-        keyword = "%" + keyword + "%"
-        with self.cnx.cursor() as cursor:
-            cmd = (
-                "SELECT BIN_TO_UUID(PostID) FROM Post "
-                "WHERE PostContent LIKE %s"
-            )
-            args = (keyword,)
-            cursor.execute(cmd, args)
-            result1 = cursor.fetchall()
-            result1 = [t[0] for t in result1]
-
-        with self.cnx.cursor() as cursor:
-            cmd = (
-                "SELECT BIN_TO_UUID(ThreadID) FROM Tags "
-                "WHERE Tag LIKE %s"
-            )
-            args = (keyword,)
-            cursor.execute(cmd, args)
-            result2 = cursor.fetchall()
-            result2 = [t[0] for t in result2]
-
-        with self.cnx.cursor() as cursor:
-            cmd = (
-                "SELECT BIN_TO_UUID(ThreadID) FROM ThreadInFolder "
-                "INNER JOIN "
-                "(SELECT * FROM Folder "
-                "WHERE FolderName LIKE %s) AS T1 "
-                "USING (CourseID, FolderName);"
-            )
-            args = (keyword,)
-            cursor.execute(cmd, args)
-            result3 = cursor.fetchall()
-            result3 = [t[0] for t in result3]
-
-        with self.cnx.cursor() as cursor:
-            cmd = (
-                "SELECT BIN_TO_UUID(PostID) FROM Post "
-                "INNER JOIN "
-                "(SELECT PCID FROM Student INNER JOIN "
-                "(SELECT UserID FROM User WHERE UserName LIKE %s) AS U1 "
-                "ON (UserID=StudentID) "
-                "UNION "
-                "SELECT PCID FROM Instructor INNER JOIN "
-                "(SELECT UserID FROM User WHERE UserName LIKE %s) AS U2 "
-                "ON (UserID=InstructorID)) AS T1 "
-                "USING(PCID);"
-            )
-            args = (keyword, keyword)
-            cursor.execute(cmd, args)
-            result4 = cursor.fetchall()
-            result4 = [t[0] for t in result4]
-
-        result = result1 + result2 + result3 + result4
-        # Only unique items
-        result = list(set(result))
-        # Print nice table
+
+        # Print nice table, one page at a time
         print("Here are your search results:")
-        table = PrettyTable()
-        table.field_names = ["PostID"]
-        for i in result:
-            table.add_row([i])
-        print(table)
+        for page in self._search_pages(keyword):
+            table = PrettyTable()
+            table.field_names = ["PostID"]
+            for i in page:
+                table.add_row([i])
+            print(table)
+            if len(page) < SEARCH_PAGE_SIZE:
+                break
+            if input("Show more results? [y/N] ").lower() != "y":
+                break
+
+    def _search_pages(self, keyword):
+        """Helper function to get the search results one page at a time.
+
+        Parameters
+        ----------
+        keyword : str
+            The entered keyword.
+
+        Yields
+        ------
+        list
+            The PostIDs of the next page of results. The last page has less
+            than `SEARCH_PAGE_SIZE` PostIDs, and may be empty.
+
+        """
+        after = None
+        while True:
+            page = self.service.search(keyword, SEARCH_PAGE_SIZE, after)
+            yield [postid for postid, _ in page]
+            if len(page) < SEARCH_PAGE_SIZE:
+                return
+            # Continue after the last post of the page
+            postid, relevance = page[-1]
+            after = (relevance, postid)
+
+    def show_thread(self):
+        """Let user view a thread and write follow-ups in it.
+
+        Prompt the user for a thread id, and print the thread with its answers
+        and follow-ups. The user can then write follow-ups to the thread or to
+        one of its follow-ups, and the thread is printed again after each.
+
+        """
+        threadid = input("Please enter id of thread: ")
+        try:
+            text = self.service.show_thread(self.session, threadid)
+        except ValueError:
+            text = None
+        if text is None:
+            print("Wrong thread id")
+            return
+        print("\n" + text)
+
+        while input("Write a follow-up? [y/N] ").lower() == "y":
+            parentid = input(
+                "Please enter id of follow-up to reply to (empty for the thread): "
+            )
+            postcontent = input("Please enter your post content: ")
+            try:
+                postid = self.service.create_followup(
+                    self.session, threadid, postcontent, parentid or None
+                )
+            except ValueError:
+                print("Wrong post id")
+                continue
+            except connector.Error as err:
+                print(f"Could not create follow-up: {err.msg}")
+                continue
+            print(f"\nPostID of created follow-up: {postid}")
+            print("\n" + self.service.show_thread(self.session, threadid))
+
+    def view_thread(self, threadid):
+        """Record that the user viewed a thread.
+
+        The view is buffered, and written to the `UserViewsThread` table in
+        the background.
+
+        Parameters
+        ----------
+        threadid : str
+            The ThreadID of the viewed thread.
+
+        Raises
+        ------
+        ValueError
+            If the id is not a valid uuid.
+
+        """
+        self.service.view_thread(self.session, threadid)
+
+    def like_post(self, postid):
+        """Record that the user liked a post.
+
+        The like is buffered, and written to the `UserLikesPost` table in the
+        background.
+
+        Parameters
+        ----------
+        postid : str
+            The PostID of the liked post.
+
+        Raises
+        ------
+        ValueError
+            If the id is not a valid uuid.
+
+        """
+        self.service.like_post(self.session, postid)
 
     def close(self):
-        """Close the MySQL connection.
+        """Log the user out.
         """
-        self.cnx.close()
+        self.session = None
 
 
 class Student(PiazzaUser):
@@ -366,6 +367,8 @@ class Student(PiazzaUser):
 
     """
 
+    ROLE = "Student"
+
     def __init__(self, user, password, DB_NAME):
         """Call the PiazzaUser __init__ and Student action_menu functions.
 
@@ -385,12 +388,14 @@ class Student(PiazzaUser):
     def action_menu(self):
         """Student action menu interface.
 
-        A student can make a post, search for a keyword or log out.
+        A student can make a post, search for a keyword, view a thread or log
+        out.
         """
         action_menu_string = (
-            "\n\nYou have three options:\n"
+            "\n\nYou have four options:\n"
             "- Make a post            [1]\n"
             "- Search for a keyword   [2]\n"
+            "- View a thread          [3]\n"
             "- Log out                [q]\n"
         )
 
@@ -401,6 +406,8 @@ class Student(PiazzaUser):
                 self.create_post()
             elif action_string == "2":
                 self.search_keyword()
+            elif action_string == "3":
+                self.show_thread()
             elif action_string.lower() == "q":
                 return
             else:
@@ -415,6 +422,8 @@ class Instructor(PiazzaUser):
 
     """
 
+    ROLE = "Instructor"
+
     def __init__(self, user, password, DB_NAME):
         """Call the PiazzaUser __init__ and Instructor action_menu functions.
 
@@ -434,15 +443,17 @@ class Instructor(PiazzaUser):
     def action_menu(self):
         """Instructior action menu interface.
 
-        An instructor can make a post, search for a keyword, view statistics or
-        log out.
+        An instructor can make a post, search for a keyword, view a thread,
+        view statistics, export statistics or log out.
 
         """
         action_menu_string = (
-            "\n\nYou have four options:\n"
+            "\n\nYou have six options:\n"
             "- Make a post            [1]\n"
             "- Search for a keyword   [2]\n"
-            "- View Statistics        [3]\n"
+            "- View a thread          [3]\n"
+            "- View Statistics        [4]\n"
+            "- Export Statistics      [5]\n"
             "- Log out                [q]\n"
         )
 
@@ -454,7 +465,11 @@ class Instructor(PiazzaUser):
             elif action_string == "2":
                 self.search_keyword()
             elif action_string == "3":
+                self.show_thread()
+            elif action_string == "4":
                 self.view_statistics()
+            elif action_string == "5":
+                self.export_statistics()
             elif action_string.lower() == "q":
                 return
             else:
@@ -463,53 +478,88 @@ class Instructor(PiazzaUser):
     def view_statistics(self):
         """Print thread views and post creation statistics.
 
-        Print the usernames, numberOfThreadsRead, and numberOfPostsCreated.
+        Print the usernames, numberOfThreadsRead, and numberOfPostsCreated,
+        read from the `UserStats` table. Prompt the user for the number of
+        users to show, then print the statistics `STATISTICS_PAGE_SIZE` users
+        at a time.
         """
-        with self.cnx.cursor() as cursor:
-            cmd = (
-                "SELECT UserName, "
-                "NumberOfThreadsRead, "
-                "NumberOfPostscreated "
-                "FROM User "
-                "INNER JOIN "
-                "(SELECT UserID, "
-                "NumberOfThreadsRead, "
-                "NumberOfPostsCreated "
-                "FROM "
-                "(SELECT UserID, "
-                "COUNT(PostID) AS NumberOfPostsCreated "
-                "FROM "
-                "(SELECT UserID, "
-                "PCID "
-                "FROM User "
-                "INNER JOIN Student ON (UserID=StudentID) "
-                "UNION SELECT UserID, "
-                "PCID "
-                "FROM User "
-                "INNER JOIN Instructor ON (UserID=InstructorID)) AS T1 "
-                "LEFT OUTER JOIN Post USING (PCID) "
-                "GROUP BY (UserID)) AS T2 "
-                "INNER JOIN "
-                "(SELECT Userid, "
-                "COUNT(ThreadID) AS NumberOfThreadsRead "
-                "FROM User "
-                "LEFT OUTER JOIN UserViewsThread USING (UserID) "
-                "GROUP BY (UserID)) AS T3 USING (UserID)) AS T4 USING (UserID) "
-                "ORDER BY NumberOfThreadsRead DESC"
-            )
+        limit = _read_limit()
+        after = None
+        shown = 0
+        while limit is None or shown < limit:
+            page_size = STATISTICS_PAGE_SIZE
+            if limit is not None:
+                page_size = min(page_size, limit - shown)
+
+            table = PrettyTable()
+            table.field_names = [
+                "UserName",
+                "NumberOfThreadsRead",
+                "NumberOfPostsCreated",
+            ]
+            table.align["UserName"] = "l"
+            table.align["NumberOfThreadsRead"] = "r"
+            table.align["NumberOfPostsCreated"] = "r"
+            count = 0
+            for row in self.service.statistics(self.session, page_size, after):
+                table.add_row(list(row[1:]))
+                count += 1
+            print(table)
+
+            shown += count
+            if count < page_size or shown == limit:
+                return
+            if input("Show more users? [y/N] ").lower() != "y":
+                return
+            # Continue after the last user of the page
+            after = (row[2], row[0])
+
+    def export_statistics(self):
+        """Export thread views and post creation statistics to a file.
+
+        Prompt the user for the number of users to export and a `.csv` or
+        `.json` file name, then stream the statistics to the file.
+        """
+        limit = _read_limit()
+        path = input("Please enter file name (.csv or .json): ")
+        try:
+            count = self.service.export_statistics(self.session, path, limit)
+        except (ValueError, OSError) as err:
+            print(err)
+            return
+        print(f"Exported statistics of {count} users to {path}")
 
-            cursor.execute(cmd)
-            result = cursor.fetchall()
-
-        table = PrettyTable()
-        table.field_names = [
-            "UserName",
-            "NumberOfThreadsRead",
-            "NumberOfPostsCreated",
-        ]
-        table.align["UserName"] = "l"
-        table.align["NumberOfThreadsRead"] = "r"
-        table.align["NumberOfPostsCreated"] = "r"
-        for row in result:
-            table.add_row(list(row))
-        print(table)
+
+def _split(string):
+    """Helper function to split a comma separated list of names.
+
+    Parameters
+    ----------
+    string : str
+        The entered names, separated by commas.
+
+    Returns
+    -------
+    list
+        The names without surrounding whitespace, empty names removed.
+
+    """
+    return [name.strip() for name in string.split(",") if name.strip()]
+
+
+def _read_limit():
+    """Helper function to prompt for the number of users in the statistics.
+
+    Returns
+    -------
+    int
+        The entered number of users, or None for all users.
+
+    """
+    while True:
+        string = input("Please enter number of users (empty for all): ")
+        if not string:
+            return None
+        if string.isdigit() and int(string) > 0:
+            return int(string)
+        print("Wrong number, try again")
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""Process-wide pool of MySQL connections.
+
+This module contains code that shares MySQL connections between the Piazza
+users and the database setup, so that a login does not pay for a new TCP
+connection and authentication handshake. The pool is built on
+`mysql.connector.pooling`. Connections are health checked when taken from the
+pool, and the pool keeps count of how many connections were served from the
+pool (hits) and how many had to be opened (misses).
+
+"""
+import threading
+from contextlib import contextmanager
+from mysql import connector
+from mysql.connector import errors
+from mysql.connector import pooling
+
+# Default number of connections kept open in a pool
+DEFAULT_POOL_SIZE = 8
+
+# Pools shared by the process, keyed on their connection arguments
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+class ConnectionPool:
+    """Class for a pool of MySQL connections to one database.
+
+    The connections are opened the first time a connection is requested, so a
+    pool can be created before its database exists. When all the pooled
+    connections are in use, or a connection with other options than the pool
+    is requested, a new connection is opened and closed again when returned.
+
+    Attributes
+    ----------
+    config : dict
+        The arguments passed to mysql.connector.connect.
+    pool_size : int
+        The number of connections kept open in the pool.
+    health_check : bool
+        Ping connections taken from the pool, and reconnect if they are broken.
+    """
+
+    def __init__(
+        self, user, password, DB_NAME, pool_size=DEFAULT_POOL_SIZE, health_check=True
+    ):
+        """Store the connection arguments of the pool.
+
+        Parameters
+        ----------
+        user : str
+            The entered MySQL user.
+        password : str
+            The entered MySQL password.
+        DB_NAME : str
+            The MySQL database name (`TDT4145ProjectGroup131`).
+        pool_size : int, optional
+            The number of connections kept open in the pool.
+        health_check : bool, optional
+            Ping connections taken from the pool.
+
+        """
+        self.config = {"user": user, "password": password, "database": DB_NAME}
+        self.pool_size = min(pool_size, pooling.CNX_POOL_MAXSIZE)
+        self.health_check = health_check
+        self._pool = None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "reconnects": 0, "in_use": 0}
+
+    def _count(self, key, value=1):
+        """Helper function to update a pool metric."""
+        with self._lock:
+            self._stats[key] += value
+
+    def get_connection(self, **options):
+        """Get a connection from the pool.
+
+        The connection is returned to the pool when it is closed.
+
+        Parameters
+        ----------
+        **options
+            Connection arguments overriding the arguments of the pool, e.g.
+            `database=None` to connect without selecting the database. A new
+            connection is opened if any are given.
+
+        Returns
+        -------
+        :obj:
+            The pooled mysql.connector connection object.
+
+        """
+        if options:
+            self._count("misses")
+            return _Connection(self, connector.connect(**{**self.config, **options}))
+
+        with self._lock:
+            if self._pool is None:
+                self._pool = pooling.MySQLConnectionPool(
+                    pool_size=self.pool_size, **self.config
+                )
+        try:
+            cnx = self._pool.get_connection()
+        except errors.PoolError:
+            # Every pooled connection is in use
+            self._count("misses")
+            return _Connection(self, connector.connect(**self.config))
+
+        self._count("hits")
+        if self.health_check:
+            try:
+                cnx.ping()
+            except connector.Error:
+                cnx.reconnect()
+                self._count("reconnects")
+        return _Connection(self, cnx)
+
+    @contextmanager
+    def connection(self, **options):
+        """Context manager getting a connection and returning it when done.
+
+        Parameters
+        ----------
+        **options
+            Connection arguments overriding the arguments of the pool.
+
+        """
+        cnx = self.get_connection(**options)
+        try:
+            yield cnx
+        finally:
+            cnx.close()
+
+    def stats(self):
+        """Get the pool metrics.
+
+        Returns
+        -------
+        dict
+            The number of connections served from the pool (`hits`), opened
+            outside of the pool (`misses`), reconnected after a failed health
+            check (`reconnects`), and currently in use (`in_use`), and the
+            `hit_rate`.
+
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        total = stats["hits"] + stats["misses"]
+        stats["pool_size"] = self.pool_size
+        stats["hit_rate"] = stats["hits"] / total if total else 0.0
+        return stats
+
+
+class _Connection:
+    """Wrapper of a connection keeping count of the connections in use."""
+
+    def __init__(self, pool, cnx):
+        self._pool = pool
+        self._cnx = cnx
+        self._closed = False
+        pool._count("in_use")
+
+    def __getattr__(self, name):
+        return getattr(self._cnx, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            super().__setattr__(name, value)
+        else:
+            setattr(self._cnx, name, value)
+
+    def close(self):
+        """Return the connection to the pool, or close it if not pooled."""
+        if not self._closed:
+            self._closed = True
+            self._pool._count("in_use", -1)
+            self._cnx.close()
+
+
+def get_pool(user, password, DB_NAME, pool_size=DEFAULT_POOL_SIZE):
+    """Get the process-wide connection pool, creating it on first use.
+
+    Parameters
+    ----------
+    user : str
+        The entered MySQL user.
+    password : str
+        The entered MySQL password.
+    DB_NAME : str
+        The MySQL database name (`TDT4145ProjectGroup131`).
+    pool_size : int, optional
+        The number of connections kept open if the pool is created.
+
+    Returns
+    -------
+    :obj:
+        The ConnectionPool for the user and database.
+
+    """
+    key = (user, password, DB_NAME)
+    with _POOLS_LOCK:
+        if key not in _POOLS:
+            _POOLS[key] = ConnectionPool(user, password, DB_NAME, pool_size)
+        return _POOLS[key]
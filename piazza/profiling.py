@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+"""Instrumentation of the MySQL statements executed by the Piazza code.
+
+This module contains code that records the latency of every statement executed
+through `query.execute` and `query.executemany`, when profiling is enabled. For
+every statement it keeps a latency histogram, the number of executions and the
+number of rows returned or changed, and for every use case (e.g. "login" or
+"search") the number of statements, which is the number of round trips to the
+database not counting commits. The use case is set with the `use_case` context
+manager, which can also decorate a function.
+
+Statements slower than the slow query threshold are kept in a slow query log,
+and `EXPLAIN` is run for them when the report is written. The report is
+written as text, or as Prometheus metrics if the file ends in `.prom`.
+
+The latency of a statement read with an unbuffered cursor only covers sending
+the statement and reading the first packet, and its rows are not counted.
+
+"""
+import re
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from mysql import connector
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    float("inf"),
+)
+
+# Largest number of entries kept in the slow query log
+SLOW_LOG_SIZE = 1000
+
+# Use case of the statements executed in the current thread or task
+_USE_CASE = ContextVar("use_case", default="other")
+
+# Matches repeated `SELECT ...` parts of a `UNION ALL` built per row
+_REPEATED_UNION = re.compile(r"(SELECT [^()]*?)(?: UNION ALL \1)+")
+
+# Matches repeated `(...)` lists of a multi-row `VALUES` built per row
+_REPEATED_VALUES = re.compile(r"(\([^()]*\))(?:, \1)+")
+
+_lock = threading.Lock()
+_enabled = False
+_slow_threshold = None
+# Statistics by (use case, statement), and the slow statements
+_statements = {}
+_slow_log = deque(maxlen=SLOW_LOG_SIZE)
+
+
+class _StatementStats:
+    """Statistics of one statement executed in one use case."""
+
+    def __init__(self):
+        self.count = 0
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, elapsed, rows):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        if rows is not None and rows > 0:
+            self.rows += rows
+        for i, bound in enumerate(BUCKETS):
+            if elapsed <= bound:
+                self.buckets[i] += 1
+                break
+
+
+def enable(slow_threshold=None):
+    """Start recording the executed statements.
+
+    Parameters
+    ----------
+    slow_threshold : float, optional
+        The number of seconds above which a statement is put in the slow query
+        log. No slow query log is kept if None.
+
+    """
+    global _enabled, _slow_threshold
+    with _lock:
+        _enabled = True
+        _slow_threshold = slow_threshold
+
+
+def disable():
+    """Stop recording the executed statements."""
+    global _enabled
+    _enabled = False
+
+
+def enabled():
+    """Tell if the executed statements are recorded.
+
+    Returns
+    -------
+    bool
+        True if profiling is enabled.
+
+    """
+    return _enabled
+
+
+def reset():
+    """Forget the recorded statements and the slow query log."""
+    with _lock:
+        _statements.clear()
+        _slow_log.clear()
+
+
+@contextmanager
+def use_case(name):
+    """Context manager setting the use case of the statements executed in it.
+
+    Parameters
+    ----------
+    name : str
+        The name of the use case, e.g. "login".
+
+    """
+    token = _USE_CASE.set(name)
+    try:
+        yield
+    finally:
+        _USE_CASE.reset(token)
+
+
+def normalize(cmd):
+    """Normalize a statement, so that variants built per row are counted once.
+
+    Parameters
+    ----------
+    cmd : str
+        The MySQL statement.
+
+    Returns
+    -------
+    str
+        The statement with whitespace collapsed, repeated `UNION ALL` parts
+        written once followed by `UNION ALL ...`, and repeated `VALUES` lists
+        written once followed by `, ...`.
+
+    """
+    cmd = " ".join(cmd.split())
+    cmd = _REPEATED_VALUES.sub(r"\1, ...", cmd)
+    return _REPEATED_UNION.sub(r"\1 UNION ALL ...", cmd)
+
+
+def observe(cmd, args, elapsed, rows):
+    """Record an executed statement.
+
+    Parameters
+    ----------
+    cmd : str
+        The MySQL statement.
+    args : tuple
+        The arguments of the statement.
+    elapsed : float
+        The number of seconds used to execute the statement.
+    rows : int
+        The number of rows returned or changed, negative if not known.
+
+    """
+    key = (_USE_CASE.get(), normalize(cmd))
+    with _lock:
+        stats = _statements.get(key)
+        if stats is None:
+            stats = _statements[key] = _StatementStats()
+        stats.observe(elapsed, rows)
+        if _slow_threshold is not None and elapsed >= _slow_threshold:
+            _slow_log.append((key[0], cmd, args, elapsed))
+
+
+def use_case_summary():
+    """Get the number of statements and time spent in each use case.
+
+    Returns
+    -------
+    dict
+        Tuples with the number of statements, the number of distinct
+        statements and the seconds spent executing them, by use case.
+
+    """
+    summary = {}
+    with _lock:
+        for (case, _), stats in _statements.items():
+            count, distinct, total = summary.get(case, (0, 0, 0.0))
+            summary[case] = (count + stats.count, distinct + 1, total + stats.total)
+    return summary
+
+
+def _explain(cnx, cmd, args):
+    """Helper function to get the `EXPLAIN` output of a statement as text."""
+    # Only statements reading rows can be explained
+    if not cmd.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+        return "    (not explained)"
+    try:
+        with cnx.cursor() as cursor:
+            cursor.execute("EXPLAIN " + cmd, args)
+            columns = [c[0] for c in cursor.description]
+            rows = cursor.fetchall()
+    except connector.Error as err:
+        return f"    EXPLAIN failed: {err.msg}"
+    lines = []
+    for row in rows:
+        values = [f"{c}={v}" for c, v in zip(columns, row) if v is not None]
+        lines.append("    " + ", ".join(values))
+    return "\n".join(lines)
+
+
+def text_report(cnx=None):
+    """Write the recorded statements and the slow query log as text.
+
+    Parameters
+    ----------
+    cnx : :obj:, optional
+        The mysql.connector object used to run `EXPLAIN` on the slow
+        statements. The slow statements are not explained if None.
+
+    Returns
+    -------
+    str
+        The report.
+
+    """
+    with _lock:
+        statements = sorted(
+            _statements.items(), key=lambda item: item[1].total, reverse=True
+        )
+        slow_log = list(_slow_log)
+
+    lines = ["Use cases:"]
+    for case, (count, distinct, total) in sorted(use_case_summary().items()):
+        lines.append(
+            f"  {case}: {count} round trips, {distinct} statements, "
+            f"{1000 * total:.1f} ms"
+        )
+
+    lines.append("\nStatements, most time first:")
+    for (case, cmd), stats in statements:
+        lines.append(
+            f"  [{case}] {stats.count} calls, {stats.rows} rows, "
+            f"{1000 * stats.total:.1f} ms total, "
+            f"{1000 * stats.total / stats.count:.2f} ms mean, "
+            f"{1000 * stats.max:.2f} ms max"
+        )
+        lines.append(f"    {cmd}")
+
+    if slow_log:
+        lines.append(f"\nSlow queries (>= {1000 * _slow_threshold:.1f} ms):")
+        explained = {}
+        for case, cmd, args, elapsed in slow_log:
+            lines.append(f"  [{case}] {1000 * elapsed:.2f} ms: {normalize(cmd)}")
+            # EXPLAIN every distinct statement once
+            key = normalize(cmd)
+            if cnx is not None and key not in explained:
+                explained[key] = _explain(cnx, cmd, args)
+                lines.append(explained[key])
+    return "\n".join(lines) + "\n"
+
+
+def _label(value):
+    """Helper function to escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def prometheus_report():
+    """Write the recorded statements as Prometheus text metrics.
+
+    Returns
+    -------
+    str
+        The `piazza_statement_duration_seconds` histograms,
+        `piazza_statement_rows_total` counters by use case and statement, and
+        `piazza_use_case_round_trips_total` counters by use case.
+
+    """
+    with _lock:
+        statements = list(_statements.items())
+
+    lines = [
+        "# HELP piazza_statement_duration_seconds Latency of the MySQL statements.",
+        "# TYPE piazza_statement_duration_seconds histogram",
+    ]
+    for (case, cmd), stats in statements:
+        labels = f'use_case="{_label(case)}",statement="{_label(cmd)}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS, stats.buckets):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(
+                f'piazza_statement_duration_seconds_bucket{{{labels},le="{le}"}} '
+                f"{cumulative}"
+            )
+        lines.append(
+            f"piazza_statement_duration_seconds_sum{{{labels}}} {stats.total}"
+        )
+        lines.append(
+            f"piazza_statement_duration_seconds_count{{{labels}}} {stats.count}"
+        )
+
+    lines += [
+        "# HELP piazza_statement_rows_total Rows returned or changed by statements.",
+        "# TYPE piazza_statement_rows_total counter",
+    ]
+    for (case, cmd), stats in statements:
+        labels = f'use_case="{_label(case)}",statement="{_label(cmd)}"'
+        lines.append(f"piazza_statement_rows_total{{{labels}}} {stats.rows}")
+
+    lines += [
+        "# HELP piazza_use_case_round_trips_total Statements executed per use case.",
+        "# TYPE piazza_use_case_round_trips_total counter",
+    ]
+    for case, (count, _, _) in sorted(use_case_summary().items()):
+        labels = f'use_case="{_label(case)}"'
+        lines.append(f"piazza_use_case_round_trips_total{{{labels}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def write_report(path, cnx=None):
+    """Write the report to a file, as Prometheus metrics if it ends in `.prom`.
+
+    Parameters
+    ----------
+    path : str
+        The path of the file.
+    cnx : :obj:, optional
+        The mysql.connector object used to run `EXPLAIN` on the slow
+        statements of the text report.
+
+    """
+    report = prometheus_report() if path.endswith(".prom") else text_report(cnx)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(report)
+
+
+def timed(function, cursor, cmd, args):
+    """Execute a statement with a cursor method, recording it if enabled.
+
+    Parameters
+    ----------
+    function : callable
+        The cursor method, `execute` or `executemany`.
+    cursor : :obj:
+        The mysql.connector.cursor object used to execute the statement.
+    cmd : str
+        The MySQL statement.
+    args : :obj:
+        The arguments of the statement, or the list of arguments of each row.
+
+    """
+    if not _enabled:
+        function(cmd, args)
+        return
+    start = time.perf_counter()
+    function(cmd, args)
+    elapsed = time.perf_counter() - start
+    observe(cmd, args, elapsed, cursor.rowcount)
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""Shared layer for executing the MySQL queries of the Piazza users.
+
+This module contains code that executes the queries of the PiazzaUser,
+Student and Instructor classes. UUID parameters are always bound as 16 byte
+values, so that predicates compare the binary(16) key columns directly and the
+primary and unique key indexes can be used. Wrapping a key column in
+`BIN_TO_UUID` on the column side forces a full table scan.
+
+The executed statements can be recorded and checked with `EXPLAIN` for full
+table scans on keyed lookups, and are timed by `profiling.py` when profiling is
+enabled.
+
+New keys are generated with `new_id`. In the default "time" key mode they are
+time-ordered version 7 uuids, so new rows are appended at the end of the
+clustered binary(16) primary key index instead of landing on a random page. A
+version 7 uuid is stored with the same byte layout and shown with the same
+string format as a version 4 uuid, so `UUID_TO_BIN` and `BIN_TO_UUID` are used
+without the swap flag, and existing keys are unchanged.
+
+"""
+import os
+import re
+import time
+import uuid
+import threading
+import profiling
+
+# Statements executed while recording, and the arguments of their last execution
+_STATEMENTS = {}
+_STATEMENTS_LOCK = threading.Lock()
+_recording = False
+
+# Key generation modes of new_id
+KEY_MODES = ("time", "random")
+_key_mode = "time"
+
+# Millisecond and counter of the last version 7 uuid, to keep them increasing
+_UUID7_LOCK = threading.Lock()
+_uuid7_ms = 0
+_uuid7_counter = 0
+
+# Matches an INSERT statement with a single VALUES list, ending in that list or
+# in an ON DUPLICATE KEY UPDATE clause
+_INSERT_VALUES = re.compile(
+    r"(\s*INSERT\b.*?\bVALUES\s*)(\([^()]*\))"
+    r"(\s*ON DUPLICATE KEY UPDATE\b.*)?\s*$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+# Matches a predicate converting a column with BIN_TO_UUID
+_COLUMN_CONVERSION = re.compile(
+    r"\b(WHERE|AND|OR|ON)\s*\(?\s*BIN_TO_UUID\(\w+\)\s*=", re.IGNORECASE
+)
+
+
+def to_bin(value):
+    """Convert a uuid to its 16 byte value.
+
+    Parameters
+    ----------
+    value : str, uuid.UUID or bytes
+        The uuid as a string, a uuid.UUID or a 16 byte value.
+
+    Returns
+    -------
+    bytes
+        The 16 byte value of the uuid.
+
+    Raises
+    ------
+    ValueError
+        If the string is not a valid uuid.
+
+    """
+    if isinstance(value, uuid.UUID):
+        return value.bytes
+    if isinstance(value, bytes):
+        return value
+    return uuid.UUID(value).bytes
+
+
+def uuid7():
+    """Generate a time-ordered version 7 uuid.
+
+    The uuid starts with the Unix time in milliseconds, followed by a 12 bit
+    counter ordering the uuids generated in the same millisecond, and 62
+    random bits. The uuids generated by a process are strictly increasing, also
+    if the clock goes backwards.
+
+    Returns
+    -------
+    uuid.UUID
+        The version 7 uuid.
+
+    """
+    global _uuid7_ms, _uuid7_counter
+    with _UUID7_LOCK:
+        ms = time.time_ns() // 1000000
+        if ms > _uuid7_ms:
+            # Start the counter in its lower half, leaving room for increments
+            _uuid7_ms = ms
+            _uuid7_counter = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        else:
+            _uuid7_counter += 1
+            if _uuid7_counter > 0xFFF:
+                _uuid7_ms += 1
+                _uuid7_counter = 0
+        ms, counter = _uuid7_ms, _uuid7_counter
+    random = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | random
+    return uuid.UUID(int=value)
+
+
+def set_key_mode(mode):
+    """Set how `new_id` generates keys.
+
+    Parameters
+    ----------
+    mode : str
+        "time" for time-ordered version 7 uuids, or "random" for random version
+        4 uuids.
+
+    Raises
+    ------
+    ValueError
+        If the mode is not one of `KEY_MODES`.
+
+    """
+    global _key_mode
+    if mode not in KEY_MODES:
+        raise ValueError(f"Unknown key mode {mode}, expected one of {KEY_MODES}")
+    _key_mode = mode
+
+
+def new_id():
+    """Generate the key of a new row.
+
+    Returns
+    -------
+    uuid.UUID
+        A version 7 uuid in the "time" key mode, or a version 4 uuid in the
+        "random" key mode.
+
+    """
+    if _key_mode == "time":
+        return uuid7()
+    return uuid.uuid4()
+
+
+def bind(args):
+    """Bind the arguments of a query, converting uuid.UUID values to bytes.
+
+    Parameters
+    ----------
+    args : tuple
+        The arguments of the query.
+
+    Returns
+    -------
+    tuple
+        The arguments with uuid.UUID values replaced by 16 byte values.
+
+    """
+    return tuple(a.bytes if isinstance(a, uuid.UUID) else a for a in args)
+
+
+def execute(cursor, cmd, args=()):
+    """Execute a query with uuid.UUID arguments bound as 16 byte values.
+
+    Parameters
+    ----------
+    cursor : :obj:
+        The mysql.connector.cursor object used to execute MySQL queries.
+    cmd : str
+        The MySQL statement.
+    args : tuple, optional
+        The arguments of the statement.
+
+    """
+    args = bind(args)
+    if _recording:
+        with _STATEMENTS_LOCK:
+            _STATEMENTS[cmd] = args
+    profiling.timed(cursor.execute, cursor, cmd, args)
+
+
+def executemany(cursor, cmd, rows):
+    """Execute an `INSERT` statement for several rows as one multi-row statement.
+
+    The `VALUES (...)` list of the statement is repeated for every row here
+    instead of by `cursor.executemany`, which only batches statements matching
+    its own pattern of an `INSERT` (mysql-connector-python 8.0.23 does not
+    match `INSERT IGNORE`) and otherwise executes the statement once per row.
+    Other statements are executed with `cursor.executemany`.
+
+    Parameters
+    ----------
+    cursor : :obj:
+        The mysql.connector.cursor object used to execute MySQL queries.
+    cmd : str
+        The MySQL `INSERT ... VALUES (%s, ..., %s)` statement, optionally
+        followed by an `ON DUPLICATE KEY UPDATE` clause.
+    rows : list
+        The arguments of the statement for each row.
+
+    """
+    rows = [bind(row) for row in rows]
+    if not rows:
+        return
+    if _recording:
+        with _STATEMENTS_LOCK:
+            _STATEMENTS[cmd] = rows[0]
+    match = _INSERT_VALUES.match(cmd)
+    if match is None:
+        profiling.timed(cursor.executemany, cursor, cmd, rows)
+        return
+    prefix, values, suffix = match.groups()
+    cmd = prefix + ", ".join([values] * len(rows)) + (suffix or "")
+    args = tuple(arg for row in rows for arg in row)
+    profiling.timed(cursor.execute, cursor, cmd, args)
+
+
+def record_statements(enabled=True):
+    """Start or stop recording the executed statements.
+
+    Parameters
+    ----------
+    enabled : bool, optional
+        Record the statements executed from now on.
+
+    """
+    global _recording
+    _recording = enabled
+
+
+def recorded_statements():
+    """Get the recorded statements.
+
+    Returns
+    -------
+    list
+        A list of tuples with each statement and the arguments of its last
+        execution.
+
+    """
+    with _STATEMENTS_LOCK:
+        return list(_STATEMENTS.items())
+
+
+def explain_statements(cnx, tables=()):
+    """Check the recorded statements for full table scans on keyed lookups.
+
+    A statement is reported if it converts a column with `BIN_TO_UUID` in a
+    predicate, or if `EXPLAIN` shows a full table scan filtering rows on a
+    table where a key could have been used, or on one of `tables`.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to run `EXPLAIN`.
+    tables : iterable, optional
+        Tables that are indexed for the lookups of the statements, where any
+        full table scan filtering rows is reported.
+
+    Returns
+    -------
+    list
+        A list of tuples with the statement and the reason it was reported.
+
+    """
+    tables = {table.lower() for table in tables}
+    problems = []
+    for cmd, args in recorded_statements():
+        if _COLUMN_CONVERSION.search(cmd):
+            problems.append((cmd, "BIN_TO_UUID on the column side of a predicate"))
+        statement = cmd.lstrip().upper()
+        if not statement.startswith(("SELECT", "WITH", "UPDATE", "DELETE")) and not (
+            statement.startswith("INSERT") and " SELECT " in statement
+        ):
+            continue
+        with cnx.cursor(dictionary=True) as cursor:
+            cursor.execute("EXPLAIN " + cmd, args)
+            for row in cursor.fetchall():
+                if row["type"] != "ALL" or "Using where" not in (row["Extra"] or ""):
+                    continue
+                if row["possible_keys"] is not None:
+                    reason = "full scan of {} ignoring keys {}".format(
+                        row["table"], row["possible_keys"]
+                    )
+                elif (row["table"] or "").lower() in tables:
+                    reason = "full scan of indexed table {}".format(row["table"])
+                else:
+                    continue
+                problems.append((cmd, reason))
+    return problems
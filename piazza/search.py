@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""Keyword search among the posts of the `TDT4145ProjectGroup131` database.
+
+This module contains code that searches for a keyword in (1) post content,
+(2) thread tags, (3) folder names, and (4) user names, using the FULLTEXT
+indexes defined in `tables.TABLES`. The four searches are sent as one
+statement, and the matching posts are ranked by the sum of their relevance in
+the four searches.
+
+InnoDB only indexes words of at least `innodb_ft_min_token_size` (by default 3)
+characters that are not stopwords, so shorter words are not found.
+
+"""
+import re
+import uuid
+from query import execute
+
+# Characters of a word in a search, the rest are treated as separators
+_WORD = re.compile(r"\w+")
+
+
+def boolean_query(keyword):
+    """Build a FULLTEXT boolean mode query from a keyword.
+
+    Every word of the keyword is searched for as a prefix, and the operators
+    of the boolean mode are removed from the keyword.
+
+    Parameters
+    ----------
+    keyword : str
+        The entered keyword.
+
+    Returns
+    -------
+    str
+        The boolean mode query, empty if the keyword contains no words.
+
+    """
+    return " ".join(word + "*" for word in _WORD.findall(keyword))
+
+
+# The four searches, each giving the PostIDs of the matching posts with their
+# relevance. Every %s is bound to the boolean mode query.
+_SEARCHES = (
+    "SELECT PostID, "
+    "MATCH (PostContent) AGAINST (%s IN BOOLEAN MODE) AS Score "
+    "FROM Post "
+    "WHERE MATCH (PostContent) AGAINST (%s IN BOOLEAN MODE) "
+    "UNION ALL "
+    "SELECT ThreadID, "
+    "MATCH (Tag) AGAINST (%s IN BOOLEAN MODE) "
+    "FROM Tags "
+    "WHERE MATCH (Tag) AGAINST (%s IN BOOLEAN MODE) "
+    "UNION ALL "
+    "SELECT ThreadID, Score FROM ThreadInFolder "
+    "INNER JOIN "
+    "(SELECT CourseID, FolderName, "
+    "MATCH (FolderName) AGAINST (%s IN BOOLEAN MODE) AS Score "
+    "FROM Folder "
+    "WHERE MATCH (FolderName) AGAINST (%s IN BOOLEAN MODE)) AS T1 "
+    "USING (CourseID, FolderName) "
+    "UNION ALL "
+    "SELECT PostID, Score FROM Post "
+    "INNER JOIN "
+    "(SELECT PCID, Score FROM Student INNER JOIN "
+    "(SELECT UserID, "
+    "MATCH (UserName) AGAINST (%s IN BOOLEAN MODE) AS Score "
+    "FROM User "
+    "WHERE MATCH (UserName) AGAINST (%s IN BOOLEAN MODE)) AS U1 "
+    "ON (UserID=StudentID) "
+    "UNION "
+    "SELECT PCID, Score FROM Instructor INNER JOIN "
+    "(SELECT UserID, "
+    "MATCH (UserName) AGAINST (%s IN BOOLEAN MODE) AS Score "
+    "FROM User "
+    "WHERE MATCH (UserName) AGAINST (%s IN BOOLEAN MODE)) AS U2 "
+    "ON (UserID=InstructorID)) AS T1 "
+    "USING (PCID)"
+)
+
+
+def iter_search(cnx, keyword, limit=None, after=None):
+    """Stream the posts related to a keyword, most relevant first.
+
+    The four searches are sent as a single statement, and the posts found by
+    several of them are merged in the database. The rows are read from the
+    server as they are iterated instead of being fetched all at once.
+    Pagination is done on the (relevance, PostID) of the last row of the
+    previous page instead of an offset, so the rows of the previous pages are
+    not sent again.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+    keyword : str
+        The entered keyword.
+    limit : int, optional
+        The largest number of posts to return.
+    after : tuple, optional
+        The (relevance, PostID) of the last post of the previous page.
+
+    Yields
+    ------
+    tuple
+        The PostID of a matching post and its relevance.
+
+    """
+    query = boolean_query(keyword)
+    if not query:
+        return
+
+    cmd = (
+        "SELECT BIN_TO_UUID(PostID), ROUND(SUM(Score), 6) AS Relevance "
+        "FROM (" + _SEARCHES + ") AS Matches "
+        "GROUP BY PostID "
+    )
+    args = (query,) * _SEARCHES.count("%s")
+    if after is not None:
+        relevance, postid = after
+        cmd += "HAVING Relevance < %s OR (Relevance = %s AND PostID > %s) "
+        args += (relevance, relevance, uuid.UUID(postid))
+    cmd += "ORDER BY Relevance DESC, PostID"
+    if limit is not None:
+        cmd += " LIMIT %s"
+        args += (limit,)
+
+    # Unbuffered cursor, reading the rows from the server while iterating
+    with cnx.cursor(buffered=False) as cursor:
+        execute(cursor, cmd, args)
+        try:
+            for postid, relevance in cursor:
+                yield postid, float(relevance)
+        finally:
+            # Read the rows left if the caller stopped iterating early
+            cursor.fetchall()
+
+
+def search_posts(cnx, keyword, limit=None, after=None):
+    """Search the database for posts related to a keyword.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+    keyword : str
+        The entered keyword.
+    limit : int, optional
+        The largest number of posts to return.
+    after : tuple, optional
+        The (relevance, PostID) of the last post of the previous page.
+
+    Returns
+    -------
+    list
+        The PostIDs of the matching posts, most relevant first.
+
+    """
+    return [postid for postid, _ in iter_search(cnx, keyword, limit, after)]
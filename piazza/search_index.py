@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""In-memory inverted index for the keyword search.
+
+This module contains code for an optional in-memory index answering the
+keyword search without querying the database. It is built once from the
+`Post`, `Tags`, `ThreadInFolder` and `User` tables, and updated in place when
+threads and replies are created.
+
+The index matches the keyword as a case-insensitive substring, like
+`LIKE '%keyword%'` does, in (1) post content, (2) thread tags, (3) folder names
+and (4) user names. Every indexed text is split into trigrams, and the texts
+containing all trigrams of the keyword are checked for the whole keyword. The
+postings are sorted arrays of integer surrogates for the texts and the 16 byte
+PostIDs.
+
+"""
+import sys
+import uuid
+import threading
+from array import array
+from bisect import bisect_left
+
+# Length of the grams the texts are split into
+GRAM_SIZE = 3
+
+# Index shared by the process, None if the in-memory search is not used
+_INDEX = None
+
+
+class SearchIndex:
+    """Class for an in-memory inverted index over posts, tags, folders and users.
+
+    Attributes
+    ----------
+    num_posts : int
+        The number of posts known by the index.
+    num_texts : int
+        The number of indexed texts.
+    """
+
+    def __init__(self):
+        """Create an empty index."""
+        self._lock = threading.Lock()
+        # PostIDs as 16 byte values, and their surrogates
+        self._postids = []
+        self._post_surrogates = {}
+        # Indexed texts in lower case, and the surrogates of their posts
+        self._texts = []
+        self._text_posts = []
+        # Surrogates of texts by (kind, key), e.g. ("tag", "Exam")
+        self._text_surrogates = {}
+        # Sorted surrogates of the texts containing each gram
+        self._grams = {}
+
+    @property
+    def num_posts(self):
+        return len(self._postids)
+
+    @property
+    def num_texts(self):
+        return len(self._texts)
+
+    @classmethod
+    def build(cls, cnx):
+        """Build the index from the database.
+
+        Parameters
+        ----------
+        cnx : :obj:
+            The mysql.connector object used to execute MySQL queries.
+
+        Returns
+        -------
+        :obj:
+            The SearchIndex of the posts in the database.
+
+        """
+        index = cls()
+        with cnx.cursor() as cursor:
+            # User names by the PCID of the user
+            cursor.execute(
+                "SELECT PCID, UserName FROM User "
+                "INNER JOIN Student ON (UserID=StudentID) "
+                "UNION ALL "
+                "SELECT PCID, UserName FROM User "
+                "INNER JOIN Instructor ON (UserID=InstructorID)"
+            )
+            for pcid, username in cursor.fetchall():
+                index._text(("user", bytes(pcid)), username)
+
+            cursor.execute("SELECT PostID, PostContent, PCID FROM Post")
+            for postid, postcontent, pcid in cursor.fetchall():
+                index._add_post(bytes(postid), postcontent, bytes(pcid))
+
+            cursor.execute("SELECT ThreadID, Tag FROM Tags")
+            for threadid, tag in cursor.fetchall():
+                index._add_to_text(("tag", tag), tag, bytes(threadid))
+
+            cursor.execute(
+                "SELECT ThreadID, CourseID, FolderName FROM ThreadInFolder"
+            )
+            for threadid, courseid, foldername in cursor.fetchall():
+                key = ("folder", bytes(courseid), foldername)
+                index._add_to_text(key, foldername, bytes(threadid))
+        return index
+
+    def _post(self, postid):
+        """Helper function to get the surrogate of a PostID."""
+        surrogate = self._post_surrogates.get(postid)
+        if surrogate is None:
+            surrogate = len(self._postids)
+            self._postids.append(postid)
+            self._post_surrogates[postid] = surrogate
+        return surrogate
+
+    def _text(self, key, text):
+        """Helper function to get the surrogate of a text, indexing it if new."""
+        surrogate = self._text_surrogates.get(key)
+        if surrogate is None:
+            surrogate = len(self._texts)
+            text = text.lower()
+            self._texts.append(text)
+            self._text_posts.append(array("I"))
+            self._text_surrogates[key] = surrogate
+            # Surrogates are increasing, so appending keeps the postings sorted
+            for gram in _grams(text):
+                self._grams.setdefault(gram, array("I")).append(surrogate)
+        return surrogate
+
+    def _add_to_text(self, key, text, postid):
+        """Helper function to add a post to the posts of a text."""
+        posts = self._text_posts[self._text(key, text)]
+        surrogate = self._post(postid)
+        if not posts or posts[-1] < surrogate:
+            posts.append(surrogate)
+        elif surrogate not in posts:
+            posts.insert(bisect_left(posts, surrogate), surrogate)
+
+    def _add_post(self, postid, postcontent, pcid):
+        """Helper function to index a post by its content and its creator."""
+        self._add_to_text(("post", postid), postcontent, postid)
+        # Posts by creators without a user are not found by user name
+        if ("user", pcid) in self._text_surrogates:
+            self._add_to_text(("user", pcid), "", postid)
+
+    def add_post(self, postid, postcontent, pcid):
+        """Add a created post, e.g. a reply, to the index.
+
+        Parameters
+        ----------
+        postid : str
+            The PostID of the post.
+        postcontent : str
+            The content of the post.
+        pcid : str
+            The PCID of the creator of the post.
+
+        """
+        with self._lock:
+            self._add_post(
+                uuid.UUID(postid).bytes, postcontent, uuid.UUID(pcid).bytes
+            )
+
+    def add_thread(self, postid, postcontent, pcid, courseid, folders, tags):
+        """Add a created thread to the index.
+
+        Parameters
+        ----------
+        postid : str
+            The PostID of the thread.
+        postcontent : str
+            The content of the thread.
+        pcid : str
+            The PCID of the creator of the thread.
+        courseid : str
+            The CourseID of the course of the thread.
+        folders : list
+            The names of the folders of the thread.
+        tags : list
+            The tags of the thread.
+
+        """
+        postid = uuid.UUID(postid).bytes
+        courseid = uuid.UUID(courseid).bytes
+        with self._lock:
+            self._add_post(postid, postcontent, uuid.UUID(pcid).bytes)
+            for tag in tags:
+                self._add_to_text(("tag", tag), tag, postid)
+            for folder in folders:
+                self._add_to_text(("folder", courseid, folder), folder, postid)
+
+    def search(self, keyword):
+        """Search for posts related to a keyword.
+
+        Parameters
+        ----------
+        keyword : str
+            The keyword to search for as a case-insensitive substring.
+
+        Returns
+        -------
+        list
+            The PostIDs of the matching posts, sorted.
+
+        """
+        keyword = keyword.lower()
+        with self._lock:
+            if len(keyword) < GRAM_SIZE:
+                candidates = range(len(self._texts))
+            else:
+                postings = sorted(
+                    (self._grams.get(gram, array("I")) for gram in _grams(keyword)),
+                    key=len,
+                )
+                candidates = set(postings[0])
+                for posting in postings[1:]:
+                    if not candidates:
+                        break
+                    candidates.intersection_update(posting)
+
+            posts = set()
+            for text in candidates:
+                if keyword in self._texts[text]:
+                    posts.update(self._text_posts[text])
+            # Sorted on the 16 byte values, the order of the uuid strings
+            postids = sorted(self._postids[p] for p in posts)
+        return [str(uuid.UUID(bytes=postid)) for postid in postids]
+
+    def memory_usage(self):
+        """Estimate the memory used by the index.
+
+        Returns
+        -------
+        int
+            The number of bytes used by the containers, texts and postings of
+            the index.
+
+        """
+        with self._lock:
+            size = sum(
+                sys.getsizeof(c)
+                for c in (
+                    self._postids,
+                    self._post_surrogates,
+                    self._texts,
+                    self._text_posts,
+                    self._text_surrogates,
+                    self._grams,
+                )
+            )
+            size += sum(sys.getsizeof(postid) for postid in self._postids)
+            size += sum(sys.getsizeof(text) for text in self._texts)
+            size += sum(sys.getsizeof(posts) for posts in self._text_posts)
+            size += sum(sys.getsizeof(key) for key in self._text_surrogates)
+            size += sum(
+                sys.getsizeof(gram) + sys.getsizeof(posting)
+                for gram, posting in self._grams.items()
+            )
+        return size
+
+
+def _grams(text):
+    """Helper function to get the distinct grams of a text."""
+    return {text[i : i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+def set_index(index):
+    """Set the in-memory index used by the process.
+
+    Parameters
+    ----------
+    index : :obj:
+        The SearchIndex to use, or None to search the database.
+
+    """
+    global _INDEX
+    _INDEX = index
+
+
+def get_index():
+    """Get the in-memory index used by the process.
+
+    Returns
+    -------
+    :obj:
+        The SearchIndex, or None if the in-memory search is not used.
+
+    """
+    return _INDEX
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""Concurrent HTTP/JSON server for the Piazza use cases.
+
+This module contains code for an asyncio server exposing the PiazzaService over
+HTTP/1.1 with JSON bodies, so one process can serve many users at once. The
+event loop only parses requests and writes responses, and the service calls,
+which block on MySQL, run in a thread pool executor with one thread per pooled
+connection. Connections are kept alive between requests.
+
+Endpoints:
+    POST /login       {"email": ..., "password": ..., "role": "Student"}
+    POST /threads     {"content": ..., "folders": [...], "tags": [...]}
+    POST /replies     {"replies": [{"post_id": ..., "content": ...}, ...]}
+    GET  /search      ?keyword=...&limit=...&after_relevance=...&after_post_id=...
+    GET  /statistics  ?limit=...&after_threads_read=...&after_user_id=...
+
+Every endpoint but `/login` needs the `Authorization: Bearer <token>` header
+with the token returned by `/login`. A token expires `SESSION_TTL` seconds after
+the login, or earlier if more than `SESSION_MAX_SIZE` users are logged in.
+
+Invalid requests are answered with status 400, also when they reference a
+missing row or duplicate an existing one. Other database errors and unexpected
+errors are logged and answered with status 500.
+
+Usage:
+    python server.py --port 8080 --workers 32
+
+"""
+import json
+import asyncio
+import getpass
+import secrets
+import argparse
+import traceback
+from urllib.parse import urlsplit
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+from mysql import connector
+from mysql.connector import errorcode
+from tables import DB_NAME
+from pool import get_pool
+from service import PiazzaService
+from service import LoginError
+from cache import TTLCache
+
+# Default number of threads executing service calls
+DEFAULT_WORKERS = 32
+
+# Largest accepted request body in bytes
+MAX_BODY_SIZE = 1 << 20
+
+# Largest number of sessions kept, the least recently used are logged out
+SESSION_MAX_SIZE = 100000
+
+# Number of seconds a session is kept after the login
+SESSION_TTL = 8 * 3600.0
+
+# Reason phrases of the returned status codes
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    401: "Unauthorized",
+    403: "Forbidden",
+    404: "Not Found",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+# Messages of the integrity errors caused by the request, answered with 400
+_INTEGRITY_ERRORS = {
+    errorcode.ER_NO_REFERENCED_ROW_2: "Referenced post or user does not exist",
+    errorcode.ER_DUP_ENTRY: "Duplicate entry",
+}
+
+
+class HTTPError(Exception):
+    """Raised to return an error response, with the status code and message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class PiazzaServer:
+    """Class for an asyncio HTTP/JSON server over a PiazzaService.
+
+    Attributes
+    ----------
+    service : :obj:
+        The PiazzaService executing the use cases.
+    executor : :obj:
+        The ThreadPoolExecutor the service calls run in.
+    """
+
+    def __init__(self, service, workers=DEFAULT_WORKERS):
+        """Create the server and its thread pool.
+
+        Parameters
+        ----------
+        service : :obj:
+            The PiazzaService executing the use cases.
+        workers : int, optional
+            The number of threads executing service calls.
+
+        """
+        self.service = service
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="piazza"
+        )
+        # Sessions of the logged in users by token
+        self._sessions = TTLCache(SESSION_MAX_SIZE, SESSION_TTL)
+        self._routes = {
+            ("POST", "/login"): self.login,
+            ("POST", "/threads"): self.create_threads,
+            ("POST", "/replies"): self.create_replies,
+            ("GET", "/search"): self.search,
+            ("GET", "/statistics"): self.statistics,
+        }
+
+    async def _call(self, function, *args):
+        """Helper function to run a blocking service call in the thread pool."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    def _session(self, headers):
+        """Helper function to get the Session of the token of a request."""
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        session = self._sessions.get(token) if scheme.lower() == "bearer" else None
+        if session is None:
+            raise HTTPError(401, "Missing or unknown token")
+        return session
+
+    async def login(self, headers, query, body):
+        """Log a user in and return a token for the session."""
+        try:
+            session = await self._call(
+                self.service.login,
+                body["email"],
+                body["password"],
+                body.get("role", "Student"),
+            )
+        except LoginError as err:
+            raise HTTPError(401, str(err)) from None
+        token = secrets.token_urlsafe(24)
+        self._sessions.put(token, session)
+        return {"token": token, "user_id": session.userid, "role": session.role}
+
+    async def create_threads(self, headers, query, body):
+        """Create one thread, or several with a `threads` list."""
+        session = self._session(headers)
+        threads = body.get("threads", [body])
+        postids = await self._call(
+            self.service.create_threads,
+            session,
+            [(t["content"], t.get("folders", []), t.get("tags", [])) for t in threads],
+        )
+        return {"post_ids": postids}
+
+    async def create_replies(self, headers, query, body):
+        """Create one reply, or several with a `replies` list."""
+        session = self._session(headers)
+        replies = body.get("replies", [body])
+        try:
+            postids = await self._call(
+                self.service.create_replies,
+                session,
+                [(r["post_id"], r["content"]) for r in replies],
+            )
+        except ValueError as err:
+            raise HTTPError(404, str(err)) from None
+        return {"post_ids": postids}
+
+    async def search(self, headers, query, body):
+        """Search for posts related to a keyword, one page at a time."""
+        self._session(headers)
+        after = None
+        if "after_post_id" in query:
+            after = (float(query.get("after_relevance", 0)), query["after_post_id"])
+        limit = int(query["limit"]) if "limit" in query else None
+        result = await self._call(
+            self.service.search, query.get("keyword", ""), limit, after
+        )
+        return {
+            "posts": [
+                {"post_id": postid, "relevance": relevance}
+                for postid, relevance in result
+            ]
+        }
+
+    async def statistics(self, headers, query, body):
+        """Get the user statistics, one page at a time."""
+        session = self._session(headers)
+        after = None
+        if "after_user_id" in query:
+            after = (int(query.get("after_threads_read", 0)), query["after_user_id"])
+        limit = int(query["limit"]) if "limit" in query else None
+        try:
+            rows = await self._call(self.service.statistics, session, limit, after)
+        except PermissionError as err:
+            raise HTTPError(403, str(err)) from None
+        fields = ["user_id", "user_name", "threads_read", "posts_created"]
+        return {"users": [dict(zip(fields, row)) for row in rows]}
+
+    async def handle(self, reader, writer):
+        """Serve the requests of a client connection until it is closed."""
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, response = await self._dispatch(method, target, headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(_response(status, response, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HTTPError as err:
+            # Request could not be parsed, answer and drop the connection
+            writer.write(_response(err.status, {"error": str(err)}, False))
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, target, headers, body):
+        """Helper function to route a request and turn errors into responses."""
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        handler = self._routes.get((method, url.path))
+        try:
+            if handler is None:
+                raise HTTPError(404, f"No endpoint {method} {url.path}")
+            try:
+                body = json.loads(body) if body else {}
+            except ValueError:
+                raise HTTPError(400, "Body is not valid JSON") from None
+            if not isinstance(body, dict):
+                raise HTTPError(400, "Body must be a JSON object")
+            return 200, await handler(headers, query, body)
+        except HTTPError as err:
+            return err.status, {"error": str(err)}
+        except (KeyError, TypeError, ValueError) as err:
+            return 400, {"error": f"Bad request: {err!r}"}
+        except connector.Error as err:
+            if isinstance(err, connector.IntegrityError):
+                if err.errno in _INTEGRITY_ERRORS:
+                    return 400, {"error": _INTEGRITY_ERRORS[err.errno]}
+            print(f"{method} {url.path} failed: {err}")
+            return 500, {"error": "Database error"}
+        except Exception:
+            print(f"{method} {url.path} failed:")
+            traceback.print_exc()
+            return 500, {"error": "Internal server error"}
+
+    async def serve(self, host, port):
+        """Serve requests on a host and port until cancelled."""
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Serving on http://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+async def _read_request(reader):
+    """Helper function to read a HTTP/1.1 request.
+
+    Returns
+    -------
+    tuple
+        The method, target, headers with lower case names and body of the
+        request, or None if the connection was closed.
+
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line") from None
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400, "Malformed Content-Length") from None
+    if length > MAX_BODY_SIZE:
+        raise HTTPError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method, target, headers, body
+
+
+def _response(status, content, keep_alive):
+    """Helper function to encode a JSON response."""
+    body = json.dumps(content).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+def main():
+    """Run the server on the `TDT4145ProjectGroup131` database."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="threads executing service calls, and pooled MySQL connections",
+    )
+    args = parser.parse_args()
+
+    user = input("Enter MySQL user: ")
+    password = getpass.getpass(prompt="Enter MySQL password: ")
+
+    # One pooled connection per worker thread
+    get_pool(user, password, DB_NAME, pool_size=args.workers)
+    server = PiazzaServer(PiazzaService(user, password, DB_NAME), args.workers)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nBye!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,637 @@
+# -*- coding: utf-8 -*-
+"""Programmatic interface to the Piazza use cases.
+
+This module contains code for the PiazzaService class, implementing logging in,
+creating threads, replies and follow-ups, keyword search, viewing threads,
+recording thread views and post likes, and the user statistics without
+prompting for input. Every method takes its arguments and returns its result,
+and takes a connection from the process-wide connection pool for the duration
+of the call only, so one service can be shared by many users and threads. The
+interactive interface in `piazza_user.py` is a wrapper over this class.
+
+"""
+import uuid
+import hmac
+import bisect
+import hashlib
+from collections import namedtuple
+from mysql import connector
+from pool import get_pool
+from profiling import use_case
+from query import execute
+from query import executemany
+from query import new_id
+from search import iter_search
+from search_index import get_index
+from events import get_event_buffer
+from cache import get_login_cache
+from cache import get_thread_cache
+from cache import invalidate_threads
+from user_stats import count_post
+from user_stats import iter_statistics
+from user_stats import export_statistics
+from thread_view import fetch_thread
+from thread_view import build_tree
+from thread_view import render_thread
+
+# Roles a user can log in as, and the error when the user does not have it
+ROLES = {
+    "Student": "You are not a Student!",
+    "Instructor": "You are not an Instructor!",
+}
+
+# Session context of a logged in user. Role is either "Student" or "Instructor".
+Session = namedtuple("Session", ["userid", "role", "courseid", "pcid"])
+
+# Login lookup of a user, cached by UserEmail. The password is a SHA-256 digest.
+LoginRow = namedtuple(
+    "LoginRow",
+    ["password_digest", "userid", "student_pcid", "instructor_pcid", "courseid"],
+)
+
+
+class LoginError(Exception):
+    """Raised when a login fails, with the reason as message."""
+
+
+class PiazzaService:
+    """Class for the Piazza use cases, without any user interaction.
+
+    Attributes
+    ----------
+    pool : :obj:
+        The ConnectionPool the queries are executed with.
+    events : :obj:
+        The EventBuffer recording the thread views and post likes.
+    """
+
+    def __init__(self, user, password, DB_NAME):
+        """Get the connection pool and event buffer of the database.
+
+        Parameters
+        ----------
+        user : str
+            The MySQL user.
+        password : str
+            The MySQL password.
+        DB_NAME : str
+            The MySQL database name (`TDT4145ProjectGroup131`).
+
+        """
+        self.pool = get_pool(user, password, DB_NAME)
+        self.events = get_event_buffer(self.pool)
+
+    def resolve_session(self, useremail, userpassword, role):
+        """Resolve the session context of a user.
+
+        Checks the UserEmail and Password, and retrieves the UserID, CourseID
+        and the PCID of the user as a student or instructor. The lookup is
+        answered from the login cache, and otherwise done in one round trip to
+        the database and cached.
+
+        Parameters
+        ----------
+        useremail : str
+            The email of the user.
+        userpassword : str
+            The password of the user.
+        role : str
+            The role to log in as, "Student" or "Instructor".
+
+        Returns
+        -------
+        tuple
+            A bool telling if the email exists, a bool telling if the password
+            is correct, and the Session of the user. The Session is None if the
+            email or password is wrong, or if the user is not a student
+            (instructor) when logging in as a student (instructor).
+
+        """
+        row = get_login_cache().get_or_load(useremail, self._load_login)
+        if row is None:
+            return False, False, None
+        if not hmac.compare_digest(row.password_digest, _digest(userpassword)):
+            return True, False, None
+        pcid = row.student_pcid if role == "Student" else row.instructor_pcid
+        if pcid is None:
+            return True, True, None
+        return True, True, Session(row.userid, role, row.courseid, pcid)
+
+    @use_case("login")
+    def _load_login(self, useremail):
+        """Helper function to read the login lookup of a user from the database.
+
+        Parameters
+        ----------
+        useremail : str
+            The email of the user.
+
+        Returns
+        -------
+        :obj:
+            The LoginRow of the user, or None if the email does not exist.
+
+        """
+        cmd = (
+            "SELECT Password, "
+            "BIN_TO_UUID(UserID), "
+            "BIN_TO_UUID(Student.PCID), "
+            "BIN_TO_UUID(Instructor.PCID), "
+            "BIN_TO_UUID(CourseID) "
+            "FROM Login "
+            "INNER JOIN User USING (UserEmail) "
+            "LEFT OUTER JOIN Student ON (UserID=StudentID) "
+            "LEFT OUTER JOIN Instructor ON (UserID=InstructorID) "
+            "LEFT OUTER JOIN UserInCourse USING (UserID) "
+            "WHERE UserEmail = %s "
+            "LIMIT 1"
+        )
+        with self.pool.connection() as cnx:
+            with cnx.cursor() as cursor:
+                execute(cursor, cmd, (useremail,))
+                result = cursor.fetchall()
+
+        if not result:
+            return None
+        password, *row = result[0]
+        return LoginRow(_digest(password), *row)
+
+    def login(self, useremail, userpassword, role):
+        """Log a user in as a student or instructor.
+
+        Parameters
+        ----------
+        useremail : str
+            The email of the user.
+        userpassword : str
+            The password of the user.
+        role : str
+            The role to log in as, "Student" or "Instructor".
+
+        Returns
+        -------
+        :obj:
+            The Session of the user.
+
+        Raises
+        ------
+        LoginError
+            If the email or password is wrong, or the user does not have the
+            role.
+
+        """
+        if role not in ROLES:
+            raise ValueError(f"Unknown role {role}")
+        email_ok, password_ok, session = self.resolve_session(
+            useremail, userpassword, role
+        )
+        if not email_ok:
+            raise LoginError("Email not in database")
+        if not password_ok:
+            raise LoginError("Incorrect password")
+        if session is None:
+            raise LoginError(ROLES[role])
+        return session
+
+    @use_case("create_thread")
+    def create_threads(self, session, threads):
+        """Execute MySQL quries necessary for thread creation.
+
+        Update the `TDT4145ProjectGroup131` database by inserting new data into
+        the `Post`, `Thread`, `Tags`, and `ThreadInFolder` tables. All threads
+        are created in a single transaction with one multi-row insert per
+        table, so either all or none of them are created.
+
+        Parameters
+        ----------
+        session : :obj:
+            The Session of the creator of the threads.
+        threads : list
+            A list of tuples with the post content, the list of folder names
+            and the list of tags of each thread.
+
+        Returns
+        -------
+        list
+            The PostIDs of the created threads.
+
+        Raises
+        ------
+        mysql.connector.Error
+            If a thread could not be created, e.g. because of a folder that
+            does not exist. No threads are created.
+
+        """
+        pcid = uuid.UUID(session.pcid)
+        courseid = uuid.UUID(session.courseid)
+        # Genereate postids
+        postids = [new_id() for _ in threads]
+
+        posts = []
+        thread_rows = []
+        tag_rows = []
+        folder_rows = []
+        for postid, (postcontent, folders, tags) in zip(postids, threads):
+            posts.append((postid, postcontent, pcid))
+            # New thread gets 0 as colorcode, and NULL values for reply fields.
+            thread_rows.append((postid,))
+            tag_rows += [(postid, tag) for tag in dict.fromkeys(tags)]
+            folder_rows += [(postid, courseid, f) for f in dict.fromkeys(folders)]
+
+        with self.pool.connection() as cnx:
+            try:
+                with cnx.cursor() as cursor:
+                    cmd = "INSERT INTO Post VALUES(%s, %s, %s, 'Thread')"
+                    executemany(cursor, cmd, posts)
+                    cmd = "INSERT INTO Thread VALUES(%s, 0, NULL, NULL)"
+                    executemany(cursor, cmd, thread_rows)
+                    cmd = "INSERT INTO Tags VALUES(%s, %s)"
+                    executemany(cursor, cmd, tag_rows)
+                    cmd = "INSERT INTO ThreadInFolder VALUES(%s, %s, %s)"
+                    executemany(cursor, cmd, folder_rows)
+                    count_post(cursor, uuid.UUID(session.userid), len(threads))
+                cnx.commit()
+            except connector.Error:
+                cnx.rollback()
+                raise
+
+        # Update the in-memory search index
+        index = get_index()
+        if index is not None:
+            for postid, (postcontent, folders, tags) in zip(postids, threads):
+                index.add_thread(
+                    str(postid),
+                    postcontent,
+                    session.pcid,
+                    session.courseid,
+                    folders,
+                    tags,
+                )
+        return [str(postid) for postid in postids]
+
+    @use_case("create_reply")
+    def create_replies(self, session, replies):
+        """Execute MySQL quries necessary for reply creation.
+
+        Update the `TDT4145ProjectGroup131` database by inserting new data into
+        the `Post` table, and update the `Thread` table of the threads replied
+        to. All replies are created in a single transaction with one
+        multi-row insert and one update, and the threads are looked up by
+        their binary key. If a thread is replied to several times, its last
+        reply is set as its reply.
+
+        Parameters
+        ----------
+        session : :obj:
+            The Session of the creator of the replies.
+        replies : list
+            A list of tuples with the id of the thread to reply to and the post
+            content of each reply.
+
+        Returns
+        -------
+        list
+            The PostIDs of the created replies, empty if there are no replies.
+
+        Raises
+        ------
+        ValueError
+            If an id is not the id of a thread. No replies are created.
+        mysql.connector.Error
+            If the replies could not be created. No replies are created.
+
+        """
+        if not replies:
+            return []
+        pcid = uuid.UUID(session.pcid)
+        threadids = []
+        for postreplyid, _ in replies:
+            try:
+                threadids.append(uuid.UUID(postreplyid))
+            except ValueError:
+                raise ValueError(f"{postreplyid} is not a post id") from None
+        # generate reply postids
+        replyids = [new_id() for _ in replies]
+        latest = dict(zip(threadids, replyids))
+
+        posts = [
+            (replyid, postcontent, pcid)
+            for replyid, (_, postcontent) in zip(replyids, replies)
+        ]
+        with self.pool.connection() as cnx:
+            try:
+                with cnx.cursor() as cursor:
+                    # Insert into Post table
+                    cmd = "INSERT INTO Post VALUES(%s, %s, %s, 'Reply')"
+                    executemany(cursor, cmd, posts)
+
+                    # Update Thread table
+                    cmd = (
+                        "UPDATE Thread "
+                        "INNER JOIN ("
+                        + " UNION ALL ".join(
+                            ["SELECT %s AS ThreadID, %s AS ReplyID"] * len(latest)
+                        )
+                        + ") AS Replies USING (ThreadID) "
+                        "SET InstructorReplyID=ReplyID, Threadcolor=13"
+                    )
+                    args = tuple(i for pair in latest.items() for i in pair)
+                    execute(cursor, cmd, args)
+                    if cursor.rowcount < len(latest):
+                        raise ValueError("a post id is not the id of a thread")
+
+                    count_post(cursor, uuid.UUID(session.userid), len(replies))
+                cnx.commit()
+            except (connector.Error, ValueError):
+                cnx.rollback()
+                raise
+
+        invalidate_threads(threadids)
+
+        # Update the in-memory search index
+        index = get_index()
+        if index is not None:
+            for replyid, (_, postcontent) in zip(replyids, replies):
+                index.add_post(str(replyid), postcontent, session.pcid)
+        return [str(replyid) for replyid in replyids]
+
+    @use_case("create_followup")
+    def create_followup(self, session, threadid, postcontent, parentid=None):
+        """Create a follow-up in the discussion of a thread.
+
+        The post and its `DiscussionPost` row are inserted in one transaction,
+        and the cached rendering of the thread is invalidated.
+
+        Parameters
+        ----------
+        session : :obj:
+            The Session of the creator of the follow-up.
+        threadid : str
+            The ThreadID of the thread.
+        postcontent : str
+            The post content of the follow-up.
+        parentid : str, optional
+            The PostID of the follow-up replied to, None to reply to the
+            thread itself.
+
+        Returns
+        -------
+        str
+            The PostID of the created follow-up.
+
+        Raises
+        ------
+        ValueError
+            If an id is not valid, or not the id of a thread or of a follow-up
+            in the thread. No follow-up is created.
+
+        """
+        threadid = uuid.UUID(threadid)
+        postid = new_id()
+        if parentid is None:
+            cmd = (
+                "INSERT INTO DiscussionPost "
+                "SELECT %s, NULL, ThreadID FROM Thread WHERE ThreadID = %s"
+            )
+            args = (postid, threadid)
+        else:
+            cmd = (
+                "INSERT INTO DiscussionPost "
+                "SELECT %s, DiscussionPostID, ThreadID FROM DiscussionPost "
+                "WHERE DiscussionPostID = %s AND ThreadID = %s"
+            )
+            args = (postid, uuid.UUID(parentid), threadid)
+
+        with self.pool.connection() as cnx:
+            try:
+                with cnx.cursor() as cursor:
+                    execute(
+                        cursor,
+                        "INSERT INTO Post VALUES(%s, %s, %s, 'Followup')",
+                        (postid, postcontent, uuid.UUID(session.pcid)),
+                    )
+                    execute(cursor, cmd, args)
+                    if cursor.rowcount < 1:
+                        raise ValueError("the post replied to is not in the thread")
+                    count_post(cursor, uuid.UUID(session.userid), 1)
+                cnx.commit()
+            except (connector.Error, ValueError):
+                cnx.rollback()
+                raise
+
+        invalidate_threads([threadid])
+        index = get_index()
+        if index is not None:
+            index.add_post(str(postid), postcontent, session.pcid)
+        return str(postid)
+
+    @use_case("search")
+    def search(self, keyword, limit=None, after=None):
+        """Search the database for posts related to a keyword.
+
+        The search functionality contains (1) search for keyword in post
+        content, (2) search for keyword in thread tags, (3) search for keyword
+        in folder names, and (4) search for keyword in user name. If the
+        in-memory search index is used, the keyword is matched as a substring
+        and the posts are not ranked, have a relevance of 0 and are ordered by
+        PostID.
+
+        Parameters
+        ----------
+        keyword : str
+            The keyword to search for.
+        limit : int, optional
+            The largest number of posts to return.
+        after : tuple, optional
+            The (relevance, PostID) of the last post of the previous page.
+
+        Returns
+        -------
+        list
+            A list of tuples with the PostID of a matching post and its
+            relevance, most relevant first.
+
+        """
+        index = get_index()
+        if index is not None:
+            result = index.search(keyword)
+            # Continue after the last post of the previous page, the PostIDs
+            # are sorted
+            start = 0 if after is None else bisect.bisect_right(result, after[1])
+            end = None if limit is None else start + limit
+            return [(postid, 0.0) for postid in result[start:end]]
+
+        with self.pool.connection() as cnx:
+            return list(iter_search(cnx, keyword, limit, after))
+
+    def view_thread(self, session, threadid):
+        """Record that a user viewed a thread.
+
+        The view is buffered, and written to the `UserViewsThread` table in
+        the background.
+
+        Parameters
+        ----------
+        session : :obj:
+            The Session of the user.
+        threadid : str
+            The ThreadID of the viewed thread.
+
+        Raises
+        ------
+        ValueError
+            If the id is not a valid uuid.
+
+        """
+        self.events.record_view(uuid.UUID(session.userid), uuid.UUID(threadid))
+
+    @use_case("view_thread")
+    def get_thread(self, threadid):
+        """Get the discussion tree of a thread.
+
+        Parameters
+        ----------
+        threadid : str
+            The ThreadID of the thread.
+
+        Returns
+        -------
+        :obj:
+            The ThreadPost of the thread post, with the answers and follow-ups
+            as its replies, or None if there is no such thread.
+
+        Raises
+        ------
+        ValueError
+            If the id is not a valid uuid.
+
+        """
+        with self.pool.connection() as cnx:
+            return build_tree(fetch_thread(cnx, threadid))
+
+    def show_thread(self, session, threadid):
+        """Get the rendered text of a thread, and record that the user viewed it.
+
+        The text is answered from the thread cache, and otherwise rendered from
+        `get_thread` and cached until a reply or follow-up is created in the
+        thread, or for at most `cache.THREAD_TTL` seconds.
+
+        Parameters
+        ----------
+        session : :obj:
+            The Session of the user.
+        threadid : str
+            The ThreadID of the thread.
+
+        Returns
+        -------
+        str
+            The rendered thread, or None if there is no such thread.
+
+        Raises
+        ------
+        ValueError
+            If the id is not a valid uuid.
+
+        """
+        threadid = str(uuid.UUID(threadid))
+
+        def load(threadid):
+            root = self.get_thread(threadid)
+            return render_thread(root) if root is not None else None
+
+        text = get_thread_cache().get_or_load(threadid, load)
+        if text is not None:
+            self.view_thread(session, threadid)
+        return text
+
+    def like_post(self, session, postid):
+        """Record that a user liked a post.
+
+        The like is buffered, and written to the `UserLikesPost` table in the
+        background.
+
+        Parameters
+        ----------
+        session : :obj:
+            The Session of the user.
+        postid : str
+            The PostID of the liked post.
+
+        Raises
+        ------
+        ValueError
+            If the id is not a valid uuid.
+
+        """
+        self.events.record_like(uuid.UUID(session.userid), uuid.UUID(postid))
+
+    @use_case("statistics")
+    def statistics(self, session, limit=None, after=None):
+        """Get the thread views and post creation statistics of the users.
+
+        Parameters
+        ----------
+        session : :obj:
+            The Session of the instructor.
+        limit : int, optional
+            The largest number of users to return.
+        after : tuple, optional
+            The (threads read, UserID) of the last user of the previous page.
+
+        Returns
+        -------
+        list
+            A list of tuples with the UserID, UserName, NumberOfThreadsRead
+            and NumberOfPostsCreated of each user, most threads read first.
+
+        Raises
+        ------
+        PermissionError
+            If the user is not an instructor.
+
+        """
+        _require_instructor(session)
+        with self.pool.connection() as cnx:
+            return list(iter_statistics(cnx, limit, after))
+
+    @use_case("export_statistics")
+    def export_statistics(self, session, path, limit=None):
+        """Export the thread views and post creation statistics to a file.
+
+        Parameters
+        ----------
+        session : :obj:
+            The Session of the instructor.
+        path : str
+            The path of the file, ending in `.csv` or `.json`.
+        limit : int, optional
+            The largest number of users to export.
+
+        Returns
+        -------
+        int
+            The number of exported users.
+
+        Raises
+        ------
+        PermissionError
+            If the user is not an instructor.
+        ValueError
+            If the file does not end in `.csv` or `.json`.
+
+        """
+        _require_instructor(session)
+        with self.pool.connection() as cnx:
+            return export_statistics(cnx, path, limit)
+
+
+def _require_instructor(session):
+    """Helper function to check that a user is logged in as an instructor."""
+    if session.role != "Instructor":
+        raise PermissionError("Only instructors can view statistics")
+
+
+def _digest(password):
+    """Helper function to get the SHA-256 digest of a password."""
+    return hashlib.sha256(password.encode("utf-8")).digest()
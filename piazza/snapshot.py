@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+"""Columnar snapshots of the preprocessed `.csv` files.
+
+This module contains code that stores a `.csv` file as it is inserted by
+`utils.insert_data`, with the uuid strings converted to 16 byte values, the
+boolean columns converted to bools and the empty fields marked as NULL values,
+as one memory-mapped array file per column part. Inserting the same file again
+reads its snapshot instead of parsing it.
+
+A snapshot is written while the file is read in chunks with pandas, and the ID
+columns of each chunk are converted at once with `utils.uuids_to_bytes`, so
+writing a snapshot costs about as much as inserting the file without one.
+
+A snapshot is a directory named after the table and the sha256 checksum of the
+`.csv` file, so a changed file never uses the snapshot of an older version.
+The arrays are stored as raw files, with the number of rows in `meta.json`.
+Every column has a `.null` bool array marking the NULL values, and
+
+* ID columns a `.ids` (n, 16) uint8 array of the 16 byte values,
+* boolean columns a `.bool` array, and
+* other columns a `.data` uint8 array of the concatenated UTF-8 values
+  and a `.offsets` int64 array of the n + 1 offsets of the values in it.
+
+The other columns are kept as strings, as read with the `csv` module.
+
+"""
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from utils import uuids_to_bytes
+
+# Version of the snapshot format, snapshots of other versions are rebuilt
+FORMAT_VERSION = 2
+
+# Number of rows of the `.csv` file read and written at a time
+CHUNK_SIZE = 100000
+
+# Data type and width of the arrays of each kind of column, the offsets of text
+# columns before their data, which is as long as the last offset
+_ARRAYS = {
+    "id": {"null": (np.bool_, 0), "ids": (np.uint8, 16)},
+    "bool": {"null": (np.bool_, 0), "bool": (np.bool_, 0)},
+    "text": {"null": (np.bool_, 0), "offsets": (np.int64, 0), "data": (np.uint8, 0)},
+}
+
+
+def snapshot_path(snapshot_dir, tablename, checksum):
+    """Get the directory of the snapshot of a `.csv` file.
+
+    Parameters
+    ----------
+    snapshot_dir : str
+        The directory containing the snapshots.
+    tablename : str
+        The name of the table of the file.
+    checksum : str
+        The hex sha256 checksum of the file.
+
+    Returns
+    -------
+    str
+        The path of the snapshot directory.
+
+    """
+    return os.path.join(snapshot_dir, f"{tablename}.{checksum[:32]}")
+
+
+def _convert_chunk(kind, values):
+    """Helper function to convert a column of a chunk to its arrays.
+
+    Parameters
+    ----------
+    kind : str
+        The kind of the column, "id", "bool" or "text".
+    values : :obj:
+        The pandas.Series of the column, with empty strings for NULL values.
+
+    Returns
+    -------
+    dict
+        The arrays of the chunk by name, the offsets of text columns relative
+        to the start of the chunk and without the leading 0.
+
+    """
+    null = (values == "").to_numpy()
+    arrays = {"null": null}
+    if kind == "id":
+        # 16 zero bytes for NULL values, so the rows stay aligned
+        ids = np.zeros((len(values), 16), dtype=np.uint8)
+        converted = uuids_to_bytes(values[~null])
+        ids[~null] = np.frombuffer(b"".join(converted), dtype=np.uint8).reshape(-1, 16)
+        arrays["ids"] = ids
+    elif kind == "bool":
+        arrays["bool"] = (values == "True").to_numpy()
+    else:
+        encoded = [value.encode("utf-8") for value in values]
+        arrays["data"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+        arrays["offsets"] = np.cumsum(lengths)
+    return arrays
+
+
+def write_snapshot(path, csv_path, column_kind, chunk_size=CHUNK_SIZE):
+    """Parse a `.csv` file and write its snapshot.
+
+    The file is read `chunk_size` rows at a time, and the arrays of each chunk
+    are appended to the array files, so the whole file is never held in
+    memory. The snapshot is written to a temporary directory that is renamed
+    when complete, and the snapshots of earlier versions of the file are
+    removed.
+
+    Parameters
+    ----------
+    path : str
+        The path of the snapshot directory, see `snapshot_path`.
+    csv_path : str
+        The path to the `.csv` file.
+    column_kind : callable
+        Function giving the kind of a column from its name: "id" for uuid
+        strings, "bool" for `True`/`False` and "text" for other columns.
+    chunk_size : int, optional
+        The number of rows read and written at a time.
+
+    Raises
+    ------
+    ValueError
+        If a value of an ID column is not a valid uuid.
+
+    """
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    # Read every field as a string, empty fields as empty strings
+    chunks = pd.read_csv(
+        csv_path,
+        dtype=str,
+        keep_default_na=False,
+        chunksize=chunk_size,
+        encoding="utf-8",
+    )
+    columns = None
+    num_rows = 0
+    files = {}
+    try:
+        for chunk in chunks:
+            if columns is None:
+                columns = list(chunk.columns)
+                kinds = [column_kind(col) for col in columns]
+                offsets = [0] * len(columns)
+                for i, kind in enumerate(kinds):
+                    for name in _ARRAYS[kind]:
+                        files[i, name] = open(
+                            os.path.join(tmp_path, f"{i}.{name}"), "wb"
+                        )
+                    if kind == "text":
+                        np.zeros(1, dtype=np.int64).tofile(files[i, "offsets"])
+            # Missing fields at the end of a row are NULL values
+            chunk = chunk.fillna("")
+            for i, (kind, col) in enumerate(zip(kinds, columns)):
+                for name, array in _convert_chunk(kind, chunk[col]).items():
+                    if name == "offsets":
+                        array = array + offsets[i]
+                        offsets[i] = int(array[-1]) if len(array) else offsets[i]
+                    array.tofile(files[i, name])
+            num_rows += len(chunk)
+    finally:
+        for f in files.values():
+            f.close()
+
+    if columns is None:
+        # File without rows, read the header only
+        columns = list(pd.read_csv(csv_path, nrows=0, encoding="utf-8").columns)
+        kinds = [column_kind(col) for col in columns]
+        for i, kind in enumerate(kinds):
+            for name in _ARRAYS[kind]:
+                with open(os.path.join(tmp_path, f"{i}.{name}"), "wb") as f:
+                    if name == "offsets":
+                        np.zeros(1, dtype=np.int64).tofile(f)
+    meta = {
+        "version": FORMAT_VERSION,
+        "columns": columns,
+        "kinds": kinds,
+        "rows": num_rows,
+    }
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    # Replace the snapshots of earlier versions of the file
+    directory, name = os.path.split(path)
+    tablename = name.split(".")[0]
+    for old in os.listdir(directory):
+        if old.split(".")[0] == tablename and old != name + ".tmp":
+            shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    os.replace(tmp_path, path)
+
+
+def _map(path, dtype, shape):
+    """Helper function to memory-map a raw array file, which may be empty."""
+    if 0 in shape:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def read_snapshot(path):
+    """Open the arrays of a snapshot as memory-mapped arrays.
+
+    Parameters
+    ----------
+    path : str
+        The path of the snapshot directory, see `snapshot_path`.
+
+    Returns
+    -------
+    tuple
+        The metadata of the snapshot, and a list with a dict of the arrays of
+        each column, or None if there is no snapshot of the current format.
+
+    """
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != FORMAT_VERSION:
+        return None
+
+    num_rows = meta["rows"]
+    arrays = []
+    try:
+        for i, kind in enumerate(meta["kinds"]):
+            prefix = os.path.join(path, str(i))
+            column = {}
+            for name, (dtype, width) in _ARRAYS[kind].items():
+                if name == "offsets":
+                    shape = (num_rows + 1,)
+                elif name == "data":
+                    shape = (int(column["offsets"][-1]),)
+                else:
+                    shape = (num_rows, width) if width else (num_rows,)
+                column[name] = _map(f"{prefix}.{name}", dtype, shape)
+            arrays.append(column)
+    except (OSError, ValueError):
+        # Missing or truncated array file
+        return None
+    return meta, arrays
+
+
+def snapshot_batches(path, batch_size, skip_rows=0):
+    """Read the rows of a snapshot in batches.
+
+    Parameters
+    ----------
+    path : str
+        The path of the snapshot directory, see `snapshot_path`.
+    batch_size : int
+        The number of rows per batch.
+    skip_rows : int, optional
+        The number of rows at the start of the file that are already loaded.
+
+    Yields
+    ------
+    list
+        A list of tuples with the column values of each row of a batch, the
+        same as read from the `.csv` file by `utils._csv_batches`.
+
+    Raises
+    ------
+    FileNotFoundError
+        If there is no snapshot of the current format.
+
+    """
+    snapshot = read_snapshot(path)
+    if snapshot is None:
+        raise FileNotFoundError(f"No snapshot in {path}")
+    meta, arrays = snapshot
+
+    for start in range(skip_rows, meta["rows"], batch_size):
+        end = min(start + batch_size, meta["rows"])
+        columns = []
+        for kind, column in zip(meta["kinds"], arrays):
+            if kind == "id":
+                buf = column["ids"][start:end].tobytes()
+                values = [buf[i : i + 16] for i in range(0, len(buf), 16)]
+            elif kind == "bool":
+                values = column["bool"][start:end].tolist()
+            else:
+                offsets = column["offsets"][start : end + 1]
+                buf = column["data"][offsets[0] : offsets[-1]].tobytes()
+                offsets = (offsets - offsets[0]).tolist()
+                values = [
+                    buf[a:b].decode("utf-8") for a, b in zip(offsets, offsets[1:])
+                ]
+            # Put back the NULL values
+            for i in np.flatnonzero(column["null"][start:end]).tolist():
+                values[i] = None
+            columns.append(values)
+        yield list(zip(*columns))
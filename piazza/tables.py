@@ -4,13 +4,71 @@
 This module contains code which defines the tables, their fields and their
 constraints used to setup the `TDT4145ProjectGroup131` database. The database
 name is stored in the string `DB_NAME` variable. The tables are stored in a dict
-named `TABLES`.
+named `TABLES`. The version of the schema is stored in `SCHEMA_VERSION`, and the
+statements bringing an older database up to that version in `MIGRATIONS`. The
+secondary indexes added for the queries of the application are listed in
+`WORKLOAD_INDEXES`.
 
 """
 
 # Name of database
 DB_NAME = "TDT4145ProjectGroup131"
 
+# Version of the schema defined by TABLES. Increase it when changing a table,
+# and add the statements changing an existing database to MIGRATIONS.
+SCHEMA_VERSION = 5
+
+# dict of schema versions and the list of statements upgrading a database from
+# the previous version.
+MIGRATIONS = {}
+
+# FULLTEXT indexes used by the keyword search.
+MIGRATIONS[2] = [
+    "ALTER TABLE `User` ADD FULLTEXT KEY `UserName_FT` (`UserName`)",
+    "ALTER TABLE `Post` ADD FULLTEXT KEY `PostContent_FT` (`PostContent`)",
+    "ALTER TABLE `Tags` ADD FULLTEXT KEY `Tag_FT` (`Tag`)",
+    "ALTER TABLE `Folder` ADD FULLTEXT KEY `FolderName_FT` (`FolderName`)",
+]
+
+# UserStats is created as a missing table, and filled by insert_data.
+MIGRATIONS[3] = []
+
+# Secondary indexes for the joins and orderings of the application. The indexes
+# MySQL created for the foreign keys are replaced by the named indexes.
+MIGRATIONS[4] = [
+    "ALTER TABLE `Post` ADD KEY `Post_PCID_IX` (`PCID`)",
+    "ALTER TABLE `Post` DROP INDEX `Post_FK`",
+    "ALTER TABLE `ThreadInFolder` "
+    "ADD KEY `ThreadInFolder_Folder_IX` (`CourseID`, `FolderName`)",
+    "ALTER TABLE `ThreadInFolder` DROP INDEX `ThreadInFolder_FK2`",
+    "ALTER TABLE `UserStats` "
+    "ADD KEY `UserStats_Read_IX` (`NumberOfThreadsRead` DESC, `UserID`)",
+]
+
+# A thread can have many follow-ups, which are posts. SuperPostID is NULL for a
+# follow-up on the thread itself.
+MIGRATIONS[5] = [
+    "ALTER TABLE `DiscussionPost` "
+    "ADD KEY `DiscussionPost_Thread_IX` (`ThreadID`)",
+    "ALTER TABLE `DiscussionPost` DROP INDEX `ThreadID_UK`",
+    "ALTER TABLE `DiscussionPost` MODIFY `SuperPostID` binary(16)",
+    "ALTER TABLE `DiscussionPost` "
+    "ADD CONSTRAINT `DiscussionPost_FK3` FOREIGN KEY (`DiscussionPostID`) "
+    "REFERENCES `Post` (`PostID`) ON UPDATE CASCADE ON DELETE CASCADE",
+]
+
+# Secondary indexes added for the workload of the application, by table. Used
+# by index_advisor.py to measure the latencies with and without each index.
+WORKLOAD_INDEXES = {
+    # Posts by creator, for the statistics and the search by user name. The
+    # PostID is part of every secondary index, so the index is covering.
+    "Post": ["Post_PCID_IX"],
+    # Threads by folder, for the search by folder name
+    "ThreadInFolder": ["ThreadInFolder_Folder_IX"],
+    # Users by threads read, for the pages of the statistics
+    "UserStats": ["UserStats_Read_IX"],
+}
+
 
 # dict of the MySQL tables, their fields and their constraints.
 # BINARY(16) types were used for IDs as they can store uuid.
@@ -23,7 +81,8 @@ TABLES["User"] = (
     "  `UserName` varchar(100) NOT NULL,"
     "  `UserEmail` varchar(100) NOT NULL,"
     "  CONSTRAINT `User_PK` PRIMARY KEY (`UserID`),"
-    "  CONSTRAINT `UserEmail_FK` UNIQUE KEY (`UserEmail`)"
+    "  CONSTRAINT `UserEmail_FK` UNIQUE KEY (`UserEmail`),"
+    "  FULLTEXT KEY `UserName_FT` (`UserName`)"
     ") ENGINE=InnoDB"
 )
 
@@ -81,6 +140,8 @@ TABLES["Post"] = (
     "  `PCID` binary(16) NOT NULL,"
     "  `PostType` varchar(100) NOT NULL,"
     "  CONSTRAINT `Post_PK` PRIMARY KEY (`PostID`),"
+    "  KEY `Post_PCID_IX` (`PCID`),"
+    "  FULLTEXT KEY `PostContent_FT` (`PostContent`),"
     "  CONSTRAINT `Post_FK` FOREIGN KEY (`PCID`) REFERENCES `PostCreator` (`PCID`)"
     "          ON UPDATE CASCADE ON DELETE CASCADE"
     ") ENGINE=InnoDB"
@@ -114,17 +175,20 @@ TABLES["Thread"] = (
     ") ENGINE=InnoDB"
 )
 
-# SuperPostID was assumed to not necessarily be unique.
+# SuperPostID was assumed to not necessarily be unique. It is NULL for a
+# follow-up on the thread itself.
 TABLES["DiscussionPost"] = (
     "CREATE TABLE `DiscussionPost` ("
     "  `DiscussionPostID` binary(16) NOT NULL,"
-    "  `SuperPostID` binary(16) NOT NULL,"
+    "  `SuperPostID` binary(16),"
     "  `ThreadID` binary(16) NOT NULL,"
     "  CONSTRAINT `DiscussionPost_PK` PRIMARY KEY (`DiscussionPostID`),"
-    "  CONSTRAINT `ThreadID_UK` UNIQUE KEY (`ThreadID`),"
+    "  KEY `DiscussionPost_Thread_IX` (`ThreadID`),"
     "  CONSTRAINT `DiscussionPost_FK1` FOREIGN KEY (`SuperPostID`) REFERENCES `DiscussionPost` (`DiscussionPostID`)"
     "          ON UPDATE CASCADE ON DELETE CASCADE,"
     "  CONSTRAINT `DiscussionPost_FK2` FOREIGN KEY (`ThreadID`) REFERENCES `Thread` (`ThreadID`)"
+    "          ON UPDATE CASCADE ON DELETE CASCADE,"
+    "  CONSTRAINT `DiscussionPost_FK3` FOREIGN KEY (`DiscussionPostID`) REFERENCES `Post` (`PostID`)"
     "          ON UPDATE CASCADE ON DELETE CASCADE"
     ") ENGINE=InnoDB"
 )
@@ -134,6 +198,7 @@ TABLES["Tags"] = (
     "  `ThreadID` binary(16) NOT NULL,"
     "  `Tag` varchar(100) NOT NULL,"
     "  CONSTRAINT `Tags_PK` PRIMARY KEY (`ThreadID`, `Tag`),"
+    "  FULLTEXT KEY `Tag_FT` (`Tag`),"
     "  CONSTRAINT `Tags_FK` FOREIGN KEY (`ThreadID`) REFERENCES `Thread` (`ThreadID`)"
     "          ON UPDATE CASCADE ON DELETE CASCADE"
     ") ENGINE=InnoDB"
@@ -156,6 +221,7 @@ TABLES["Folder"] = (
     "  `CourseID` binary(16) NOT NULL,"
     "  `FolderName` varchar(100) NOT NULL,"
     "  CONSTRAINT `Folder_PK` PRIMARY KEY (`CourseID`, `FolderName`),"
+    "  FULLTEXT KEY `FolderName_FT` (`FolderName`),"
     "  CONSTRAINT `Folder_FK` FOREIGN KEY (`CourseID`) REFERENCES `CourseForum` (`CourseID`)"
     "          ON UPDATE CASCADE ON DELETE CASCADE"
     ") ENGINE=InnoDB"
@@ -167,6 +233,7 @@ TABLES["ThreadInFolder"] = (
     "  `CourseID` binary(16) NOT NULL,"
     "  `FolderName` varchar(100) NOT NULL,"
     "  CONSTRAINT `ThreadInFolder_PK` PRIMARY KEY (`ThreadID`, `CourseID`, `FolderName`),"
+    "  KEY `ThreadInFolder_Folder_IX` (`CourseID`, `FolderName`),"
     "  CONSTRAINT `ThreadInFolder_FK1` FOREIGN KEY (`ThreadID`) REFERENCES `Thread` (`ThreadID`)"
     "          ON UPDATE CASCADE ON DELETE CASCADE,"
     "  CONSTRAINT `ThreadInFolder_FK2` FOREIGN KEY (`CourseID`, `FolderName`) REFERENCES `Folder` (`CourseID`, `FolderName`)"
@@ -199,3 +266,39 @@ TABLES["UserInCourse"] = (
     "          ON UPDATE CASCADE ON DELETE CASCADE"
     ") ENGINE=InnoDB"
 )
+
+
+# Number of threads read and posts created by each student and instructor,
+# maintained by the application to avoid aggregating UserViewsThread and Post.
+TABLES["UserStats"] = (
+    "CREATE TABLE `UserStats` ("
+    "  `UserID` binary(16) NOT NULL,"
+    "  `NumberOfThreadsRead` int(10) NOT NULL,"
+    "  `NumberOfPostsCreated` int(10) NOT NULL,"
+    "  CONSTRAINT `UserStats_PK` PRIMARY KEY (`UserID`),"
+    "  KEY `UserStats_Read_IX` (`NumberOfThreadsRead` DESC, `UserID`),"
+    "  CONSTRAINT `UserStats_FK` FOREIGN KEY (`UserID`) REFERENCES `User` (`UserID`)"
+    "          ON UPDATE CASCADE ON DELETE CASCADE"
+    ") ENGINE=InnoDB"
+)
+
+
+# Bookkeeping of the schema version of the database.
+TABLES["SchemaVersion"] = (
+    "CREATE TABLE `SchemaVersion` ("
+    "  `Version` int(10) NOT NULL,"
+    "  CONSTRAINT `SchemaVersion_PK` PRIMARY KEY (`Version`)"
+    ") ENGINE=InnoDB"
+)
+
+# Bookkeeping of the loaded `.csv` files. Checksum is the sha256 of the first
+# ByteSize bytes of the file, which held RowsLoaded rows when it was loaded.
+TABLES["SeedFile"] = (
+    "CREATE TABLE `SeedFile` ("
+    "  `FileName` varchar(100) NOT NULL,"
+    "  `Checksum` char(64) NOT NULL,"
+    "  `ByteSize` bigint NOT NULL,"
+    "  `RowsLoaded` bigint NOT NULL,"
+    "  CONSTRAINT `SeedFile_PK` PRIMARY KEY (`FileName`)"
+    ") ENGINE=InnoDB"
+)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Whole thread retrieval from the `TDT4145ProjectGroup131` database.
+
+This module contains code that reads a thread with its discussion tree: the
+thread post, the student and instructor answers of `Thread`, and the
+follow-ups of `DiscussionPost` nested to any depth. The tree is read with one
+recursive common table expression (CTE) instead of one query per level, and
+assembled in one pass over the rows, which come ordered by depth.
+
+The answers come before the follow-ups, and follow-ups with the same parent are
+ordered by PostID, which is the order they were created in for time-ordered keys
+(see `query.new_id`).
+
+"""
+import uuid
+from collections import namedtuple
+from query import execute
+
+# Deepest level of follow-ups read, stops the recursion on a cycle of
+# SuperPostIDs
+MAX_DEPTH = 100
+
+# A post of a thread, and the posts replying to it
+ThreadPost = namedtuple(
+    "ThreadPost", ["postid", "kind", "content", "author", "replies"]
+)
+
+# The discussion tree of a thread. Every %s but the last is bound to the
+# ThreadID, and the last to MAX_DEPTH.
+_THREAD_TREE = (
+    "WITH RECURSIVE Tree (PostID, ParentID, Depth, Kind) AS ("
+    "SELECT ThreadID, CAST(NULL AS BINARY(16)), 0, CAST('Thread' AS CHAR(20)) "
+    "FROM Thread WHERE ThreadID = %s "
+    "UNION ALL "
+    "SELECT StudentReplyID, ThreadID, 1, 'Student answer' "
+    "FROM Thread WHERE ThreadID = %s AND StudentReplyID IS NOT NULL "
+    "UNION ALL "
+    "SELECT InstructorReplyID, ThreadID, 1, 'Instructor answer' "
+    "FROM Thread WHERE ThreadID = %s AND InstructorReplyID IS NOT NULL "
+    "UNION ALL "
+    "SELECT DiscussionPostID, ThreadID, 1, 'Follow-up' "
+    "FROM DiscussionPost WHERE ThreadID = %s AND SuperPostID IS NULL "
+    "UNION ALL "
+    "SELECT DiscussionPost.DiscussionPostID, DiscussionPost.SuperPostID, "
+    "Tree.Depth + 1, 'Follow-up' "
+    "FROM Tree INNER JOIN DiscussionPost "
+    "ON DiscussionPost.SuperPostID = Tree.PostID "
+    "WHERE Tree.Depth < %s"
+    ") "
+    "SELECT BIN_TO_UUID(Tree.PostID), BIN_TO_UUID(Tree.ParentID), Tree.Kind, "
+    "PostContent, UserName "
+    "FROM Tree "
+    "INNER JOIN Post ON Post.PostID = Tree.PostID "
+    "LEFT JOIN Student ON Student.PCID = Post.PCID "
+    "LEFT JOIN Instructor ON Instructor.PCID = Post.PCID "
+    "LEFT JOIN User ON User.UserID = COALESCE(StudentID, InstructorID) "
+    "ORDER BY Tree.Depth, "
+    "FIELD(Tree.Kind, 'Student answer', 'Instructor answer', 'Follow-up'), "
+    "Tree.PostID"
+)
+
+
+def fetch_thread(cnx, threadid):
+    """Read a thread and all the posts replying to it in one query.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+    threadid : str
+        The ThreadID of the thread.
+
+    Returns
+    -------
+    list
+        A list of tuples with the PostID, the PostID of the parent (None for
+        the thread post), the kind, the post content and the name of the
+        creator of each post, parents first.
+
+    Raises
+    ------
+    ValueError
+        If the id is not a valid uuid.
+
+    """
+    threadid = uuid.UUID(threadid)
+    with cnx.cursor() as cursor:
+        execute(cursor, _THREAD_TREE, (threadid,) * 4 + (MAX_DEPTH,))
+        return cursor.fetchall()
+
+
+def build_tree(rows):
+    """Assemble the discussion tree of a thread in one pass.
+
+    Parameters
+    ----------
+    rows : list
+        The rows returned by `fetch_thread`, parents first.
+
+    Returns
+    -------
+    :obj:
+        The ThreadPost of the thread post, or None if there is no thread.
+
+    """
+    root = None
+    posts = {}
+    for postid, parentid, kind, content, author in rows:
+        post = ThreadPost(postid, kind, content, author, [])
+        if parentid is None:
+            root = post
+        elif parentid in posts:
+            posts[parentid].replies.append(post)
+        else:
+            # The parent was not read, as it is not in the Post table
+            continue
+        posts[postid] = post
+    return root
+
+
+def render_thread(root):
+    """Render the discussion tree of a thread as indented text.
+
+    Parameters
+    ----------
+    root : :obj:
+        The ThreadPost of the thread post.
+
+    Returns
+    -------
+    str
+        Every post with its kind, PostID and creator, followed by its content,
+        with the replies indented below it.
+
+    """
+    lines = []
+    stack = [(root, 0)]
+    while stack:
+        post, depth = stack.pop()
+        indent = "    " * depth
+        author = post.author if post.author is not None else "unknown"
+        lines.append(f"{indent}[{post.kind}] {post.postid} by {author}")
+        lines += [f"{indent}  {line}" for line in post.content.splitlines()]
+        # Push the replies in reverse, so the first is rendered first
+        stack += [(reply, depth + 1) for reply in reversed(post.replies)]
+    return "\n".join(lines)
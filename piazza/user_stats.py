@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""Materialized user statistics of the `TDT4145ProjectGroup131` database.
+
+This module contains code that maintains the `UserStats` table, holding the
+number of threads read and posts created by every student and instructor. The
+table is rebuilt from `Post` and `UserViewsThread` after loading data, and kept
+current by the post creation and thread view recording, so that viewing the
+statistics does not aggregate the whole `UserViewsThread` table.
+
+Usage:
+    python user_stats.py rebuild
+    python user_stats.py check
+
+"""
+import sys
+import csv
+import json
+import uuid
+import getpass
+import argparse
+from tables import DB_NAME
+from pool import get_pool
+from query import execute
+from query import executemany
+from profiling import use_case
+
+# Statistics computed from the `Post` and `UserViewsThread` tables.
+LIVE_STATISTICS = (
+    "SELECT UserID, "
+    "NumberOfThreadsRead, "
+    "NumberOfPostsCreated "
+    "FROM "
+    "(SELECT UserID, "
+    "COUNT(PostID) AS NumberOfPostsCreated "
+    "FROM "
+    "(SELECT UserID, "
+    "PCID "
+    "FROM User "
+    "INNER JOIN Student ON (UserID=StudentID) "
+    "UNION SELECT UserID, "
+    "PCID "
+    "FROM User "
+    "INNER JOIN Instructor ON (UserID=InstructorID)) AS T1 "
+    "LEFT OUTER JOIN Post USING (PCID) "
+    "GROUP BY (UserID)) AS T2 "
+    "INNER JOIN "
+    "(SELECT Userid, "
+    "COUNT(ThreadID) AS NumberOfThreadsRead "
+    "FROM User "
+    "LEFT OUTER JOIN UserViewsThread USING (UserID) "
+    "GROUP BY (UserID)) AS T3 USING (UserID)"
+)
+
+# Statement rebuilding the `UserStats` table.
+REBUILD = "INSERT INTO UserStats " + LIVE_STATISTICS
+
+
+@use_case("rebuild_user_stats")
+def rebuild_user_stats(cnx):
+    """Rebuild the `UserStats` table in a single transaction.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+
+    """
+    with cnx.cursor() as cursor:
+        execute(cursor, "DELETE FROM UserStats")
+        execute(cursor, REBUILD)
+    cnx.commit()
+
+
+def count_post(cursor, userid, count=1):
+    """Count posts created by a user in the `UserStats` table.
+
+    Executed in the transaction creating the posts, and not committed.
+
+    Parameters
+    ----------
+    cursor : :obj:
+        The mysql.connector.cursor object used to execute MySQL queries.
+    userid : uuid.UUID
+        The UserID of the creator of the posts.
+    count : int, optional
+        The number of posts created.
+
+    """
+    cmd = (
+        "INSERT INTO UserStats VALUES (%s, 0, %s) "
+        "ON DUPLICATE KEY UPDATE NumberOfPostsCreated = NumberOfPostsCreated + %s"
+    )
+    execute(cursor, cmd, (userid, count, count))
+
+
+def count_threads_read(cursor, counts):
+    """Count threads read for the first time by users in the `UserStats` table.
+
+    The counts of all users are added with one multi-row statement. Executed in
+    the transaction recording the thread views, and not committed.
+
+    Parameters
+    ----------
+    cursor : :obj:
+        The mysql.connector.cursor object used to execute MySQL queries.
+    counts : dict
+        The number of threads read by the UserID of each reader.
+
+    """
+    cmd = (
+        "INSERT INTO UserStats VALUES (%s, %s, 0) "
+        "ON DUPLICATE KEY UPDATE "
+        "NumberOfThreadsRead = NumberOfThreadsRead + VALUES(NumberOfThreadsRead)"
+    )
+    executemany(cursor, cmd, list(counts.items()))
+
+
+def check_user_stats(cnx):
+    """Compare the `UserStats` table against the statistics computed live.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+
+    Returns
+    -------
+    list
+        A list of tuples with the UserID, the (threads read, posts created) in
+        `UserStats` and the live (threads read, posts created), for every user
+        where they differ. None is used for missing rows.
+
+    """
+    with cnx.cursor() as cursor:
+        execute(
+            cursor,
+            "SELECT BIN_TO_UUID(UserID), NumberOfThreadsRead, NumberOfPostsCreated "
+            "FROM UserStats",
+        )
+        stored = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+        execute(
+            cursor,
+            "SELECT BIN_TO_UUID(UserID), NumberOfThreadsRead, NumberOfPostsCreated "
+            "FROM (" + LIVE_STATISTICS + ") AS Live",
+        )
+        live = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+
+    return [
+        (userid, stored.get(userid), live.get(userid))
+        for userid in sorted(stored.keys() | live.keys())
+        if stored.get(userid) != live.get(userid)
+    ]
+
+
+def iter_statistics(cnx, limit=None, after=None):
+    """Stream the user statistics, most threads read first.
+
+    The rows are read from the server as they are iterated instead of being
+    fetched all at once. Pagination is done on the (threads read, UserID) of
+    the last row of the previous page instead of an offset.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+    limit : int, optional
+        The largest number of users to return.
+    after : tuple, optional
+        The (threads read, UserID) of the last user of the previous page.
+
+    Yields
+    ------
+    tuple
+        The UserID, UserName, NumberOfThreadsRead and NumberOfPostsCreated of
+        a user.
+
+    """
+    cmd = (
+        "SELECT BIN_TO_UUID(UserID), "
+        "UserName, "
+        "NumberOfThreadsRead, "
+        "NumberOfPostsCreated "
+        "FROM UserStats "
+        "INNER JOIN User USING (UserID) "
+    )
+    args = ()
+    if after is not None:
+        threads_read, userid = after
+        cmd += (
+            "WHERE NumberOfThreadsRead < %s "
+            "OR (NumberOfThreadsRead = %s AND UserID > %s) "
+        )
+        args += (threads_read, threads_read, uuid.UUID(userid))
+    cmd += "ORDER BY NumberOfThreadsRead DESC, UserID"
+    if limit is not None:
+        cmd += " LIMIT %s"
+        args += (limit,)
+
+    # Unbuffered cursor, reading the rows from the server while iterating
+    with cnx.cursor(buffered=False) as cursor:
+        execute(cursor, cmd, args)
+        try:
+            for row in cursor:
+                yield row
+        finally:
+            # Read the rows left if the caller stopped iterating early
+            cursor.fetchall()
+
+
+def export_statistics(cnx, path, limit=None):
+    """Stream the user statistics to a `.csv` or `.json` file.
+
+    The rows are written as they are read from the server, without holding
+    them all in memory.
+
+    Parameters
+    ----------
+    cnx : :obj:
+        The mysql.connector object used to execute MySQL queries.
+    path : str
+        The path of the file, ending in `.csv` or `.json`.
+    limit : int, optional
+        The largest number of users to export.
+
+    Returns
+    -------
+    int
+        The number of exported users.
+
+    Raises
+    ------
+    ValueError
+        If the file does not end in `.csv` or `.json`.
+
+    """
+    fields = ["UserName", "NumberOfThreadsRead", "NumberOfPostsCreated"]
+    if not path.endswith((".csv", ".json")):
+        raise ValueError("Export file must end in .csv or .json")
+
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            writer = csv.writer(f)
+            writer.writerow(fields)
+            for row in iter_statistics(cnx, limit):
+                writer.writerow(row[1:])
+                count += 1
+        else:
+            f.write("[")
+            for row in iter_statistics(cnx, limit):
+                f.write(",\n " if count else "\n ")
+                json.dump(dict(zip(fields, row[1:])), f, ensure_ascii=False)
+                count += 1
+            f.write("\n]\n")
+    return count
+
+
+def main():
+    """Rebuild or check the `UserStats` table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["rebuild", "check"])
+    args = parser.parse_args()
+
+    user = input("Enter MySQL user: ")
+    password = getpass.getpass(prompt="Enter MySQL password: ")
+
+    with get_pool(user, password, DB_NAME).connection() as cnx:
+        if args.command == "rebuild":
+            rebuild_user_stats(cnx)
+            print("UserStats rebuilt")
+            return
+
+        mismatches = check_user_stats(cnx)
+        for userid, stored, live in mismatches:
+            print(f"{userid}: UserStats {stored}, live {live}")
+        if mismatches:
+            sys.exit(1)
+        print("UserStats is consistent")
+
+
+if __name__ == "__main__":
+    main()
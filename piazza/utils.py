@@ -5,13 +5,82 @@ This module contains code that creates the `TDT4145ProjectGroup131` database,
 creates the tables of the `TDT4145ProjectGroup131` database, and fillss the
 database with data found in the `.csv` files in `../data/`.
 
+pandas and NumPy are only imported when a large `.csv` file is inserted, so
+starting the program with a database that is up to date, or inserting small
+files, which are read with the `csv` module, does not pay for importing them.
+A preprocessed snapshot of every large inserted file is kept in `SNAPSHOT_DIR`
+in the data directory, see `snapshot.py`, and inserting the same file again
+reads the snapshot.
+
 """
+import os
+import csv
+import time
 import uuid
+import hashlib
 import sys
-import pandas as pd
-import numpy as np
+import re
+from itertools import islice
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from mysql import connector
 from mysql.connector import errorcode
+from tables import TABLES
+from tables import SCHEMA_VERSION
+from tables import MIGRATIONS
+from pool import get_pool
+from profiling import timed
+from profiling import use_case
+from user_stats import rebuild_user_stats
+from cache import invalidate_logins
+from cache import invalidate_threads
+
+# Directory containing the `.csv` files
+DATA_DIR = "../data/"
+
+# Files need to be in read in order when inserted one at a time
+FILES = [
+    "User.csv",
+    "Login.csv",
+    "PostCreator.csv",
+    "Student.csv",
+    "Instructor.csv",
+    "CourseForum.csv",
+    "Folder.csv",
+    "UserInCourse.csv",
+    "Post.csv",
+    "UserLikesPost.csv",
+    "Thread.csv",
+    "UserViewsThread.csv",
+    "Tags.csv",
+    "ThreadInFolder.csv",
+]
+
+# Errors raised when a migration statement was already applied, or drops
+# something that does not exist in a database created from the current TABLES
+_EXISTS_ERRORS = (
+    errorcode.ER_DUP_KEYNAME,
+    errorcode.ER_DUP_FIELDNAME,
+    errorcode.ER_TABLE_EXISTS_ERROR,
+    errorcode.ER_CANT_DROP_FIELD_OR_KEY,
+    errorcode.ER_FK_DUP_NAME,
+)
+
+# Matches the referenced table of a foreign key
+_REFERENCES = re.compile(r"REFERENCES `(\w+)`")
+
+# Directory in the data directory containing the snapshots of the `.csv` files
+SNAPSHOT_DIR = ".snapshots"
+
+# Files up to this many bytes are read with the csv module instead of pandas
+SMALL_FILE_SIZE = 16 * 2**20
+
+# Positions of the hyphens and hex digits in a canonical uuid string
+_HYPHEN_POSITIONS = [8, 13, 18, 23]
+_HEX_POSITIONS = [i for i in range(36) if i not in _HYPHEN_POSITIONS]
+
+# Columns stored as `boolean`, written as `True`/`False` in the `.csv` files
+BOOLEAN_COLUMNS = ["PostAnonymity"]
 
 
 def create_database(cursor, DB_NAME):
@@ -36,11 +105,87 @@ def create_database(cursor, DB_NAME):
         sys.exit(1)
 
 
-def setup_database(user, password, DB_NAME, TABLES):
+def migrate_database(cursor, new_schema=False):
+    """Helper function to bring the schema version of the database up to date.
+
+    A database without a recorded version is recorded as `SCHEMA_VERSION`
+    without running any migrations if all its tables were just created from
+    the current `TABLES`. Otherwise its tables predate the `SchemaVersion`
+    table, and it is recorded as version 1. The statements in `MIGRATIONS`
+    newer than the recorded version are then executed in order. Statements
+    failing because the change already exists (e.g. on tables that were just
+    created from the current `TABLES` next to older ones) are skipped.
+
+    Parameters
+    ----------
+    cursor : :obj:
+        The mysql.connector.cursor object used to execute MySQL queries.
+    new_schema : bool, optional
+        All the tables of the database were just created.
+
+    """
+    cursor.execute("SELECT MAX(Version) FROM SchemaVersion")
+    version = cursor.fetchall()[0][0]
+    if version is None:
+        version = SCHEMA_VERSION if new_schema else 1
+        cursor.execute("INSERT INTO SchemaVersion VALUES (%s)", (version,))
+
+    versions = [v for v in sorted(MIGRATIONS) if version < v <= SCHEMA_VERSION]
+    for v in versions:
+        print("Migrating to schema version {}: ".format(v), end="")
+        for statement in MIGRATIONS[v]:
+            try:
+                cursor.execute(statement)
+            except connector.Error as err:
+                if err.errno not in _EXISTS_ERRORS:
+                    print(err.msg)
+                    sys.exit(1)
+        cursor.execute("INSERT INTO SchemaVersion VALUES (%s)", (v,))
+        print("OK")
+
+
+def _seed_loaded_files(cursor, data_dir):
+    """Helper function to record the files loaded before `SeedFile` existed.
+
+    A database older than the `SeedFile` table was filled with the whole
+    `.csv` files, so every file whose table holds rows is recorded as loaded.
+    Otherwise `insert_data` would insert all its rows again as duplicates.
+
+    Parameters
+    ----------
+    cursor : :obj:
+        The mysql.connector.cursor object used to execute MySQL queries.
+    data_dir : str
+        The directory containing the `.csv` files.
+
+    """
+    for filename in FILES:
+        tablename = filename.split(".")[0]
+        path = os.path.join(data_dir, filename)
+        if not os.path.exists(path):
+            continue
+        cursor.execute("SELECT 1 FROM `{}` LIMIT 1".format(tablename))
+        if not cursor.fetchall():
+            continue
+        _, checksum, size = _checksums(path, 0)
+        with open(path, newline="", encoding="utf-8") as f:
+            # Rows of the file without the header
+            num_rows = sum(1 for _ in csv.reader(f)) - 1
+        cursor.execute(
+            "INSERT INTO SeedFile VALUES (%s, %s, %s, %s)",
+            (filename, checksum, size, num_rows),
+        )
+        print("Recorded {} as loaded ({} rows)".format(filename, num_rows))
+
+
+def setup_database(user, password, DB_NAME, TABLES, rebuild=False, data_dir=DATA_DIR):
     """Function to setup database and tables.
 
-    Drops the `TDT4145ProjectGroup131` database if already exists, then creates
-    the database and executes the table initialization statements.
+    Creates the `TDT4145ProjectGroup131` database and the tables that do not
+    already exist, and migrates the existing tables to the current schema
+    version. If `rebuild` is set, the database is dropped first. If the
+    `SeedFile` table is created next to tables that already exist, the files
+    in `data_dir` whose tables hold rows are recorded as loaded.
 
     Parameters
     ----------
@@ -53,32 +198,44 @@ def setup_database(user, password, DB_NAME, TABLES):
     TABLES : dict
         A dict containing the tables and their MySQL statements. Used to set up
         the database with the correct tables.
+    rebuild : bool, optional
+        Drop the database and create it from scratch.
+    data_dir : str, optional
+        The directory containing the `.csv` files.
 
     """
 
-    # Instantiate connection
-    with connector.connect(user=user, password=password) as cnx:
+    # Get connection without selecting the database
+    with get_pool(user, password, DB_NAME).connection(database=None) as cnx:
 
         # Instantiate cursor object
         with cnx.cursor() as cursor:
-            # Start by dropping database
-            try:
-                cursor.execute("DROP DATABASE {}".format(DB_NAME))
-            except connector.Error as err:
-                if err.errno == errorcode.ER_BAD_DB_ERROR:
-                    print("Database {} does not exists.".format(DB_NAME))
-                else:
-                    print(err.msg)
-                    sys.exit(1)
+            if rebuild:
+                # Start by dropping database
+                try:
+                    cursor.execute("DROP DATABASE {}".format(DB_NAME))
+                except connector.Error as err:
+                    if err.errno == errorcode.ER_BAD_DB_ERROR:
+                        print("Database {} does not exists.".format(DB_NAME))
+                    else:
+                        print(err.msg)
+                        sys.exit(1)
+
             # Create database
-            finally:
+            cursor.execute("SHOW DATABASES LIKE %s", (DB_NAME,))
+            if not cursor.fetchall():
                 create_database(cursor, DB_NAME)
                 print("Database {} created successfully.".format(DB_NAME))
-                # Set database tame
-                cnx.database = DB_NAME
+            # Set database tame
+            cnx.database = DB_NAME
 
             # Create Tables if not exist
+            cursor.execute("SHOW TABLES")
+            existing = {row[0].lower() for row in cursor.fetchall()}
+            created = set()
             for table_name in TABLES:
+                if table_name.lower() in existing:
+                    continue
                 table_description = TABLES[table_name]
                 try:
                     print("Creating table {}: ".format(table_name), end="")
@@ -89,14 +246,428 @@ def setup_database(user, password, DB_NAME, TABLES):
                     else:
                         print(err.msg)
                 else:
+                    created.add(table_name)
                     print("OK")
 
+            # Tables older than the bookkeeping tables predate the schema
+            # versions and the recorded files
+            new_schema = created == set(TABLES)
+            migrate_database(cursor, new_schema)
+            if "SeedFile" in created and not new_schema:
+                _seed_loaded_files(cursor, data_dir)
+            cnx.commit()
+
+
+@lru_cache(maxsize=None)
+def _hex_lookup():
+    """Helper function to get the lookup table from ASCII hex digit to value.
+
+    Returns
+    -------
+    numpy.ndarray
+        The value of each byte as a hex digit, 255 for non-hex characters.
+
+    """
+    import numpy as np
+
+    lookup = np.full(256, 255, dtype=np.uint8)
+    lookup[np.frombuffer(b"0123456789", dtype=np.uint8)] = np.arange(10)
+    lookup[np.frombuffer(b"abcdef", dtype=np.uint8)] = np.arange(10, 16)
+    lookup[np.frombuffer(b"ABCDEF", dtype=np.uint8)] = np.arange(10, 16)
+    return lookup
+
+
+def uuids_to_bytes(values):
+    """Convert a column of uuid strings to binary(16) values.
+
+    The uuid strings are parsed as hex for the whole column at once with NumPy
+    instead of building a `uuid.UUID` object per cell. Missing values (None for
+    NULL values) are kept as they are. If a value is not in the canonical
+    `xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx` form, the column falls back to
+    parsing with `uuid.UUID`, so the result and the errors raised are the same
+    as for `uuid.UUID`.
+
+    Parameters
+    ----------
+    values : :obj:
+        The pandas.Series containing uuid strings.
+
+    Returns
+    -------
+    :obj:
+        A pandas.Series of the same index containing 16 byte values.
+
+    """
+    import numpy as np
+    import pandas as pd
+
+    result = values.to_numpy(dtype=object, copy=True)
+    mask = values.notna().to_numpy()
+    # Casting to S36 silently truncates longer strings, so check the lengths
+    # before casting
+    if not (pd.Series(result[mask], dtype=object).str.len() == 36).all():
+        return values.apply(lambda x: uuid.UUID(x).bytes if isinstance(x, str) else x)
+    try:
+        chars = np.array(result[mask].tolist(), dtype="S36")
+    except UnicodeEncodeError:
+        return values.apply(lambda x: uuid.UUID(x).bytes if isinstance(x, str) else x)
+
+    # Check the hyphens and look up the value of each hex digit
+    chars = np.frombuffer(chars.tobytes(), dtype=np.uint8).reshape(-1, 36)
+    nibbles = _hex_lookup()[chars[:, _HEX_POSITIONS]]
+    if (chars[:, _HYPHEN_POSITIONS] != ord("-")).any() or (nibbles == 255).any():
+        return values.apply(lambda x: uuid.UUID(x).bytes if isinstance(x, str) else x)
+
+    buf = ((nibbles[:, 0::2] << 4) | nibbles[:, 1::2]).tobytes()
+    converted = np.empty(len(chars), dtype=object)
+    converted[:] = [buf[i : i + 16] for i in range(0, len(buf), 16)]
+    result[mask] = converted
+    return pd.Series(result, index=values.index, name=values.name)
+
+
+def _insert_rows(cursor, cmd, rows):
+    """Helper function to insert a batch of rows.
+
+    Tries to insert the whole batch with a single multi-row statement. If the
+    batch fails, the rows are retried one by one so that only the offending
+    rows are dropped and counted as failures.
+
+    Parameters
+    ----------
+    cursor : :obj:
+        The mysql.connector.cursor object used to execute MySQL queries.
+    cmd : str
+        The `INSERT INTO ... VALUES (%s, ..., %s)` statement.
+    rows : list
+        A list of tuples with the column values to insert.
+
+    Returns
+    -------
+    int
+        The number of rows that could not be inserted.
+
+    """
+    try:
+        timed(cursor.executemany, cursor, cmd, rows)
+        return 0
+    except connector.Error:
+        num_fails = 0
+        for row in rows:
+            try:
+                timed(cursor.execute, cursor, cmd, row)
+            except connector.Error:
+                num_fails += 1
+        return num_fails
+
+
+def _column_kind(col):
+    """Helper function to get the kind of a column of a `.csv` file.
+
+    Parameters
+    ----------
+    col : str
+        The name of the column.
+
+    Returns
+    -------
+    str
+        "id" for uuid columns, "bool" for boolean columns and "text" otherwise.
+
+    """
+    if "ID" in col:
+        return "id"
+    if col in BOOLEAN_COLUMNS:
+        return "bool"
+    return "text"
+
+
+def _csv_batches(path, batch_size, skip_rows=0):
+    """Helper function to read a `.csv` file in batches with the csv module.
+
+    Empty fields are read as None, ID columns as 16 byte values and boolean
+    columns as bools, like `_pandas_batches` and `_load_infile` do.
+
+    Parameters
+    ----------
+    path : str
+        The path to the `.csv` file.
+    batch_size : int
+        The number of rows per batch.
+    skip_rows : int, optional
+        The number of rows at the start of the file that are already loaded.
+
+    Yields
+    ------
+    list
+        A list of tuples with the column values of each row of a batch.
+
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        converters = []
+        for col in columns:
+            kind = _column_kind(col)
+            if kind == "id":
+                converters.append(lambda x: uuid.UUID(x).bytes)
+            elif kind == "bool":
+                converters.append(lambda x: x == "True")
+            else:
+                converters.append(str)
+
+        # Skip the rows that are already loaded
+        for _ in islice(reader, skip_rows):
+            pass
+        while True:
+            rows = [
+                tuple(
+                    convert(value) if value != "" else None
+                    for convert, value in zip(converters, row)
+                )
+                for row in islice(reader, batch_size)
+            ]
+            if not rows:
+                return
+            yield rows
 
-def insert_data(user, password, DB_NAME):
-    """Insert data into MySQL database.
 
-    Reads the `.csv` files from `../data/` and inserts the data into the
-    existing `TDT4145ProjectGroup131` database.
+def _pandas_batches(path, batch_size, skip_rows=0):
+    """Helper function to read a `.csv` file in batches with pandas.
+
+    The ID columns are converted for a whole batch at once with
+    `uuids_to_bytes`, which is faster than the csv module for large files.
+
+    Parameters
+    ----------
+    path : str
+        The path to the `.csv` file.
+    batch_size : int
+        The number of rows per batch.
+    skip_rows : int, optional
+        The number of rows at the start of the file that are already loaded.
+
+    Yields
+    ------
+    list
+        A list of tuples with the column values of each row of a batch.
+
+    """
+    import numpy as np
+    import pandas as pd
+
+    to_skip = skip_rows
+    # Load csv file in chunks
+    for table_df in pd.read_csv(path, chunksize=batch_size):
+        # Skip the rows that are already loaded
+        if to_skip:
+            skipped = min(to_skip, len(table_df))
+            table_df = table_df.iloc[skipped:]
+            to_skip -= skipped
+            if table_df.empty:
+                continue
+
+        # Replace nan with None as mysql convert None to NULL values
+        table_df = table_df.replace({np.nan: None})
+
+        # Replace string uuid values with uuid byte values
+        for col in table_df.columns:
+            if "ID" in col:
+                table_df[col] = uuids_to_bytes(table_df[col])
+
+        yield list(table_df.itertuples(index=False, name=None))
+
+
+def _snapshot_batches(path, tablename, checksum, batch_size, skip_rows=0):
+    """Helper function to read a `.csv` file in batches from its snapshot.
+
+    The file is parsed into a snapshot first if it has none, so it is only
+    parsed once per version. The rows are the same as read by `_csv_batches`
+    and `_pandas_batches`.
+
+    Parameters
+    ----------
+    path : str
+        The path to the `.csv` file.
+    tablename : str
+        The name of the table of the file.
+    checksum : str
+        The hex sha256 checksum of the file.
+    batch_size : int
+        The number of rows per batch.
+    skip_rows : int, optional
+        The number of rows at the start of the file that are already loaded.
+
+    Returns
+    -------
+    :obj:
+        An iterator of lists of tuples with the column values of each row of a
+        batch.
+
+    """
+    from snapshot import snapshot_path
+    from snapshot import read_snapshot
+    from snapshot import write_snapshot
+    from snapshot import snapshot_batches
+
+    snapshot_dir = os.path.join(os.path.dirname(path), SNAPSHOT_DIR)
+    snapshot = snapshot_path(snapshot_dir, tablename, checksum)
+    if read_snapshot(snapshot) is None:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        write_snapshot(snapshot, path, _column_kind)
+    return snapshot_batches(snapshot, batch_size, skip_rows)
+
+
+def _local_infile_enabled(cursor):
+    """Helper function to check if the server accepts `LOAD DATA LOCAL INFILE`.
+
+    Parameters
+    ----------
+    cursor : :obj:
+        The mysql.connector.cursor object used to execute MySQL queries.
+
+    Returns
+    -------
+    bool
+        True if the `local_infile` server variable is enabled.
+
+    """
+    cursor.execute("SHOW GLOBAL VARIABLES LIKE 'local_infile'")
+    result = cursor.fetchall()
+    return bool(result) and str(result[0][1]).upper() in ("ON", "1")
+
+
+def _load_infile(cursor, tablename, path, skip_rows=0):
+    """Helper function to load a `.csv` file with `LOAD DATA LOCAL INFILE`.
+
+    ID columns are converted from uuid strings to binary(16) values and
+    boolean columns from `True`/`False` to 1/0 on the server. Empty fields are
+    inserted as NULL values. Rows that violate a constraint are skipped, so the
+    first `skip_rows` rows, which are already loaded, are ignored as duplicates.
+
+    Parameters
+    ----------
+    cursor : :obj:
+        The mysql.connector.cursor object used to execute MySQL queries.
+    tablename : str
+        The name of the table to load into.
+    path : str
+        The path to the `.csv` file.
+    skip_rows : int, optional
+        The number of rows at the start of the file that are already loaded.
+
+    Returns
+    -------
+    tuple
+        The number of new rows in the file and the number of new rows that
+        could not be inserted.
+
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        num_rows = sum(1 for _ in reader)
+
+    assignments = []
+    for col in columns:
+        value = "NULLIF(@{}, '')".format(col)
+        if "ID" in col:
+            value = "UUID_TO_BIN({})".format(value)
+        elif col in BOOLEAN_COLUMNS:
+            value = "(@{} = 'True')".format(col)
+        assignments.append("`{}` = {}".format(col, value))
+
+    cmd = (
+        "LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE `{}` "
+        "CHARACTER SET utf8mb4 "
+        "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+        "LINES TERMINATED BY '\\n' "
+        "IGNORE 1 LINES ({}) SET {}"
+    ).format(
+        tablename,
+        ", ".join("@" + col for col in columns),
+        ", ".join(assignments),
+    )
+    timed(cursor.execute, cursor, cmd, (os.path.abspath(path),))
+    num_rows -= skip_rows
+    return num_rows, max(num_rows - cursor.rowcount, 0)
+
+
+def _checksums(path, prefix_size):
+    """Helper function to compute the sha256 checksums of a file.
+
+    Parameters
+    ----------
+    path : str
+        The path to the file.
+    prefix_size : int
+        The number of bytes at the start of the file to compute a separate
+        checksum of.
+
+    Returns
+    -------
+    tuple
+        The hex checksum of the first `prefix_size` bytes (None if the file is
+        shorter), the hex checksum of the whole file and the size of the file.
+
+    """
+    prefix_checksum = None
+    checksum = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            if size < prefix_size <= size + len(block):
+                prefix = checksum.copy()
+                prefix.update(block[: prefix_size - size])
+                prefix_checksum = prefix.hexdigest()
+            checksum.update(block)
+            size += len(block)
+    if prefix_size == 0:
+        prefix_checksum = hashlib.sha256().hexdigest()
+    return prefix_checksum, checksum.hexdigest(), size
+
+
+def table_dependencies(TABLES):
+    """Find the tables each table depends on through its foreign keys.
+
+    Parses the `FOREIGN KEY ... REFERENCES` clauses of the table statements.
+    References from a table to itself are ignored.
+
+    Parameters
+    ----------
+    TABLES : dict
+        A dict containing the tables and their MySQL statements.
+
+    Returns
+    -------
+    dict
+        A dict mapping each table name to the set of table names it references.
+
+    """
+    dependencies = {}
+    for table_name, table_description in TABLES.items():
+        referenced = set(_REFERENCES.findall(table_description))
+        dependencies[table_name] = referenced - {table_name}
+    return dependencies
+
+
+@use_case("insert_data")
+def _insert_table(
+    user,
+    password,
+    DB_NAME,
+    filename,
+    batch_size,
+    load_infile,
+    data_dir=DATA_DIR,
+    snapshots=True,
+):
+    """Helper function to insert one `.csv` file into its table.
+
+    Uses its own connection from the pool so that several tables can be
+    inserted concurrently. The checksum and size of the file and the number of rows
+    loaded from it are recorded in the `SeedFile` table. If the file is
+    unchanged since it was loaded nothing is inserted, and if rows were only
+    appended to it only the new rows are inserted.
 
     Parameters
     ----------
@@ -106,68 +677,209 @@ def insert_data(user, password, DB_NAME):
         The entered MySQL password
     DB_NAME : str
         The MySQL database name (`TDT4145ProjectGroup131`)
+    filename : str
+        The name of the `.csv` file in `data_dir`.
+    batch_size : int
+        The number of rows sent to the database per `INSERT` statement.
+    load_infile : bool
+        Use `LOAD DATA LOCAL INFILE` instead of `INSERT` statements.
+    data_dir : str, optional
+        The directory containing the `.csv` file.
+    snapshots : bool, optional
+        Read the rows of a file larger than `SMALL_FILE_SIZE` from its
+        snapshot, written first if missing.
+
+    Returns
+    -------
+    tuple
+        The line reporting the result of the insertion, and a bool telling if
+        the file was loaded.
 
     """
+    # Get tablename
+    tablename = filename.split(".")[0]
+    path = os.path.join(data_dir, filename)
 
-    # Instantiate connection
-    with connector.connect(user=user, password=password, database=DB_NAME) as cnx:
+    # Get connection, LOAD DATA LOCAL INFILE must be allowed by the client
+    options = {"allow_local_infile": True} if load_infile else {}
+    with get_pool(user, password, DB_NAME).connection(**options) as cnx:
 
         # Instantiate cursor
         with cnx.cursor() as cursor:
-            # Files need to be in read in order
-            files = [
-                "User.csv",
-                "Login.csv",
-                "PostCreator.csv",
-                "Student.csv",
-                "Instructor.csv",
-                "CourseForum.csv",
-                "Folder.csv",
-                "UserInCourse.csv",
-                "Post.csv",
-                "UserLikesPost.csv",
-                "Thread.csv",
-                "UserViewsThread.csv",
-                "Tags.csv",
-                "ThreadInFolder.csv",
-            ]
-
-            for filename in files:
-                # Get tablename
-                tablename = filename.split(".")[0]
+            start = time.perf_counter()
 
-                print("Inserting into " + tablename + " : ", end="")
+            # Find the rows already loaded from an earlier version of the file
+            cursor.execute(
+                "SELECT Checksum, ByteSize, RowsLoaded FROM SeedFile "
+                "WHERE FileName = %s",
+                (filename,),
+            )
+            result = cursor.fetchall()
+            if result:
+                loaded_checksum, loaded_size, skip_rows = result[0]
+            else:
+                loaded_checksum, loaded_size, skip_rows = "", 0, 0
+            prefix_checksum, checksum, size = _checksums(path, loaded_size)
+            report = "Inserting into " + tablename + " : "
+            if prefix_checksum != loaded_checksum:
+                # The loaded part of the file changed, so load it all again
+                skip_rows = 0
+            elif size == loaded_size:
+                return report + "Up to date", False
 
-                # Load csv file
-                table_df = pd.read_csv("../data/" + filename)
-                # Replace nan with None as mysql convert None to NULL values
-                table_df = table_df.replace({np.nan: None})
-
-                # Replace string uuid values with uuid byte values
-                for col in table_df.columns:
-                    if "ID" in col:
-                        table_df[col] = table_df[col].apply(
-                            lambda x: uuid.UUID(x).bytes if isinstance(x, str) else x
-                        )
-
-                # Insert each row in df
+            if load_infile:
+                num_rows, num_fails = _load_infile(cursor, tablename, path, skip_rows)
+            else:
+                num_rows = 0
                 num_fails = 0
-                for _, row in table_df.iterrows():
-                    # Get a tuple of values to insert
-                    to_insert = tuple(row[c] for c in table_df.columns)
+                if size <= SMALL_FILE_SIZE:
+                    batches = _csv_batches(path, batch_size, skip_rows)
+                elif snapshots:
+                    batches = _snapshot_batches(
+                        path, tablename, checksum, batch_size, skip_rows
+                    )
+                else:
+                    batches = _pandas_batches(path, batch_size, skip_rows)
+                for rows in batches:
                     # Adjust (%s, ..., %s) depending on number of column values to insert
-                    string_tuple = "(" + "%s," * (len(table_df.columns) - 1) + "%s)"
+                    string_tuple = "(" + "%s," * (len(rows[0]) - 1) + "%s)"
                     # Create sql command for insertion
                     cmd = "INSERT INTO " + tablename + " VALUES " + string_tuple
-                    # Insert into mysql database
-                    try:
-                        cursor.execute(cmd, to_insert)
-                    except:
-                        num_fails += 1
-
-                if num_fails == 0:
-                    print("Success")
-                else:
-                    print(f"Failed {num_fails} times")
+                    # Insert the whole batch as one statement
+                    num_fails += _insert_rows(cursor, cmd, rows)
+                    num_rows += len(rows)
+
+            # Record the loaded file in the same transaction as its rows
+            cursor.execute(
+                "REPLACE INTO SeedFile VALUES (%s, %s, %s, %s)",
+                (filename, checksum, size, skip_rows + num_rows),
+            )
+            cnx.commit()
+            elapsed = time.perf_counter() - start
+
+    rate = (num_rows - num_fails) / elapsed if elapsed > 0 else 0.0
+    if num_fails == 0:
+        return report + f"Success ({num_rows} rows, {rate:.0f} rows/s)", True
+    return report + f"Failed {num_fails} times ({rate:.0f} rows/s)", True
 
-                cnx.commit()
+
+def insert_data(
+    user,
+    password,
+    DB_NAME,
+    batch_size=1000,
+    load_infile=False,
+    workers=1,
+    data_dir=DATA_DIR,
+    snapshots=True,
+):
+    """Insert data into MySQL database.
+
+    Reads the `.csv` files from `data_dir`, by default `../data/`, and inserts
+    the data into the existing `TDT4145ProjectGroup131` database. Each file is
+    streamed in chunks of `batch_size` rows, and every chunk is sent as a
+    single multi-row `INSERT` statement. If `load_infile` is set and the
+    server allows it, the files are instead loaded with `LOAD DATA LOCAL
+    INFILE`. The number of inserted rows per second is reported for each table.
+    Files up to `SMALL_FILE_SIZE` bytes are read with the `csv` module. With
+    `snapshots` set, the rows of larger files are read from their snapshots in
+    `SNAPSHOT_DIR`, which are written the first time a file is inserted, and
+    otherwise with pandas.
+    Only rows that are new since the last time a file was loaded are inserted.
+
+    The `UserStats` table is rebuilt when new rows were inserted.
+
+    The uuid strings are stored without the swap flag of `UUID_TO_BIN`, the
+    same byte layout as the keys generated by `query.new_id`, so the time-ordered
+    version 7 uuids written by `generate_data.py` are inserted in the order of
+    the primary keys, and files in that order are appended to the indexes.
+
+    A table is inserted as soon as all the tables it references through its
+    foreign keys are inserted. Up to `workers` tables are inserted
+    concurrently, each over its own connection from the connection pool.
+
+    Parameters
+    ----------
+    user : str
+        The entered MySQL user
+    password : str
+        The entered MySQL password
+    DB_NAME : str
+        The MySQL database name (`TDT4145ProjectGroup131`)
+    batch_size : int, optional
+        The number of rows sent to the database per `INSERT` statement.
+    load_infile : bool, optional
+        Use `LOAD DATA LOCAL INFILE` when the server allows it.
+    workers : int, optional
+        The number of tables inserted concurrently.
+    data_dir : str, optional
+        The directory containing the `.csv` files.
+    snapshots : bool, optional
+        Read the `.csv` files larger than `SMALL_FILE_SIZE` from their
+        snapshots when not using `LOAD DATA LOCAL INFILE`.
+
+    """
+    if load_infile:
+        with get_pool(user, password, DB_NAME).connection() as cnx:
+            with cnx.cursor() as cursor:
+                if not _local_infile_enabled(cursor):
+                    print("LOAD DATA LOCAL INFILE not allowed by server, using INSERT")
+                    load_infile = False
+
+    # Only wait for tables that are inserted from a file
+    tablenames = [filename.split(".")[0] for filename in FILES]
+    dependencies = table_dependencies(TABLES)
+    pending = {
+        filename: dependencies.get(tablename, set()) & set(tablenames)
+        for filename, tablename in zip(FILES, tablenames)
+    }
+    inserted = set()
+    running = {}
+    changed = False
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while pending or running:
+            # Start every table whose referenced tables are inserted,
+            # keeping the order of the files list
+            for filename in FILES:
+                if filename in pending and pending[filename] <= inserted:
+                    del pending[filename]
+                    future = executor.submit(
+                        _insert_table,
+                        user,
+                        password,
+                        DB_NAME,
+                        filename,
+                        batch_size,
+                        load_infile,
+                        data_dir,
+                        snapshots,
+                    )
+                    running[future] = filename
+
+            if not running:
+                raise ValueError(
+                    "Circular foreign keys between {}".format(", ".join(pending))
+                )
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                filename = running.pop(future)
+                report, loaded = future.result()
+                print(report)
+                changed = changed or loaded
+                inserted.add(filename.split(".")[0])
+
+    # Cached logins may be stale if rows were loaded
+    if changed:
+        invalidate_logins()
+        invalidate_threads()
+
+    # Rebuild the user statistics if rows were loaded or they are missing
+    with get_pool(user, password, DB_NAME).connection() as cnx:
+        with cnx.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM UserStats")
+            missing = cursor.fetchall()[0][0] == 0
+        if changed or missing:
+            print("Rebuilding UserStats")
+            rebuild_user_stats(cnx)